@@ -3,6 +3,7 @@ Django settings for FastDistrib project.
 """
 
 import os
+import tempfile
 from pathlib import Path
 import dj_database_url
 from django.core.management.utils import get_random_secret_key
@@ -41,7 +42,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Après SecurityMiddleware
+    'core.middleware.StatiquesMiddleware',  # WhiteNoise compatible ASGI, après SecurityMiddleware
+    'core.middleware.MesurePerformanceMiddleware',  # Après WhiteNoise : statiques non mesurés
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,6 +89,9 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Base de test sur disque : en mémoire partagée, SQLite refuse les écritures
+            # concurrentes (« database table is locked ») au lieu de les faire attendre
+            'TEST': {'NAME': os.path.join(tempfile.gettempdir(), f'fastdistrib-test-{os.getpid()}.sqlite3')},
         }
     }
 
@@ -138,11 +143,34 @@ MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_ROOT.mkdir(exist_ok=True)
 (MEDIA_ROOT / 'pdfs').mkdir(exist_ok=True)
 
+# Livraison des fichiers téléchargés : 'direct', 'x-accel-redirect', 'x-sendfile' ou 'range'
+FILE_DELIVERY_BACKEND = os.environ.get('FILE_DELIVERY_BACKEND', 'direct')
+# Emplacement interne nginx (location internal) pointant sur MEDIA_ROOT, pour 'x-accel-redirect'
+FILE_DELIVERY_ACCEL_PREFIX = '/protected-media/'
+# Durée pendant laquelle un téléchargement peut être repris en mode 'range' (secondes),
+# tant qu'aucun nouveau lien n'a été envoyé à l'unité
+FILE_DELIVERY_RESUME_WINDOW = 30 * 60
+# Vues de téléchargement asynchrones (à activer sous ASGI, voir gunicorn.asgi.conf.py)
+DOWNLOAD_ASYNC = os.environ.get('DOWNLOAD_ASYNC', 'False') == 'True'
+
 # Configuration de sécurité pour les fichiers
 FILE_UPLOAD_PERMISSIONS = 0o644
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 
+# Upload reprenable par morceaux (API /api/uploads/), voir core/upload_sessions.py
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024           # taille conseillée aux clients
+UPLOAD_CHUNK_MAX_SIZE = 16 * 1024 * 1024      # taille maximale d'un morceau
+UPLOAD_SESSION_MAX_SIZE = 20 * 1024 ** 3      # taille maximale du fichier complet
+
+# Limites des archives ZIP de PDF (zip-bombs), voir core/zip_import.py
+ZIP_IMPORT_LIMITS = {
+    'max_members': 50000,
+    'max_member_size': 50 * 1024 * 1024,  # 50MB décompressés par PDF
+    'max_total_size': 4 * 1024 ** 3,      # 4GB décompressés au total
+    'max_ratio': 100,
+}
+
 # Configuration pour WhiteNoise
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
@@ -155,6 +183,88 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', 'burkicampus@gmail.com')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', 'fadjbvwewzqnrycs')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@votredomaine.com')
 
+# Envoi des campagnes : messages par connexion SMTP et connexions parallèles
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 50))
+EMAIL_CONNECTIONS = int(os.environ.get('EMAIL_CONNECTIONS', 1))
+
+# Limites de débit (messages/seconde) : globale, par défaut par domaine, et par domaine.
+# Le débit d'un domaine est divisé par deux à chaque réponse SMTP 4xx ("réessayez plus tard")
+# et les envois vers ce domaine sont suspendus pendant retry_pause secondes.
+EMAIL_RATE_LIMITS = {
+    'global': float(os.environ.get('EMAIL_RATE_GLOBAL', 5)),
+    'default_domain': float(os.environ.get('EMAIL_RATE_PER_DOMAIN', 2)),
+    'domains': {
+        'gmail.com': 1,
+        'outlook.com': 1,
+        'hotmail.com': 1,
+    },
+    'retry_pause': 30,
+}
+
+# File d'attente des emails (commande process_email_jobs)
+EMAIL_JOB_BATCH_SIZE = int(os.environ.get('EMAIL_JOB_BATCH_SIZE', 100))
+EMAIL_JOB_MAX_ATTEMPTS = int(os.environ.get('EMAIL_JOB_MAX_ATTEMPTS', 5))
+EMAIL_JOB_BACKOFF_SECONDS = int(os.environ.get('EMAIL_JOB_BACKOFF_SECONDS', 60))
+EMAIL_JOB_BACKOFF_MAX_SECONDS = 3600
+EMAIL_JOB_STALE_SECONDS = 600
+# Au-delà de cette attente (secondes) pour le débit d'un domaine, le message est reporté
+EMAIL_MAX_DOMAIN_WAIT = 10
+
+# Journal des téléchargements (core/download_events.py) : écrit par lots, au plus tard après
+# DOWNLOAD_EVENT_FLUSH_INTERVAL secondes ; agrégé par python manage.py rollup_download_events
+DOWNLOAD_EVENT_BUFFER_SIZE = int(os.environ.get('DOWNLOAD_EVENT_BUFFER_SIZE', 200))
+# None : aucune écriture en arrière-plan, le tampon n'est écrit que par vider_tampon() (tests)
+DOWNLOAD_EVENT_FLUSH_INTERVAL = 5
+
+# Imports de campagnes en arrière-plan (python manage.py process_import_jobs)
+IMPORT_JOB_THREADS = int(os.environ.get('IMPORT_JOB_THREADS', 4))
+IMPORT_JOB_STALE_SECONDS = 600
+# Processus utilisés pour le stockage des PDF et l'appariement (1 = séquentiel)
+IMPORT_PROCESSES = int(os.environ.get('IMPORT_PROCESSES', 1))
+
+# Journalisation : synthèse par import sur core.import (voir core/instrumentation.py),
+# détail par enregistrement sur core.import.records, échantillonné et désactivé par défaut
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+IMPORT_RECORD_LOG = os.environ.get('IMPORT_RECORD_LOG', 'False') == 'True'
+IMPORT_RECORD_LOG_SAMPLE = int(os.environ.get('IMPORT_RECORD_LOG_SAMPLE', 100))
+IMPORT_RECORD_LOG_MAX = 1000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structure': {
+            '()': 'core.instrumentation.FormatteurStructure',
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structure',
+        },
+    },
+    'loggers': {
+        'core': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'core.import.records': {
+            'level': 'DEBUG' if IMPORT_RECORD_LOG else 'WARNING',
+        },
+    },
+}
+
+# Mesure des performances par vue (core/middleware.py, endpoint /admin/metrics/)
+PERF_SLOW_REQUEST_MS = int(os.environ.get('PERF_SLOW_REQUEST_MS', 1000))
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', str(DEBUG)) == 'True'
+# Jeton permettant à Prometheus de lire les métriques sans session (Authorization: Bearer <jeton>)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Dossier partagé par les workers gunicorn (vidé au démarrage) : l'endpoint metrics additionne
+# alors les valeurs de tous les processus au lieu de celles du seul worker qui répond
+METRICS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR', '')
+
 # Configuration d'authentification
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
@@ -0,0 +1,46 @@
+"""
+Configuration pytest des benchmarks (pytest-benchmark) :
+
+    pytest benchmarks/ --benchmark-json=resultats.json
+    pytest-benchmark compare 0001 0002
+
+Django est initialisé et une base de test est créée pour la session, comme
+avec la commande run_benchmarks.
+"""
+import os
+import sys
+from pathlib import Path
+
+import django
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'FastDistrib.settings')
+django.setup()
+
+
+@pytest.fixture(scope='session')
+def base_de_test():
+    from django.db import connections
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    anciens_noms = [
+        (connexion, connexion.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False))
+        for connexion in connections.all()
+    ]
+    yield
+    for connexion, ancien_nom in anciens_noms:
+        connexion.creation.destroy_test_db(ancien_nom, verbosity=0)
+    teardown_test_environment()
+
+
+@pytest.fixture(scope='session')
+def espace(base_de_test, tmp_path_factory):
+    from django.test import override_settings
+
+    from core.benchmarks import EspaceBenchmark, reglages_suite
+
+    racine = tmp_path_factory.mktemp('benchmarks')
+    with override_settings(**reglages_suite(racine)):
+        yield EspaceBenchmark(racine)
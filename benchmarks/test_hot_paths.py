@@ -0,0 +1,30 @@
+"""
+Chemins critiques sous pytest-benchmark, aux échelles de BENCH_SCALES
+(par défaut 1000,10000,100000). Mêmes scénarios que run_benchmarks.
+"""
+import os
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from core.benchmarks import ECHELLES, SCENARIOS  # noqa: E402
+
+ECHELLES_PYTEST = [int(n) for n in os.environ.get('BENCH_SCALES', ','.join(map(str, ECHELLES))).split(',')]
+
+
+@pytest.mark.parametrize('n', ECHELLES_PYTEST)
+@pytest.mark.parametrize('scenario', list(SCENARIOS))
+def test_chemin_critique(benchmark, espace, scenario, n):
+    elements = []
+
+    def preparer():
+        # Données préparées hors chronométrage, à chaque tour (liens consommés, emails envoyés...)
+        fonction, nombre = SCENARIOS[scenario](espace, n)
+        elements.append(nombre)
+        return (fonction,), {}
+
+    benchmark.group = scenario
+    benchmark.pedantic(lambda fonction: fonction(), setup=preparer,
+                       rounds=int(os.environ.get('BENCH_ROUNDS', 1)))
+    benchmark.extra_info['elements'] = elements[-1]
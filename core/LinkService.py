@@ -1,13 +1,45 @@
 from .models import SendingGroup, SendingUnit, Link
+from .group_counters import ajuster_compteurs
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 import logging
 def generate_link(group_name: str,**kwargs):
     group = SendingGroup.objects.create(label=group_name)
+    crees = 0
     try:
         for key in kwargs:
             unit = SendingUnit.objects.create(sending_group=group, name=key,
             email=kwargs[key]['email'], file=kwargs[key]['file'])
+            crees += 1
             link = Link.objects.create(sending_unit=unit)
             kwargs[key]['link'] = link.get_download_url()
     except Exception as e:
         logging.error(f"Erreur lors de la création de lien : {e}")
-    return kwargs
\ No newline at end of file
+    ajuster_compteurs(group.pk, total=crees)
+    return kwargs
+
+def consommer_lien(link):
+    """
+    Consomme le lien (usage unique) et marque son unité reçue.
+
+    Un seul UPDATE conditionnel (WHERE used = false) décide : de deux
+    requêtes simultanées sur le même lien, une seule l'obtient. Retourne
+    False si le lien était déjà utilisé.
+
+    Le compteur de réceptions du groupe n'augmente que si l'unité n'était
+    pas déjà reçue.
+    """
+    maintenant = timezone.now()
+    unites = SendingUnit.objects.filter(pk=link.sending_unit_id)
+    with transaction.atomic():
+        if not Link.objects.filter(pk=link.pk, used=False).update(used=True, used_at=maintenant):
+            return False
+        link.used, link.used_at = True, maintenant
+        if unites.filter(received=False).update(
+            received=True, received_date=maintenant, download_count=F('download_count') + 1
+        ):
+            ajuster_compteurs(link.sending_unit.sending_group_id, recus=1)
+        else:
+            unites.update(received_date=maintenant, download_count=F('download_count') + 1)
+    return True
@@ -0,0 +1,864 @@
+# benchmarks.py
+"""
+Benchmarks des chemins critiques : import, envoi et téléchargement.
+
+- bench_normalisation, bench_appariement, bench_import_parallele : mesures
+  ponctuelles, sans base de données (python -m core.benchmarks [lignes ...]) ;
+- executer_suite : suite complète par échelle (1k/10k/100k), y compris les
+  vues, à lancer dans une base de test (commande run_benchmarks ou
+  benchmarks/test_hot_paths.py sous pytest-benchmark). Les résultats JSON
+  se comparent d'un commit à l'autre avec comparer_resultats ;
+- bench_telechargements_concurrents : téléchargements simultanés de
+  clients lents sur un processus ASGI (run_benchmarks --async-downloads) ;
+- bench_index_unites : requêtes chaudes sur SendingUnit et Link, avec et
+  sans leurs index, sur une table d'un million d'unités (run_benchmarks
+  --index-units).
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import uuid
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.test import override_settings
+
+from .blob_store import stocker_fichier
+from .file_index import FileIndex
+from .parallel_import import iter_correspondances_paralleles, stocker_pdfs_en_parallele
+from .utils import (
+    clean_and_normalize_data,
+    clean_and_normalize_data_rowwise,
+    iter_correspondances,
+    mappe,
+    read_csv_file,
+)
+
+# ==================== GÉNÉRATEURS DE DONNÉES SYNTHÉTIQUES ====================
+
+def generer_dataframe_destinataires(n_lignes, graine=0):
+    """Génère un DataFrame brut nom/email/code proche des fichiers réels"""
+    rng = np.random.default_rng(graine)
+    indices = np.arange(n_lignes)
+
+    noms = np.array([f" Destinataire {i} " for i in indices], dtype=object)
+    noms[rng.random(n_lignes) < 0.1] = ''
+    noms[rng.random(n_lignes) < 0.02] = 'nan'
+
+    emails = np.array([f"User{i}@Example.com " for i in indices], dtype=object)
+    espaces = rng.random(n_lignes) < 0.02
+    emails[espaces] = [f"Contact user{i}@example.com" for i in indices[espaces]]
+
+    codes = rng.integers(1, 100000, n_lignes).astype(str).astype(object)
+    decimaux = rng.random(n_lignes) < 0.05
+    codes[decimaux] = [f"{c}.0" for c in codes[decimaux]]
+    textuels = rng.random(n_lignes) < 0.05
+    codes[textuels] = [f"MAT-{c}" for c in codes[textuels]]
+
+    return pd.DataFrame({'nom': noms, 'email': emails, 'code': codes})
+
+def generer_fichiers_et_codes(n_fichiers, sans_zeros=False, graine=0):
+    """
+    Génère un index {code: chemin} de PDF et les enregistrements CSV correspondants.
+
+    Les codes CSV sont au format de clean_code (« 001 ») ; 10 % n'ont pas de
+    fichier. Avec `sans_zeros`, les fichiers sont nommés « 1.pdf » au lieu de « 001.pdf ».
+    """
+    rng = np.random.default_rng(graine)
+    numeros = range(1, n_fichiers + 1)
+    fichiers = {str(i) if sans_zeros else f"{i:03d}": f"/pdfs/{i}.pdf" for i in numeros}
+    codes = rng.integers(1, int(n_fichiers * 1.1) + 1, n_fichiers)
+    records = pd.DataFrame({
+        'nom': [f"Destinataire {i}" for i in range(n_fichiers)],
+        'email': [f"user{i}@example.com" for i in range(n_fichiers)],
+        'code': [f"{c:03d}" for c in codes],
+    })
+    return fichiers, records
+
+# ==================== MESURES ====================
+
+def _chronometrer(fonction, *args, repetitions=3):
+    """Retourne le meilleur temps (en secondes) sur plusieurs exécutions"""
+    meilleur = None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction(*args)
+        duree = time.perf_counter() - debut
+        meilleur = duree if meilleur is None else min(meilleur, duree)
+    return meilleur
+
+def bench_normalisation(n_lignes=200000, repetitions=3):
+    """Compare la normalisation vectorisée à la version ligne par ligne"""
+    df = generer_dataframe_destinataires(n_lignes)
+
+    vectorise = _chronometrer(clean_and_normalize_data, df, repetitions=repetitions)
+    ligne_par_ligne = _chronometrer(clean_and_normalize_data_rowwise, df, repetitions=repetitions)
+
+    return {
+        'n_lignes': n_lignes,
+        'vectorise_s': round(vectorise, 4),
+        'ligne_par_ligne_s': round(ligne_par_ligne, 4),
+        'acceleration': round(ligne_par_ligne / vectorise, 2) if vectorise else None,
+    }
+
+def _apparier_par_variantes(fichiers, codes):
+    """Ancien appariement de mappe : quatre variantes du code essayées une à une"""
+    resultats = []
+    for code in codes:
+        trouve = None
+        for format_code in (code, code.lstrip('0'), code.zfill(3), str(code).split('.')[0]):
+            if format_code in fichiers:
+                trouve = fichiers[format_code]
+                break
+        resultats.append(trouve)
+    return resultats
+
+def bench_appariement(n_fichiers=100000, sans_zeros=False, repetitions=3):
+    """
+    Compare l'appariement par variantes (ancien mappe) à FileIndex :
+    recherche unitaire et jointure d'un bloc, après construction de l'index.
+    """
+    fichiers, records = generer_fichiers_et_codes(n_fichiers, sans_zeros=sans_zeros)
+    codes = records['code'].tolist()
+    index = FileIndex(fichiers)
+
+    def par_recherche():
+        return [index.rechercher(code) for code in codes]
+
+    construction = _chronometrer(FileIndex, fichiers, repetitions=repetitions)
+    variantes = _chronometrer(_apparier_par_variantes, fichiers, codes, repetitions=repetitions)
+    recherche = _chronometrer(par_recherche, repetitions=repetitions)
+    jointure = _chronometrer(index.joindre, records, repetitions=repetitions)
+
+    return {
+        'n_fichiers': n_fichiers,
+        'noms_fichiers': '1.pdf' if sans_zeros else '001.pdf',
+        'construction_index_s': round(construction, 4),
+        'variantes_s': round(variantes, 4),
+        'index_recherche_s': round(recherche, 4),
+        'index_jointure_s': round(jointure, 4),
+        'acceleration_jointure': round(variantes / jointure, 2) if jointure else None,
+    }
+
+def _import_sequentiel(pdfs, csv_path):
+    """Chemin séquentiel : stockage fichier par fichier puis iter_correspondances"""
+    mapping = {chemin.stem: str(stocker_fichier(chemin).path) for chemin in pdfs}
+    debut = time.perf_counter()
+    correspondances = list(iter_correspondances(csv_path, mapping))
+    return mapping, correspondances, time.perf_counter() - debut
+
+def _import_parallele(pdfs, csv_path, processus):
+    mapping = stocker_pdfs_en_parallele(pdfs, processus=processus)
+    debut = time.perf_counter()
+    correspondances = list(iter_correspondances_paralleles(csv_path, mapping, processus=processus))
+    return mapping, correspondances, time.perf_counter() - debut
+
+def bench_import_parallele(n_lignes=200000, n_fichiers=2000, taille_pdf=50 * 1024, processus=(1, 2, 4)):
+    """
+    Courbe de passage à l'échelle de l'import parallèle (parallel_import).
+
+    Chaque mesure part d'un stockage vide. Le résultat de chaque nombre de
+    processus est comparé à celui du chemin séquentiel.
+    """
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as racine:
+        racine = Path(racine)
+        (racine / 'pdfs').mkdir()
+        pdfs = []
+        for i in range(1, n_fichiers + 1):
+            chemin = racine / 'pdfs' / f"{i:03d}.pdf"
+            chemin.write_bytes(b'%PDF-1.4 ' + rng.bytes(taille_pdf))
+            pdfs.append(chemin)
+        df = generer_dataframe_destinataires(n_lignes)
+        df['code'] = [str(c) for c in rng.integers(1, int(n_fichiers * 1.1) + 1, n_lignes)]
+        csv_path = racine / 'data.csv'
+        df.to_csv(csv_path, index=False)
+
+        def mesurer(execution, *args):
+            media = tempfile.mkdtemp(dir=racine)
+            with override_settings(MEDIA_ROOT=media):
+                debut = time.perf_counter()
+                mapping, correspondances, appariement = execution(*args)
+                total = time.perf_counter() - debut
+            return mapping, correspondances, {
+                'stockage_s': round(total - appariement, 4),
+                'appariement_s': round(appariement, 4),
+                'total_s': round(total, 4),
+            }
+
+        mapping, reference, sequentiel = mesurer(_import_sequentiel, pdfs, csv_path)
+        # Les chemins des blobs dépendent de MEDIA_ROOT : seules les empreintes sont comparées
+        def empreintes(correspondances):
+            return [
+                {nom: {**data, 'file': Path(data['file']).name} for nom, data in resultat.items()}
+                for resultat in correspondances
+            ]
+
+        courbe = [{'processus': 'séquentiel', **sequentiel, 'acceleration': 1.0, 'identique': True}]
+        for n in processus:
+            _, correspondances, mesure = mesurer(_import_parallele, pdfs, csv_path, n)
+            courbe.append({
+                'processus': n,
+                **mesure,
+                'acceleration': round(sequentiel['total_s'] / mesure['total_s'], 2) if mesure['total_s'] else None,
+                'identique': empreintes(correspondances) == empreintes(reference),
+            })
+
+    return {'n_lignes': n_lignes, 'n_fichiers': n_fichiers, 'cpu': os.cpu_count(), 'courbe': courbe}
+
+# ==================== GÉNÉRATEURS DE FICHIERS ====================
+
+# Formats acceptés par read_csv_file
+FORMATS_CSV = ('entete', 'sans_entete', 'email_code', 'une_colonne')
+
+def ecrire_csv(chemin, n_lignes, format_csv='entete', n_fichiers=None, graine=0):
+    """
+    Écrit un CSV synthétique dans l'un des formats de FORMATS_CSV :
+    avec en-tête (nom,email,code), sans en-tête à trois colonnes, à deux
+    colonnes (email,code) ou à une seule colonne (« nom;email;code »).
+
+    Les codes renvoient aux PDF de generer_dossier_pdf(n_fichiers) ; 10 % n'ont pas de fichier.
+    """
+    if format_csv not in FORMATS_CSV:
+        raise ValueError(f"Format de CSV inconnu : {format_csv}")
+    rng = np.random.default_rng(graine)
+    n_fichiers = n_fichiers or n_lignes
+    codes = rng.integers(1, int(n_fichiers * 1.1) + 1, n_lignes).tolist()
+
+    with open(chemin, 'w', encoding='utf-8') as f:
+        if format_csv == 'entete':
+            f.write('nom,email,code\n')
+        for i, code in enumerate(codes):
+            nom, email, code = f"Destinataire {i}", f"user{i}@example.com", f"{code:03d}"
+            if format_csv == 'email_code':
+                f.write(f"{email},{code}\n")
+            elif format_csv == 'une_colonne':
+                f.write(f"{nom};{email};{code}\n")
+            else:
+                f.write(f"{nom},{email},{code}\n")
+    return Path(chemin)
+
+def generer_dossier_pdf(dossier, n_fichiers, taille=1024, graine=0):
+    """Crée n_fichiers PDF distincts (001.pdf, 002.pdf...) de `taille` octets"""
+    rng = np.random.default_rng(graine)
+    dossier = Path(dossier)
+    dossier.mkdir(parents=True, exist_ok=True)
+    for i in range(1, n_fichiers + 1):
+        (dossier / f"{i:03d}.pdf").write_bytes(b'%PDF-1.4\n' + rng.bytes(max(taille - 9, 0)))
+    return dossier
+
+class EspaceBenchmark:
+    """Dossier temporaire de la suite : les fichiers générés sont réutilisés d'un scénario à l'autre"""
+
+    def __init__(self, racine, taille_pdf=1024):
+        self.racine = Path(racine)
+        self.taille_pdf = taille_pdf
+        self._cache = {}
+        self._admin = None
+
+    def _memoriser(self, cle, fabrique):
+        if cle not in self._cache:
+            self._cache[cle] = fabrique()
+        return self._cache[cle]
+
+    def csv(self, n, format_csv='entete'):
+        return self._memoriser(('csv', n, format_csv), lambda: ecrire_csv(
+            self.racine / f"data_{format_csv}_{n}.csv", n, format_csv))
+
+    def dossier_pdf(self, n):
+        return self._memoriser(('pdf', n), lambda: generer_dossier_pdf(
+            self.racine / f"pdfs_{n}", n, self.taille_pdf))
+
+    def archive_pdf(self, n):
+        def fabriquer():
+            chemin = self.racine / f"pdfs_{n}.zip"
+            with zipfile.ZipFile(chemin, 'w', zipfile.ZIP_STORED) as archive:
+                for pdf in sorted(self.dossier_pdf(n).iterdir()):
+                    archive.write(pdf, pdf.name)
+            return chemin
+        return self._memoriser(('zip', n), fabriquer)
+
+    def client_admin(self):
+        from django.contrib.auth.models import User
+        from django.test import Client
+
+        if self._admin is None:
+            self._admin = User.objects.create_user('bench-admin', password='bench', is_staff=True)
+        client = Client()
+        client.force_login(self._admin)
+        return client
+
+    def groupe(self, n):
+        """Nouveau groupe de n unités (chacune avec son lien), partageant un même PDF"""
+        from .ingestion_service import creer_groupe_en_masse
+
+        pdf = self.dossier_pdf(1) / '001.pdf'
+        correspondances = (
+            {f"Destinataire {i}": {"email": f"user{i}@example.com", "file": str(pdf), "file_name": f"{i:03d}.pdf"}}
+            for i in range(n)
+        )
+        group, _ = creer_groupe_en_masse(f"Benchmark {n}", correspondances)
+        return group
+
+# ==================== SCÉNARIOS ====================
+# Chaque scénario prépare ses données (non chronométré) et retourne
+# (fonction à chronométrer, nombre d'éléments traités).
+
+def _scenario_read_csv_file(format_csv):
+    def preparer(espace, n):
+        chemin = espace.csv(n, format_csv)
+        return (lambda: read_csv_file(chemin)), n
+    return preparer
+
+def _scenario_normalisation(espace, n):
+    df = generer_dataframe_destinataires(n)
+    return (lambda: clean_and_normalize_data(df)), n
+
+def _scenario_mappe(espace, n):
+    chemin, dossier = espace.csv(n), espace.dossier_pdf(n)
+    return (lambda: mappe(chemin, dossier)), n
+
+def _scenario_create_group(espace, n):
+    """POST de create_group (CSV + archive ZIP) puis exécution de l'import par le worker"""
+    from django.urls import reverse
+
+    from .import_jobs import traiter_imports
+
+    client = espace.client_admin()
+    chemin, archive = espace.csv(n), espace.archive_pdf(n)
+
+    def executer():
+        with open(chemin, 'rb') as csv_file, open(archive, 'rb') as pdf_archive:
+            response = client.post(reverse('create_group'), {
+                'group_name': f"Benchmark {n}", 'csv_file': csv_file, 'pdf_archive': pdf_archive,
+            })
+        assert response.status_code == 302, response.status_code
+        assert traiter_imports() == (1, 0)
+    return executer, n
+
+def _scenario_send_emails(espace, n):
+    """POST de send_emails puis envoi de la file par le worker (backend locmem)"""
+    from django.core import mail
+    from django.urls import reverse
+
+    from .email_queue import traiter_file
+
+    client = espace.client_admin()
+    group = espace.groupe(n)
+
+    def executer():
+        response = client.post(reverse('send_emails', args=[group.id]), {
+            'email_subject': 'Votre fichier', 'email_body': 'Bonjour {nom}, code {code} : {lien}',
+        })
+        assert response.status_code == 302, response.status_code
+        envoyes, _ = traiter_file()
+        assert envoyes == n, envoyes
+        mail.outbox = []
+    return executer, n
+
+# Téléchargements mesurés par échelle : la latence d'une vue ne dépend pas
+# du nombre de téléchargements, mais de la taille des tables
+TELECHARGEMENTS_PAR_ECHELLE = 200
+
+def _scenario_download_file_view(espace, n):
+    """Formulaire de vérification puis fichier, pour des liens d'un groupe de n unités"""
+    from django.test import Client
+    from django.urls import reverse
+
+    from .models import Link
+
+    group = espace.groupe(n)
+    liens = list(
+        Link.objects.filter(sending_unit__sending_group=group)
+        .select_related('sending_unit').order_by('id')[:TELECHARGEMENTS_PAR_ECHELLE]
+    )
+    client = Client()
+
+    def executer():
+        for lien in liens:
+            url = reverse('download_file', args=[lien.token])
+            client.get(url)
+            response = client.post(url, {'email': lien.sending_unit.email, 'access_code': lien.access_code},
+                                   follow=True)
+            assert response.status_code == 200, response.status_code
+            if response.streaming:
+                # Lu jusqu'au bout : le client de test ferme alors la réponse
+                b''.join(response.streaming_content)
+    return executer, len(liens)
+
+def _scenario_export_results(espace, n):
+    from django.urls import reverse
+
+    client = espace.client_admin()
+    group = espace.groupe(n)
+
+    def executer():
+        response = client.get(reverse('export_results', args=[group.id]))
+        assert response.status_code == 200, response.status_code
+        b''.join(response.streaming_content)
+    return executer, n
+
+SCENARIOS = {
+    **{f"read_csv_file.{format_csv}": _scenario_read_csv_file(format_csv) for format_csv in FORMATS_CSV},
+    'clean_and_normalize_data': _scenario_normalisation,
+    'mappe': _scenario_mappe,
+    'create_group': _scenario_create_group,
+    'send_emails': _scenario_send_emails,
+    'download_file_view': _scenario_download_file_view,
+    'export_results': _scenario_export_results,
+}
+
+ECHELLES = (1000, 10000, 100000)
+
+# ==================== SUITE ET RÉSULTATS ====================
+
+def _commit_git():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def reglages_suite(racine):
+    """
+    Réglages de la suite : stockage temporaire, emails en mémoire, sans
+    limitation de débit, journal des téléchargements gardé en mémoire
+    """
+    return {
+        'MEDIA_ROOT': str(racine / 'media'),
+        'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+        'EMAIL_RATE_LIMITS': {},
+        'IMPORT_PROCESSES': 1,
+        'DOWNLOAD_EVENT_FLUSH_INTERVAL': None,
+    }
+
+def mesurer_scenario(espace, nom, n, repetitions=1):
+    """Meilleur temps du scénario `nom` à l'échelle n"""
+    meilleur = None
+    elements = 0
+    for _ in range(repetitions):
+        fonction, elements = SCENARIOS[nom](espace, n)
+        debut = time.perf_counter()
+        fonction()
+        duree = time.perf_counter() - debut
+        meilleur = duree if meilleur is None else min(meilleur, duree)
+    return {
+        'scenario': nom,
+        'n': n,
+        'elements': elements,
+        'secondes': round(meilleur, 4),
+        'par_element_us': round(meilleur / elements * 1e6, 2) if elements else None,
+    }
+
+def executer_suite(echelles=ECHELLES, scenarios=None, repetitions=1, taille_pdf=1024, apres_mesure=None):
+    """
+    Exécute les scénarios (tous, ou ceux dont le nom commence par l'un de
+    `scenarios`) à chaque échelle. À appeler dans une base de test.
+
+    `apres_mesure(cle, mesure)`, si fourni, est appelé après chaque mesure.
+    Retourne le document JSON des résultats, indexé par « scénario[n] ».
+    """
+    noms = [nom for nom in SCENARIOS if not scenarios or any(nom.startswith(s) for s in scenarios)]
+    resultats = {}
+    with tempfile.TemporaryDirectory() as racine:
+        racine = Path(racine)
+        with override_settings(**reglages_suite(racine)):
+            espace = EspaceBenchmark(racine, taille_pdf=taille_pdf)
+            for n in echelles:
+                for nom in noms:
+                    cle = f"{nom}[{n}]"
+                    resultats[cle] = mesurer_scenario(espace, nom, n, repetitions=repetitions)
+                    if apres_mesure is not None:
+                        apres_mesure(cle, resultats[cle])
+
+    return {
+        'version': 1,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _commit_git(),
+        'python': platform.python_version(),
+        'cpu': os.cpu_count(),
+        'resultats': resultats,
+    }
+
+def comparer_resultats(reference, actuel, tolerance=0.2):
+    """
+    Compare deux documents de executer_suite, mesure par mesure.
+
+    Une mesure est une régression si elle est plus lente de plus de
+    `tolerance` (20 % par défaut) que la référence.
+    """
+    comparaison = []
+    for cle, mesure in actuel['resultats'].items():
+        ancienne = reference.get('resultats', {}).get(cle)
+        if not ancienne or not ancienne.get('secondes'):
+            continue
+        ratio = mesure['secondes'] / ancienne['secondes']
+        comparaison.append({
+            'cle': cle,
+            'avant_s': ancienne['secondes'],
+            'apres_s': mesure['secondes'],
+            'ratio': round(ratio, 3),
+            'regression': ratio > 1 + tolerance,
+        })
+    return comparaison
+
+def enregistrer_resultats(document, chemin):
+    with open(chemin, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2, ensure_ascii=False)
+
+def charger_resultats(chemin):
+    with open(chemin, encoding='utf-8') as f:
+        return json.load(f)
+
+# ==================== TÉLÉCHARGEMENTS CONCURRENTS (ASGI) ====================
+
+_URLS_ASYNC = None
+
+def urls_telechargement_async():
+    """
+    URLconf de l'application avec les vues de téléchargement asynchrones,
+    pour ROOT_URLCONF. Créé une seule fois : le cache des résolveurs
+    d'URL est indexé par l'URLconf.
+    """
+    global _URLS_ASYNC
+    if _URLS_ASYNC is None:
+        from django.urls import include, path
+
+        from .urls import download_urls
+
+        _URLS_ASYNC = types.ModuleType('urls_telechargement_async')
+        _URLS_ASYNC.urlpatterns = [
+            path('', include(download_urls(asynchrone=True))),
+            path('', include(settings.ROOT_URLCONF)),
+        ]
+    return _URLS_ASYNC
+
+def _cookies(entetes):
+    cookies = {}
+    for nom, valeur in entetes:
+        if nom.lower() == b'set-cookie':
+            cle, _, reste = valeur.decode('latin1').partition('=')
+            cookies[cle] = reste.split(';', 1)[0]
+    return cookies
+
+async def _requete_asgi(application, methode, chemin, entetes=(), corps=b'', envoyer_corps=None):
+    """
+    Requête HTTP en mémoire sur l'application ASGI. `envoyer_corps(bloc)`,
+    coroutine facultative, reçoit chaque bloc de la réponse (client lent).
+    Retourne (statut, en-têtes, taille du corps).
+    """
+    import asyncio
+
+    fin = asyncio.Event()
+    messages = [{'type': 'http.request', 'body': corps, 'more_body': False}]
+    reponse = {'statut': None, 'entetes': [], 'taille': 0}
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await fin.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            reponse['statut'] = message['status']
+            reponse['entetes'] = message['headers']
+        elif message['type'] == 'http.response.body':
+            if message.get('body'):
+                reponse['taille'] += len(message['body'])
+                if envoyer_corps is not None:
+                    await envoyer_corps(message['body'])
+            if not message.get('more_body'):
+                fin.set()
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': methode, 'scheme': 'http', 'path': chemin, 'raw_path': chemin.encode(),
+        'query_string': b'', 'root_path': '', 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        'headers': [(b'host', b'testserver'), (b'content-length', str(len(corps)).encode()), *entetes],
+    }
+    await application(scope, receive, send)
+    return reponse['statut'], reponse['entetes'], reponse['taille']
+
+def bench_telechargements_concurrents(clients=200, taille_pdf=256 * 1024, debit=256 * 1024):
+    """
+    Charge : `clients` téléchargements simultanés servis par un seul
+    processus ASGI (handler Django en mémoire, vues asynchrones). Chaque
+    client affiche le formulaire puis le soumet, et lit un PDF de
+    `taille_pdf` octets à `debit` octets/s. À appeler dans une base de test.
+
+    Le pic de flux simultanés est à comparer aux WEB_CONCURRENCY (4) flux
+    d'un processus gunicorn synchrone.
+    """
+    import asyncio
+    from urllib.parse import urlencode
+
+    from django.core.handlers.asgi import ASGIHandler
+    from django.urls import reverse
+
+    from .models import Link
+
+    etat = {'en_cours': 0, 'pic': 0}
+    urls = urls_telechargement_async()
+
+    with tempfile.TemporaryDirectory() as racine, \
+            override_settings(**reglages_suite(Path(racine)), ROOT_URLCONF=urls, FILE_DELIVERY_BACKEND='direct',
+                              PERF_SLOW_REQUEST_MS=None):
+        group = EspaceBenchmark(racine, taille_pdf=taille_pdf).groupe(clients)
+        liens = list(
+            Link.objects.filter(sending_unit__sending_group=group).select_related('sending_unit').order_by('id')
+        )
+        application = ASGIHandler()
+
+        async def telecharger(lien):
+            chemin = reverse('download_file', args=[lien.token])
+            _, entetes, _ = await _requete_asgi(application, 'GET', chemin)
+            csrf = _cookies(entetes)['csrftoken']
+            corps = urlencode({'email': lien.sending_unit.email, 'access_code': lien.access_code}).encode()
+
+            demarre = False
+
+            async def lire(bloc):
+                nonlocal demarre
+                if not demarre:
+                    demarre = True
+                    etat['en_cours'] += 1
+                    etat['pic'] = max(etat['pic'], etat['en_cours'])
+                await asyncio.sleep(len(bloc) / debit)
+
+            statut, _, taille = await _requete_asgi(application, 'POST', chemin, [
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'cookie', f'csrftoken={csrf}'.encode()),
+                (b'x-csrftoken', csrf.encode()),
+            ], corps, envoyer_corps=lire)
+            if demarre:
+                etat['en_cours'] -= 1
+            return statut, taille
+
+        async def charge():
+            return await asyncio.gather(*(telecharger(lien) for lien in liens))
+
+        debut = time.perf_counter()
+        resultats = asyncio.run(charge())
+        duree = time.perf_counter() - debut
+
+    reussis = [taille for statut, taille in resultats if statut == 200]
+    octets = sum(reussis)
+    return {
+        'clients': clients,
+        'taille_pdf': taille_pdf,
+        'reussis': len(reussis),
+        'pic_simultanes': etat['pic'],
+        'debit_client_ko_s': debit // 1024,
+        'duree_s': round(duree, 3),
+        # Même charge sur 4 workers synchrones (WEB_CONCURRENCY) : un client à la fois par worker
+        'duree_4_flux_s': round(octets / debit / 4, 3),
+        'octets': octets,
+    }
+
+# ==================== INDEX DES RECHERCHES FRÉQUENTES ====================
+# Requêtes chaudes sur SendingUnit et Link et index censé les servir
+# (voir Meta.indexes des modèles). Chaque entrée reçoit un groupe et une
+# unité de ce groupe et retourne le queryset à évaluer ; l'index attendu est
+# un nom, ou un tuple de noms quand plusieurs index équivalents existent.
+
+INDEX_TRI_PAR_NOM = 'unit_group_name_id_idx'
+
+def _page_suivante(group, unit):
+    # Pagination par clé de la page de détail (core/unit_pages.py)
+    from .unit_pages import apres_repere
+
+    return apres_repere(group.sending_units, unit.name, unit.pk).order_by('name', 'id')
+
+REQUETES_INDEXEES = {
+    'unites_en_attente': (
+        lambda group, unit: group.sending_units.filter(sending_date__isnull=True).order_by('id').values_list('id'),
+        'unit_pending_idx',
+    ),
+    'detail_groupe': (
+        lambda group, unit: group.sending_units.order_by('name', 'id').values_list('id')[:100],
+        INDEX_TRI_PAR_NOM,
+    ),
+    'detail_groupe_page_suivante': (
+        lambda group, unit: _page_suivante(group, unit).values_list('id')[:100],
+        INDEX_TRI_PAR_NOM,
+    ),
+    'recherche_nom': (
+        lambda group, unit: group.sending_units.filter(name_search__startswith=unit.name_search[:6]).values_list('id'),
+        'unit_group_name_search_idx',
+    ),
+    'recherche_email': (
+        lambda group, unit: group.sending_units.filter(email__startswith=unit.email[:6]).values_list('id'),
+        'unit_group_email_prefix_idx',
+    ),
+    'unites_recues': (
+        lambda group, unit: group.sending_units.filter(received=True).values_list('id'),
+        'unit_received_idx',
+    ),
+    'dernier_lien': (
+        lambda group, unit: unit.links.order_by('-id').values_list('access_code')[:1],
+        'link_latest_idx',
+    ),
+    'liens_valides': (
+        lambda group, unit: unit.links.filter(used=False).values_list('id'),
+        'link_unused_idx',
+    ),
+}
+
+def plan_requete(queryset, forcer_index=False):
+    """
+    Plan d'exécution du queryset (EXPLAIN), en texte.
+
+    Sur PostgreSQL, `forcer_index` désactive le parcours séquentiel le temps
+    de l'EXPLAIN : sur une petite table le planificateur le préfère toujours,
+    ce qui ne dit rien des index disponibles.
+    """
+    from django.db import connections
+
+    connexion = connections[queryset.db]
+    if not (forcer_index and connexion.vendor == 'postgresql'):
+        return queryset.explain()
+    with connexion.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            return queryset.explain()
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+def peupler_unites(n_unites, taille_groupe=10000, taille_lot=5000, graine=0):
+    """
+    Insère n_unites unités (et un lien chacune) réparties en groupes de
+    `taille_groupe`, sans fichier sur disque. Environ 30 % des unités restent
+    à envoyer, 40 % sont reçues (lien consommé). Retourne les ids des groupes.
+    """
+    from django.db import transaction
+
+    from .group_counters import ajuster_compteurs
+    from .models import Link, SendingGroup, SendingUnit
+
+    rng = np.random.default_rng(graine)
+    maintenant = datetime.now(timezone.utc)
+    groupes = []
+    for debut in range(0, n_unites, taille_groupe):
+        with transaction.atomic():
+            group = SendingGroup.objects.create(label=f"Index {debut // taille_groupe}")
+            groupes.append(group.id)
+            for lot in range(debut, min(debut + taille_groupe, n_unites), taille_lot):
+                fin = min(lot + taille_lot, debut + taille_groupe, n_unites)
+                tirages = rng.random(fin - lot)
+                units = [
+                    SendingUnit(
+                        sending_group=group,
+                        name=f"Destinataire {i:07d}",
+                        name_search=f"destinataire {i:07d}",
+                        email=f"user{i}@example.com",
+                        file='sending_files/benchmark.pdf',
+                        file_name=f"{i:07d}.pdf",
+                        sending_date=None if tirage < 0.3 else maintenant,
+                        received=tirage >= 0.6,
+                        received_date=maintenant if tirage >= 0.6 else None,
+                    )
+                    for i, tirage in zip(range(lot, fin), tirages.tolist())
+                ]
+                SendingUnit.objects.bulk_create(units, batch_size=taille_lot)
+                Link.objects.bulk_create([
+                    Link(sending_unit=unit, token=uuid.uuid4(), access_code=Link.generer_code_acces(),
+                         used=unit.received)
+                    for unit in units
+                ], batch_size=taille_lot)
+                ajuster_compteurs(
+                    group.pk, total=len(units),
+                    envoyes=sum(unit.sending_date is not None for unit in units),
+                    recus=sum(unit.received for unit in units),
+                )
+    return groupes
+
+def index_utilise(index, plan):
+    """Vrai si le plan passe par l'index attendu (ou l'un d'eux)"""
+    return any(nom in plan for nom in ((index,) if isinstance(index, str) else index))
+
+def _mesurer_requetes(group, unit, repetitions):
+    mesures = {}
+    for nom, (fabrique, index) in REQUETES_INDEXEES.items():
+        meilleur = None
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            lignes = len(list(fabrique(group, unit)))
+            duree = time.perf_counter() - debut
+            meilleur = duree if meilleur is None else min(meilleur, duree)
+        mesures[nom] = {
+            'lignes': lignes,
+            'ms': round(meilleur * 1000, 3),
+            'index_utilise': index_utilise(index, plan_requete(fabrique(group, unit))),
+        }
+    return mesures
+
+def bench_index_unites(n_unites=1000000, taille_groupe=10000, repetitions=5):
+    """
+    Requêtes chaudes sur une table de n_unites unités, avec puis sans les
+    index de Meta.indexes (supprimés le temps de la seconde mesure, puis
+    recréés). À appeler dans une base de test : la base est peuplée.
+    """
+    from django.db import connection
+
+    from .models import Link, SendingGroup, SendingUnit
+
+    debut = time.perf_counter()
+    groupes = peupler_unites(n_unites, taille_groupe=taille_groupe)
+    peuplement = time.perf_counter() - debut
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    # Groupe et unité du milieu de la table
+    group = SendingGroup.objects.get(id=groupes[len(groupes) // 2])
+    unit = group.sending_units.order_by('id')[taille_groupe // 2 if n_unites >= taille_groupe else 0]
+
+    avec_index = _mesurer_requetes(group, unit, repetitions)
+
+    index_modeles = [(model, idx) for model in (SendingUnit, Link) for idx in model._meta.indexes]
+    with connection.schema_editor() as editor:
+        for model, idx in index_modeles:
+            editor.remove_index(model, idx)
+    try:
+        sans_index = _mesurer_requetes(group, unit, repetitions)
+    finally:
+        with connection.schema_editor() as editor:
+            for model, idx in index_modeles:
+                editor.add_index(model, idx)
+
+    return {
+        'n_unites': n_unites,
+        'taille_groupe': taille_groupe,
+        'base': connection.vendor,
+        'peuplement_s': round(peuplement, 2),
+        'requetes': {
+            nom: {
+                'avec_index_ms': avec_index[nom]['ms'],
+                'sans_index_ms': sans_index[nom]['ms'],
+                'acceleration': (round(sans_index[nom]['ms'] / avec_index[nom]['ms'], 2)
+                                 if avec_index[nom]['ms'] else None),
+                'lignes': avec_index[nom]['lignes'],
+                'index_utilise': avec_index[nom]['index_utilise'],
+            }
+            for nom in REQUETES_INDEXEES
+        },
+    }
+
+if __name__ == '__main__':
+    tailles = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 200000]
+    for taille in tailles:
+        print(bench_normalisation(taille))
+        print(bench_appariement(taille))
+        print(bench_appariement(taille, sans_zeros=True))
+    if not settings.configured:
+        settings.configure()
+    print(bench_import_parallele(max(tailles)))
@@ -0,0 +1,98 @@
+# blob_store.py
+"""
+Stockage des PDF adressé par contenu.
+
+Chaque fichier est rangé sous MEDIA_ROOT/blobs/ab/cd/<sha256>.pdf : deux
+documents identiques, quel que soit leur nom ou leur campagne, ne sont
+stockés qu'une fois. L'empreinte est calculée pendant l'écriture des blocs
+(upload ou fichier sur disque), sans relire le fichier.
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+
+BLOB_PREFIX = 'blobs'
+
+TAILLE_BLOC = 64 * 1024
+
+@dataclass(frozen=True)
+class Blob:
+    name: str        # nom relatif à MEDIA_ROOT, à affecter au FileField
+    sha256: str
+    size: int
+    created: bool    # False si le contenu était déjà stocké
+
+    @property
+    def path(self):
+        return Path(settings.MEDIA_ROOT) / self.name
+
+def nom_blob(digest, extension='.pdf'):
+    """Nom relatif du blob d'empreinte `digest`"""
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}"
+
+def est_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX + '/')
+
+def empreinte_fichier(chemin):
+    """SHA-256 d'un fichier, lu par blocs"""
+    empreinte = hashlib.sha256()
+    with open(chemin, 'rb') as f:
+        while bloc := f.read(TAILLE_BLOC):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+def stocker_chunks(chunks, extension='.pdf'):
+    """
+    Écrit les blocs d'octets dans un fichier temporaire en calculant le SHA-256,
+    puis le déplace à son emplacement définitif s'il n'existe pas déjà.
+    """
+    racine = Path(settings.MEDIA_ROOT) / BLOB_PREFIX
+    dossier_tmp = racine / 'tmp'
+    dossier_tmp.mkdir(parents=True, exist_ok=True)
+
+    empreinte = hashlib.sha256()
+    taille = 0
+    fd, chemin_tmp = tempfile.mkstemp(dir=dossier_tmp, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                empreinte.update(chunk)
+                taille += len(chunk)
+                f.write(chunk)
+
+        name = nom_blob(empreinte.hexdigest(), extension)
+        destination = Path(settings.MEDIA_ROOT) / name
+        if destination.exists():
+            os.unlink(chemin_tmp)
+            return Blob(name, empreinte.hexdigest(), taille, created=False)
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        permissions = getattr(settings, 'FILE_UPLOAD_PERMISSIONS', None)
+        if permissions is not None:
+            os.chmod(chemin_tmp, permissions)
+        # Remplacement atomique : un écrivain concurrent du même contenu écrit les mêmes octets
+        os.replace(chemin_tmp, destination)
+        return Blob(name, empreinte.hexdigest(), taille, created=True)
+    except BaseException:
+        if os.path.exists(chemin_tmp):
+            os.unlink(chemin_tmp)
+        raise
+
+def stocker_upload(uploaded_file):
+    """Stocke un fichier uploadé (UploadedFile) au fil de ses chunks"""
+    return stocker_chunks(uploaded_file.chunks(), Path(uploaded_file.name).suffix or '.pdf')
+
+def stocker_fichier(chemin):
+    """Stocke un fichier présent sur disque, lu par blocs"""
+    chemin = Path(chemin)
+
+    def blocs():
+        with open(chemin, 'rb') as f:
+            while bloc := f.read(TAILLE_BLOC):
+                yield bloc
+
+    return stocker_chunks(blocs(), chemin.suffix or '.pdf')
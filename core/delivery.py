@@ -0,0 +1,220 @@
+# delivery.py
+"""
+Modes de livraison des fichiers téléchargés.
+
+Le fichier est toujours servi depuis le FileField de l'unité, sans copie.
+Le mode est choisi par settings.FILE_DELIVERY_BACKEND :
+
+- 'direct' : FileResponse servi par Django ;
+- 'x-accel-redirect' / 'x-sendfile' : Django ne renvoie que des en-têtes,
+  le serveur frontal (nginx, Apache) envoie les octets ;
+- 'range' : réponses partielles (Range, If-Range) et ETag/If-None-Match,
+  pour reprendre un téléchargement interrompu.
+
+Chaque mode a une variante asynchrone (aservir), utilisée par les vues de
+téléchargement sous ASGI : le fichier est lu par blocs dans des threads,
+le flux est envoyé par la boucle d'événements.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+
+TAILLE_BLOC = 64 * 1024
+
+def nom_affiche(unit):
+    """Nom convivial du fichier proposé au navigateur"""
+    return unit.file_name or unit.file.name.split('/')[-1]
+
+def _content_disposition(unit):
+    return f"attachment; filename*=UTF-8''{quote(nom_affiche(unit))}"
+
+async def iterer_fichier_async(fichier, longueur=None):
+    """
+    Générateur asynchrone des blocs d'un fichier ouvert (au plus `longueur`
+    octets) ; chaque lecture disque se fait dans un thread. Le fichier est
+    fermé à la fin du flux ou à la déconnexion du client.
+    """
+    lire = sync_to_async(fichier.read, thread_sensitive=False)
+    try:
+        while longueur is None or longueur > 0:
+            bloc = await lire(TAILLE_BLOC if longueur is None else min(TAILLE_BLOC, longueur))
+            if not bloc:
+                break
+            if longueur is not None:
+                longueur -= len(bloc)
+            yield bloc
+    finally:
+        fichier.close()
+
+async def lire_par_blocs_async(chemin, debut=0, longueur=None):
+    fichier = await sync_to_async(open, thread_sensitive=False)(chemin, 'rb')
+    if debut:
+        fichier.seek(debut)
+    async for bloc in iterer_fichier_async(fichier, longueur):
+        yield bloc
+
+class DirectBackend:
+    """FileResponse sur le fichier stocké, sans copie intermédiaire"""
+    reprise = False
+
+    def servir(self, request, unit):
+        return FileResponse(
+            unit.file.open('rb'),
+            as_attachment=True,
+            filename=nom_affiche(unit),
+            content_type='application/pdf'
+        )
+
+    async def aservir(self, request, unit):
+        chemin = unit.file.path
+        taille = (await sync_to_async(os.stat, thread_sensitive=False)(chemin)).st_size
+        response = StreamingHttpResponse(lire_par_blocs_async(chemin, 0, taille), content_type='application/pdf')
+        response['Content-Length'] = str(taille)
+        response['Content-Disposition'] = _content_disposition(unit)
+        return response
+
+class XAccelRedirectBackend:
+    """Délègue l'envoi à nginx via X-Accel-Redirect (emplacement interne)"""
+    reprise = False
+    header = 'X-Accel-Redirect'
+
+    def chemin_interne(self, unit):
+        prefixe = getattr(settings, 'FILE_DELIVERY_ACCEL_PREFIX', '/protected-media/')
+        return prefixe.rstrip('/') + '/' + quote(unit.file.name)
+
+    def servir(self, request, unit):
+        if not unit.file.storage.exists(unit.file.name):
+            raise FileNotFoundError(unit.file.name)
+
+        response = HttpResponse(content_type='application/pdf')
+        response[self.header] = self.chemin_interne(unit)
+        response['Content-Disposition'] = _content_disposition(unit)
+        return response
+
+    async def aservir(self, request, unit):
+        # Seule la vérification d'existence touche le disque
+        return await sync_to_async(self.servir, thread_sensitive=False)(request, unit)
+
+class XSendfileBackend(XAccelRedirectBackend):
+    """Délègue l'envoi à Apache/lighttpd via X-Sendfile (chemin absolu)"""
+    header = 'X-Sendfile'
+
+    def chemin_interne(self, unit):
+        return unit.file.path
+
+class RangeBackend:
+    """Réponses 200/206/304/416 avec ETag, pour la reprise des téléchargements"""
+    reprise = True
+    range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+    @staticmethod
+    def etag(stat):
+        return f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+    def servir(self, request, unit):
+        return self._servir(request, unit, self._lire)
+
+    async def aservir(self, request, unit):
+        return await sync_to_async(self._servir, thread_sensitive=False)(request, unit, lire_par_blocs_async)
+
+    def _servir(self, request, unit, lire):
+        chemin = unit.file.path
+        stat = os.stat(chemin)
+        taille = stat.st_size
+        etag = self.etag(stat)
+
+        entetes = {
+            'ETag': etag,
+            'Last-Modified': http_date(stat.st_mtime),
+            'Accept-Ranges': 'bytes',
+            'Content-Disposition': _content_disposition(unit),
+        }
+
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in [valeur.strip() for valeur in if_none_match.split(',')] or if_none_match.strip() == '*':
+            return self._reponse(HttpResponse(status=304), entetes)
+
+        plage = self._plage(request, etag, taille)
+        if plage == 'invalide':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{taille}'
+            return self._reponse(response, entetes)
+
+        debut, fin = plage or (0, taille - 1)
+        longueur = max(fin - debut + 1, 0)
+        response = StreamingHttpResponse(
+            lire(chemin, debut, longueur),
+            status=206 if plage else 200,
+            content_type='application/pdf'
+        )
+        response['Content-Length'] = str(longueur)
+        if plage:
+            response['Content-Range'] = f'bytes {debut}-{fin}/{taille}'
+        return self._reponse(response, entetes)
+
+    def _plage(self, request, etag, taille):
+        """Retourne (début, fin) inclusifs, None pour tout le fichier, ou 'invalide'"""
+        entete = request.headers.get('Range')
+        if not entete:
+            return None
+
+        # If-Range : la plage n'est honorée que si le fichier n'a pas changé
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range.strip() != etag:
+            return None
+
+        correspondance = self.range_re.match(entete.strip())
+        if not correspondance:
+            # Plages multiples ou unités inconnues : on sert le fichier complet
+            return None
+
+        debut, fin = correspondance.groups()
+        if not debut and not fin:
+            return 'invalide'
+        if not debut:
+            # Suffixe : les N derniers octets
+            debut, fin = max(taille - int(fin), 0), taille - 1
+        else:
+            debut = int(debut)
+            fin = min(int(fin), taille - 1) if fin else taille - 1
+
+        if debut >= taille or debut > fin:
+            return 'invalide'
+        return debut, fin
+
+    @staticmethod
+    def _lire(chemin, debut, longueur):
+        with open(chemin, 'rb') as f:
+            f.seek(debut)
+            while longueur > 0:
+                bloc = f.read(min(TAILLE_BLOC, longueur))
+                if not bloc:
+                    break
+                longueur -= len(bloc)
+                yield bloc
+
+    @staticmethod
+    def _reponse(response, entetes):
+        for nom, valeur in entetes.items():
+            response[nom] = valeur
+        return response
+
+BACKENDS = {
+    'direct': DirectBackend,
+    'x-accel-redirect': XAccelRedirectBackend,
+    'x-sendfile': XSendfileBackend,
+    'range': RangeBackend,
+}
+
+def get_delivery_backend(nom=None):
+    """Instancie le mode de livraison configuré (FILE_DELIVERY_BACKEND)"""
+    nom = nom or getattr(settings, 'FILE_DELIVERY_BACKEND', 'direct')
+    try:
+        return BACKENDS[nom]()
+    except KeyError:
+        raise ValueError(f"Mode de livraison inconnu : {nom}") from None
@@ -0,0 +1,285 @@
+# download_events.py
+"""
+Journal des téléchargements (DownloadEvent) et compteurs horaires (DownloadRollup).
+
+Les vues de téléchargement n'écrivent pas le journal elles-mêmes : chaque
+événement est ajouté au tampon du processus, écrit par bulk_create dans un
+thread d'arrière-plan dès que le tampon atteint DOWNLOAD_EVENT_BUFFER_SIZE
+événements, ou au plus tard DOWNLOAD_EVENT_FLUSH_INTERVAL secondes après le
+premier événement en attente, et à l'arrêt du processus. Un arrêt brutal du
+processus perd au plus le contenu du tampon.
+
+La commande rollup_download_events agrège le journal en compteurs horaires
+par groupe ; la page de détail d'un groupe ne lit que ces compteurs.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+from .models import DownloadEvent, DownloadRollup
+
+logger = logging.getLogger(__name__)
+
+def _reglage(nom, defaut):
+    return getattr(settings, nom, defaut)
+
+# ==================== TAMPON D'ÉCRITURE ====================
+
+class TamponEvenements:
+    """Événements en attente d'écriture, partagés par les threads du processus"""
+
+    def __init__(self):
+        self.evenements = []
+        self.verrou = threading.Lock()
+        self.minuteur = None
+
+    def ajouter(self, evenement):
+        """
+        Ajoute un événement sans toucher à la base. Avec
+        DOWNLOAD_EVENT_FLUSH_INTERVAL = None (tests), aucune écriture
+        automatique, pas même à l'arrêt : le tampon n'est vidé que par vider().
+        """
+        taille = _reglage('DOWNLOAD_EVENT_BUFFER_SIZE', 200)
+        intervalle = _reglage('DOWNLOAD_EVENT_FLUSH_INTERVAL', 5)
+        with self.verrou:
+            self.evenements.append(evenement)
+            if intervalle is None:
+                return
+            if len(self.evenements) >= taille:
+                delai = 0
+            elif self.minuteur is None:
+                delai = intervalle
+            else:
+                return
+            if self.minuteur is not None:
+                self.minuteur.cancel()
+            self.minuteur = threading.Timer(delai, self._vider_en_arriere_plan)
+            self.minuteur.daemon = True
+            self.minuteur.start()
+
+    def vider(self):
+        """Écrit les événements en attente ; retourne leur nombre"""
+        with self.verrou:
+            evenements, self.evenements = self.evenements, []
+            if self.minuteur is not None:
+                self.minuteur.cancel()
+                self.minuteur = None
+        if evenements:
+            DownloadEvent.objects.bulk_create(evenements, batch_size=500)
+        return len(evenements)
+
+    def _vider_en_arriere_plan(self):
+        try:
+            self.vider()
+        except Exception:
+            logger.exception("Écriture du journal des téléchargements impossible")
+        finally:
+            connection.close()
+
+    def reinitialiser(self):
+        """Abandonne les événements en attente (tests)"""
+        with self.verrou:
+            self.evenements.clear()
+            if self.minuteur is not None:
+                self.minuteur.cancel()
+                self.minuteur = None
+
+    def __len__(self):
+        with self.verrou:
+            return len(self.evenements)
+
+TAMPON = TamponEvenements()
+
+def vider_tampon():
+    return TAMPON.vider()
+
+@atexit.register
+def _vider_a_l_arret():
+    # Sans écriture programmée (DOWNLOAD_EVENT_FLUSH_INTERVAL = None), le tampon reste en mémoire
+    if TAMPON.minuteur is None:
+        return
+    try:
+        TAMPON.vider()
+    except Exception:
+        logger.exception("Événements de téléchargement perdus à l'arrêt du processus")
+
+class _FluxSuivi:
+    """
+    Contenu d'une réponse en flux : `terminer` est appelé une fois, à la fin
+    du flux ou, si l'envoi est interrompu, à la fermeture de la réponse
+    (qui ferme tout contenu muni d'une méthode close).
+    """
+
+    def __init__(self, contenu, terminer):
+        self.contenu = contenu
+        self.terminer = terminer
+        self.iterateur = None
+        self.termine = False
+
+    def __iter__(self):
+        self.iterateur = iter(self.contenu)
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.iterateur)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if not self.termine:
+            self.termine = True
+            self.terminer()
+
+class _FluxSuiviAsync(_FluxSuivi):
+    """Même chose pour un contenu asynchrone (vues ASGI)"""
+
+    def __aiter__(self):
+        self.iterateur = aiter(self.contenu)
+        return self
+
+    async def __anext__(self):
+        try:
+            return await anext(self.iterateur)
+        except StopAsyncIteration:
+            self.close()
+            raise
+
+class _FichierSuivi:
+    """
+    Fichier d'une FileResponse, enveloppé sans le lire : la réponse garde son
+    file_to_stream (wsgi.file_wrapper, sendfile) et `terminer` est appelé à
+    la fermeture du fichier, après l'envoi.
+    """
+
+    def __init__(self, fichier, terminer):
+        self._fichier = fichier
+        self._terminer = terminer
+        self._termine = False
+
+    def __getattr__(self, nom):
+        return getattr(self._fichier, nom)
+
+    def close(self):
+        try:
+            self._fichier.close()
+        finally:
+            if not self._termine:
+                self._termine = True
+                self._terminer()
+
+def suivre_telechargement(response, unit, link):
+    """
+    Journalise le fichier servi par `response` (200 ou 206) une fois l'envoi
+    terminé ou interrompu : le contenu de la réponse est enveloppé pour
+    observer la fin du flux. Retourne la réponse.
+    """
+    if response.status_code not in (200, 206):
+        return response
+
+    horodatage = timezone.now()
+    debut = time.perf_counter()
+    # Envoi délégué au serveur frontal (x-accel-redirect, x-sendfile) : ni taille ni durée
+    delegue = not response.streaming
+    octets = None if delegue or not response.has_header('Content-Length') else int(response['Content-Length'])
+
+    def terminer():
+        TAMPON.ajouter(DownloadEvent(
+            sending_group_id=unit.sending_group_id,
+            sending_unit_id=unit.pk,
+            link_id=link.pk if link is not None else None,
+            status=response.status_code,
+            bytes_sent=octets,
+            duration_ms=None if delegue else round((time.perf_counter() - debut) * 1000),
+            created_at=horodatage,
+        ))
+
+    if delegue:
+        # Seuls les en-têtes partent d'ici : l'envoi appartient au serveur frontal
+        terminer()
+    elif getattr(response, 'file_to_stream', None) is not None:
+        response.streaming_content = _FichierSuivi(response.file_to_stream, terminer)
+    elif response.is_async:
+        response.streaming_content = _FluxSuiviAsync(response.streaming_content, terminer)
+    else:
+        response.streaming_content = _FluxSuivi(response.streaming_content, terminer)
+    return response
+
+# ==================== COMPTEURS HORAIRES ====================
+
+def agreger_evenements(depuis=None, tout=False):
+    """
+    Recalcule les compteurs horaires à partir de l'heure de `depuis`, ou de
+    tout le journal si `tout` est vrai ou si aucun compteur n'existe. Par
+    défaut, recalcule depuis l'heure précédant le dernier compteur, pour
+    intégrer les événements écrits en retard. Idempotent. Retourne le
+    nombre de compteurs écrits.
+    """
+    if depuis is None and not tout:
+        derniere = DownloadRollup.objects.aggregate(derniere=Max('hour'))['derniere']
+        if derniere is not None:
+            depuis = derniere - timedelta(hours=1)
+
+    evenements = DownloadEvent.objects.all()
+    rollups = DownloadRollup.objects.all()
+    if depuis is not None:
+        depuis = depuis.replace(minute=0, second=0, microsecond=0)
+        evenements = evenements.filter(created_at__gte=depuis)
+        rollups = rollups.filter(hour__gte=depuis)
+
+    lignes = (
+        evenements
+        .annotate(heure=TruncHour('created_at'))
+        .values('sending_group_id', 'heure')
+        .annotate(
+            downloads=Count('id', filter=Q(status=200)),
+            resumes=Count('id', filter=Q(status=206)),
+            units=Count('sending_unit_id', distinct=True),
+            bytes_sent=Coalesce(Sum('bytes_sent'), 0),
+            duration_ms_total=Coalesce(Sum('duration_ms'), 0),
+            duration_count=Count('duration_ms'),
+        )
+        .order_by()
+    )
+
+    with transaction.atomic():
+        rollups.delete()
+        crees = DownloadRollup.objects.bulk_create([
+            DownloadRollup(
+                sending_group_id=ligne['sending_group_id'],
+                hour=ligne['heure'],
+                downloads=ligne['downloads'],
+                resumes=ligne['resumes'],
+                units=ligne['units'],
+                bytes_sent=ligne['bytes_sent'],
+                duration_ms_total=ligne['duration_ms_total'],
+                duration_count=ligne['duration_count'],
+            )
+            for ligne in lignes.iterator()
+        ], batch_size=500)
+    return len(crees)
+
+def statistiques_groupe(group, heures=24):
+    """Totaux du groupe et compteurs des `heures` dernières heures actives, lus dans DownloadRollup"""
+    rollups = group.download_rollups.all()
+    totaux = rollups.aggregate(
+        downloads=Coalesce(Sum('downloads'), 0),
+        resumes=Coalesce(Sum('resumes'), 0),
+        bytes_sent=Coalesce(Sum('bytes_sent'), 0),
+        duration_ms_total=Coalesce(Sum('duration_ms_total'), 0),
+        duration_count=Coalesce(Sum('duration_count'), 0),
+    )
+    totaux['duree_moyenne_ms'] = (
+        round(totaux['duration_ms_total'] / totaux['duration_count']) if totaux['duration_count'] else None
+    )
+    totaux['heures'] = list(rollups.order_by('-hour')[:heures])[::-1]
+    return totaux
@@ -0,0 +1,220 @@
+# email_queue.py
+"""
+File d'attente persistante des emails de campagne.
+
+La vue send_emails se contente d'enfiler un EmailJob par destinataire ;
+la commande process_email_jobs réclame les jobs par lots, les envoie,
+et réessaie les échecs avec un délai croissant.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Prefetch
+from django.utils import timezone
+
+from .group_counters import marquer_envoyees
+from .mailer import CampaignMailer, DomaineSature
+from .models import EmailJob, Link, SendingUnit
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = [EmailJob.STATUS_PENDING, EmailJob.STATUS_SENDING]
+
+def _reglage(nom, defaut):
+    return getattr(settings, nom, defaut)
+
+# ==================== ENFILEMENT ====================
+
+def personnaliser(body, unit, link, lien_absolu):
+    """Remplace {nom}, {code} et {lien} dans le corps du message"""
+    personalized_body = body.replace('{nom}', unit.name)
+    personalized_body = personalized_body.replace('{code}', str(link.access_code))
+    personalized_body = personalized_body.replace('{lien}', lien_absolu)
+    return personalized_body
+
+def enfiler_emails(group, subject, body, build_absolute_uri):
+    """
+    Crée un EmailJob pour chaque unité du groupe pas encore envoyée et sans job actif.
+
+    `build_absolute_uri` transforme le chemin du lien en URL absolue
+    (typiquement request.build_absolute_uri). Retourne le nombre de jobs créés.
+    """
+    units = (
+        group.sending_units
+        .filter(sending_date__isnull=True)
+        .exclude(email_jobs__status__in=ACTIVE_STATUSES)
+        .prefetch_related(Prefetch('links', queryset=Link.objects.order_by('-id')))
+    )
+
+    taille_lot = _reglage('EMAIL_JOB_BATCH_SIZE', 100)
+    jobs = []
+    total = 0
+
+    for unit in units.iterator(chunk_size=taille_lot):
+        links = list(unit.links.all())
+        if not links:
+            continue
+
+        # Dernier lien de l'unité, comme l'export et la page de détail
+        link = links[0]
+        jobs.append(EmailJob(
+            sending_group=group,
+            sending_unit=unit,
+            subject=subject,
+            body=personnaliser(body, unit, link, build_absolute_uri(link.get_download_url())),
+        ))
+
+        if len(jobs) >= taille_lot:
+            EmailJob.objects.bulk_create(jobs)
+            total += len(jobs)
+            jobs = []
+
+    if jobs:
+        EmailJob.objects.bulk_create(jobs)
+        total += len(jobs)
+
+    return total
+
+def progression(group):
+    """Nombre de jobs du groupe par statut"""
+    compteurs = {status: 0 for status, _ in EmailJob.STATUS_CHOICES}
+    for ligne in group.email_jobs.values('status').annotate(n=Count('id')):
+        compteurs[ligne['status']] = ligne['n']
+
+    compteurs['total'] = sum(compteurs.values())
+    compteurs['termine'] = (
+        compteurs[EmailJob.STATUS_PENDING] == 0 and compteurs[EmailJob.STATUS_SENDING] == 0
+    )
+    return compteurs
+
+# ==================== TRAITEMENT (WORKER) ====================
+
+def reclamer_jobs(batch_size):
+    """
+    Réclame un lot de jobs prêts à partir et les passe au statut "sending".
+
+    select_for_update(skip_locked=True) permet à plusieurs workers de tourner
+    en parallèle sans se disputer les mêmes lignes.
+    """
+    maintenant = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            EmailJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=EmailJob.STATUS_PENDING, next_attempt_at__lte=maintenant)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if jobs:
+            EmailJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=EmailJob.STATUS_SENDING,
+                attempts=F('attempts') + 1,
+                updated_at=maintenant,
+            )
+            for job in jobs:
+                job.status = EmailJob.STATUS_SENDING
+                job.attempts += 1
+
+    return jobs
+
+def liberer_jobs_bloques(delai=None):
+    """Remet en attente les jobs restés "sending" après l'arrêt brutal d'un worker"""
+    delai = delai or timedelta(seconds=_reglage('EMAIL_JOB_STALE_SECONDS', 600))
+    return EmailJob.objects.filter(
+        status=EmailJob.STATUS_SENDING,
+        updated_at__lt=timezone.now() - delai,
+    ).update(status=EmailJob.STATUS_PENDING)
+
+def delai_avant_nouvel_essai(attempts):
+    """Délai exponentiel : base, 2 x base, 4 x base, ... plafonné"""
+    base = _reglage('EMAIL_JOB_BACKOFF_SECONDS', 60)
+    plafond = _reglage('EMAIL_JOB_BACKOFF_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), plafond))
+
+def mailer_de_file():
+    """
+    Expéditeur du worker : un message dont le domaine n'a pas de jeton avant
+    EMAIL_MAX_DOMAIN_WAIT secondes est reporté plutôt que d'immobiliser la connexion.
+    """
+    return CampaignMailer(max_domain_wait=_reglage('EMAIL_MAX_DOMAIN_WAIT', 10))
+
+def construire_message(mailer, job):
+    """Message d'un job : texte brut et même contenu en version HTML"""
+    return mailer.construire_message(job.subject, job.body, job.sending_unit.email, html_body=job.body)
+
+def traiter_lot(jobs, mailer=None):
+    """
+    Envoie un lot de jobs réclamés, sur des connexions SMTP réutilisées
+    (voir CampaignMailer), puis enregistre les résultats.
+
+    Les succès sont enregistrés en quelques requêtes (jobs, SendingUnit.sending_date
+    et compteurs des groupes) ;
+    les échecs sont reprogrammés avec backoff ou marqués "failed".
+    Les messages d'un domaine saturé sont remis en attente jusqu'au retour de
+    son débit, sans compter de tentative.
+    Retourne (nombre d'envois réussis, nombre d'échecs).
+    """
+    max_attempts = _reglage('EMAIL_JOB_MAX_ATTEMPTS', 5)
+    mailer = mailer or mailer_de_file()
+    envoyes = []
+    echecs = 0
+
+    erreurs = mailer.envoyer([construire_message(mailer, job) for job in jobs])
+
+    for job, e in zip(jobs, erreurs):
+        if e is None:
+            envoyes.append(job)
+        elif isinstance(e, DomaineSature):
+            logger.debug("Envoi à %s reporté : %s", job.sending_unit.email, e)
+            EmailJob.objects.filter(pk=job.pk).update(
+                status=EmailJob.STATUS_PENDING,
+                attempts=F('attempts') - 1,
+                next_attempt_at=timezone.now() + timedelta(seconds=e.attente),
+            )
+        else:
+            echecs += 1
+            logger.warning("Erreur d'envoi pour %s (essai %s): %s", job.sending_unit.email, job.attempts, e)
+            if job.attempts >= max_attempts:
+                EmailJob.objects.filter(pk=job.pk).update(
+                    status=EmailJob.STATUS_FAILED, last_error=str(e)[:1000]
+                )
+            else:
+                EmailJob.objects.filter(pk=job.pk).update(
+                    status=EmailJob.STATUS_PENDING,
+                    last_error=str(e)[:1000],
+                    next_attempt_at=timezone.now() + delai_avant_nouvel_essai(job.attempts),
+                )
+
+    if envoyes:
+        maintenant = timezone.now()
+        with transaction.atomic():
+            EmailJob.objects.filter(pk__in=[job.pk for job in envoyes]).update(
+                status=EmailJob.STATUS_SENT, sent_at=maintenant, last_error=''
+            )
+            marquer_envoyees([job.sending_unit_id for job in envoyes], maintenant)
+
+    return len(envoyes), echecs
+
+def traiter_file(batch_size=None, max_lots=None, mailer=None):
+    """Traite les jobs disponibles jusqu'à épuisement (ou max_lots lots)"""
+    batch_size = batch_size or _reglage('EMAIL_JOB_BATCH_SIZE', 100)
+    mailer = mailer or mailer_de_file()
+    total_envoyes = total_echecs = lots = 0
+
+    while max_lots is None or lots < max_lots:
+        jobs = reclamer_jobs(batch_size)
+        if not jobs:
+            break
+
+        # Charger les destinataires en une requête
+        units = SendingUnit.objects.in_bulk([job.sending_unit_id for job in jobs])
+        for job in jobs:
+            job.sending_unit = units[job.sending_unit_id]
+
+        envoyes, echecs = traiter_lot(jobs, mailer=mailer)
+        total_envoyes += envoyes
+        total_echecs += echecs
+        lots += 1
+
+    return total_envoyes, total_echecs
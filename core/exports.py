@@ -0,0 +1,114 @@
+# exports.py
+"""
+Export des résultats d'un groupe.
+
+Les unités sont lues par paquets avec .iterator() et le dernier code d'accès
+de chaque unité est obtenu par une sous-requête : l'export tient en une seule
+requête SQL et en mémoire quasi constante, quelle que soit la taille du groupe.
+"""
+import csv
+import tempfile
+import zlib
+
+from django.db.models import OuterRef, Subquery
+
+from .models import Link
+
+EXPORT_HEADER = ['Nom', 'Email', 'Date envoi', 'Reçu', 'Date réception', 'Code d\'accès']
+
+# Unités lues par aller-retour avec la base
+EXPORT_CHUNK_SIZE = 2000
+
+def lignes_export(group, chunk_size=EXPORT_CHUNK_SIZE):
+    """Générateur des lignes d'export (sans l'en-tête), en une seule requête"""
+    dernier_code = Link.objects.filter(sending_unit=OuterRef('pk')).order_by('-id').values('access_code')[:1]
+    units = (
+        group.sending_units
+        .annotate(latest_access_code=Subquery(dernier_code))
+        .order_by('id')
+        .values_list('name', 'email', 'sending_date', 'received', 'received_date', 'latest_access_code')
+    )
+
+    for name, email, sending_date, received, received_date, access_code in units.iterator(chunk_size=chunk_size):
+        yield [
+            name,
+            email,
+            sending_date.strftime('%Y-%m-%d %H:%M') if sending_date else '',
+            'Oui' if received else 'Non',
+            received_date.strftime('%Y-%m-%d %H:%M') if received_date else '',
+            access_code or '',
+        ]
+
+class _Tampon:
+    """Pseudo-fichier pour csv.writer : write() retourne la ligne au lieu de l'écrire"""
+
+    def write(self, value):
+        return value
+
+def iter_csv(group):
+    """Export CSV ligne par ligne (chaînes de caractères)"""
+    writer = csv.writer(_Tampon())
+    yield writer.writerow(EXPORT_HEADER)
+    for ligne in lignes_export(group):
+        yield writer.writerow(ligne)
+
+def iter_csv_gzip(group, taille_bloc=64 * 1024):
+    """Export CSV compressé en gzip à la volée"""
+    compresseur = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 : en-tête gzip
+    tampon = []
+    taille = 0
+
+    for ligne in iter_csv(group):
+        tampon.append(ligne.encode('utf-8'))
+        taille += len(tampon[-1])
+        if taille >= taille_bloc:
+            bloc = compresseur.compress(b''.join(tampon))
+            tampon, taille = [], 0
+            if bloc:
+                yield bloc
+
+    yield compresseur.compress(b''.join(tampon)) + compresseur.flush()
+
+def fichier_xlsx(group):
+    """
+    Export XLSX (openpyxl, mode write-only) dans un fichier temporaire.
+
+    Lève ImportError si openpyxl n'est pas installé.
+    """
+    from openpyxl import Workbook
+
+    classeur = Workbook(write_only=True)
+    feuille = classeur.create_sheet('Résultats')
+    feuille.append(EXPORT_HEADER)
+    for ligne in lignes_export(group):
+        feuille.append(ligne)
+
+    fichier = tempfile.TemporaryFile()
+    classeur.save(fichier)
+    fichier.seek(0)
+    return fichier
+
+def fichier_parquet(group, taille_lot=EXPORT_CHUNK_SIZE * 5):
+    """
+    Export Parquet (pyarrow), écrit par groupes de lignes dans un fichier temporaire.
+
+    Lève ImportError si pyarrow n'est pas installé.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(colonne, pa.string()) for colonne in EXPORT_HEADER])
+    fichier = tempfile.TemporaryFile()
+
+    with pq.ParquetWriter(fichier, schema) as writer:
+        lot = []
+        for ligne in lignes_export(group):
+            lot.append(ligne)
+            if len(lot) >= taille_lot:
+                writer.write_table(pa.Table.from_pylist([dict(zip(EXPORT_HEADER, l)) for l in lot], schema))
+                lot = []
+        if lot:
+            writer.write_table(pa.Table.from_pylist([dict(zip(EXPORT_HEADER, l)) for l in lot], schema))
+
+    fichier.seek(0)
+    return fichier
@@ -0,0 +1,144 @@
+# file_index.py
+"""
+Index des PDF d'un dossier par code normalisé.
+
+Les codes des fichiers et ceux du CSV sont ramenés à une même clé canonique
+(« 001 », « 1 », « 01 » et « 1.0 » donnent « 1 ») : l'appariement d'un
+enregistrement est une seule recherche dans un dictionnaire, et celui d'un
+bloc entier une jointure de hachage pandas (pd.Index.get_indexer).
+
+Quand plusieurs fichiers donnent la même clé (« 1.pdf » et « 001.pdf »),
+la clé est ambiguë : seul le fichier dont le nom correspond exactement au
+code est retenu, et l'ambiguïté est signalée une fois dans le rapport.
+"""
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DECIMALE_NULLE_RE = re.compile(r'(\d+)\.0*')
+
+def cle_canonique(code):
+    """Clé de rapprochement d'un code : sans espaces, zéros de tête ni décimale nulle"""
+    code = str(code).strip()
+    if not code.isdigit():
+        decimal = DECIMALE_NULLE_RE.fullmatch(code)
+        if decimal is None:
+            return code
+        code = decimal.group(1)
+    return code.lstrip('0') or '0'
+
+def cles_canoniques(codes):
+    """Version vectorisée de cle_canonique pour une Series de codes"""
+    codes = codes.astype(str).str.strip()
+    entiers = codes.str.isdigit()
+
+    # Décimales nulles (« 12.0 ») : l'expression régulière ne s'applique qu'aux codes avec un point
+    points = ~entiers & codes.str.contains('.', regex=False)
+    if points.any():
+        decimaux = codes[points].str.fullmatch(DECIMALE_NULLE_RE.pattern)
+        if decimaux.any():
+            codes = codes.copy()
+            a_tronquer = decimaux[decimaux].index
+            codes[a_tronquer] = codes[a_tronquer].str.split('.', n=1).str[0]
+            entiers = entiers.copy()
+            entiers[a_tronquer] = True
+
+    if entiers.any():
+        codes = codes.copy()
+        cles = codes[entiers].str.lstrip('0')
+        codes[entiers] = cles.mask(cles == '', '0')
+    return codes
+
+class FileIndex:
+    """
+    Index {clé canonique: fichier} construit une fois par dossier.
+
+    `fichiers` associe le code d'un fichier (son nom sans extension) à son chemin.
+    """
+
+    def __init__(self, fichiers):
+        self.fichiers = dict(fichiers)
+        codes = pd.Series(list(self.fichiers), dtype=object)
+        cles = cles_canoniques(codes)
+
+        # Index de hachage pandas : codes exacts, et clés canoniques sans ambiguïté
+        self._index_codes = pd.Index(codes)
+        self._chemins = np.array(list(self.fichiers.values()), dtype=object)
+        uniques = ~cles.duplicated(keep=False)
+        self._index_cles = pd.Index(cles[uniques])
+        self._positions_cles = np.flatnonzero(uniques.to_numpy())
+
+        self.cles = dict(zip(self._index_cles, codes[uniques]))
+        # Clé -> codes des fichiers qui la partagent
+        self.ambiguites = {}
+        for cle, code in zip(cles[~uniques], codes[~uniques]):
+            self.ambiguites.setdefault(cle, []).append(code)
+        for liste in self.ambiguites.values():
+            liste.sort()
+
+    @classmethod
+    def depuis_dossier(cls, dossier_pdf):
+        from .utils import lire_dossier
+
+        return cls(lire_dossier(dossier_pdf))
+
+    def __len__(self):
+        return len(self.fichiers)
+
+    def __bool__(self):
+        return bool(self.fichiers)
+
+    def rechercher(self, code):
+        """Retourne (code du fichier, chemin) correspondant au code, ou None"""
+        code = str(code).strip()
+        # Un nom de fichier identique au code est toujours le bon, même si sa clé est ambiguë
+        trouve = code if code in self.fichiers else self.cles.get(cle_canonique(code))
+        return (trouve, self.fichiers[trouve]) if trouve is not None else None
+
+    def joindre(self, records):
+        """
+        Apparie un DataFrame d'enregistrements (colonne `code`) par jointure
+        de hachage : d'abord sur le code exact, puis sur la clé canonique
+        pour les seuls codes restants.
+
+        Retourne une copie avec les colonnes `code_fichier` et `fichier`,
+        vides (NaN) pour les enregistrements sans fichier.
+        """
+        resultat = records.reset_index(drop=True)
+        codes = resultat['code'].astype(str)
+
+        positions = self._index_codes.get_indexer(codes)
+        restants = np.flatnonzero(positions < 0)
+        if len(restants) and len(self._index_cles):
+            cles = cles_canoniques(codes.iloc[restants])
+            par_cle = self._index_cles.get_indexer(cles)
+            trouves = par_cle >= 0
+            positions[restants[trouves]] = self._positions_cles[par_cle[trouves]]
+
+        trouves = positions >= 0
+        code_fichier = np.full(len(resultat), np.nan, dtype=object)
+        fichier = np.full(len(resultat), np.nan, dtype=object)
+        code_fichier[trouves] = self._index_codes.to_numpy()[positions[trouves]]
+        fichier[trouves] = self._chemins[positions[trouves]]
+
+        resultat['code_fichier'] = code_fichier
+        resultat['fichier'] = fichier
+        return resultat
+
+    def rapport_ambiguites(self):
+        """Lignes décrivant chaque clé partagée par plusieurs fichiers"""
+        return [
+            f"Clé '{cle}' ambiguë : {', '.join(codes)} (seul le code exact est apparié)"
+            for cle, codes in sorted(self.ambiguites.items())
+        ]
+
+    def apercu_codes(self, limite=10):
+        """Quelques codes disponibles, pour les messages d'erreur"""
+        return sorted(self.fichiers)[:limite]
+
+    @staticmethod
+    def nom_fichier(code_fichier, chemin):
+        """Nom d'origine du fichier : son code suivi de son extension"""
+        return f"{code_fichier}{Path(chemin).suffix}"
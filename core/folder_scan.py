@@ -0,0 +1,177 @@
+# folder_scan.py
+"""
+Indexation d'un dossier de PDF avec os.scandir.
+
+Un seul parcours par dossier, extensions comparées sans tenir compte de la
+casse (.pdf, .PDF, .Pdf), sous-dossiers en option, répartis sur un pool de
+threads (utile sur les montages réseau où chaque listage est lent).
+
+Le résultat est mis en cache dans un fichier voisin du dossier
+(.<nom>.pdfindex.json, à côté du dossier et non dedans, pour ne pas
+modifier sa date) et réutilisé tant que la date de modification de chaque
+dossier parcouru est inchangée.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS_PDF = ('.pdf',)
+
+VERSION_CACHE = 1
+
+# Un dossier modifié moins de 2 s avant le parcours n'est pas mis en cache :
+# sur les systèmes de fichiers à la seconde près, un ajout pendant le
+# parcours pourrait passer inaperçu.
+MARGE_MTIME_NS = 2 * 10**9
+
+class EntreePdf(NamedTuple):
+    code: str
+    chemin: str
+    taille: Optional[int] = None
+    mtime: Optional[float] = None
+
+def chemin_cache(dossier):
+    """Fichier d'index voisin du dossier"""
+    dossier = Path(dossier).resolve()
+    return dossier.parent / f".{dossier.name}.pdfindex.json"
+
+def _scanner(dossier, recursif, avec_stats):
+    """Parcourt un seul dossier : (entrées PDF, sous-dossiers)"""
+    entrees, sous_dossiers = [], []
+    with os.scandir(dossier) as iterateur:
+        for element in iterateur:
+            if element.is_dir(follow_symlinks=False):
+                if recursif:
+                    sous_dossiers.append(element.path)
+                continue
+            racine, extension = os.path.splitext(element.name)
+            if extension.lower() not in EXTENSIONS_PDF or not element.is_file():
+                continue
+            if avec_stats:
+                stat = element.stat()
+                entrees.append(EntreePdf(racine.strip(), element.path, stat.st_size, stat.st_mtime))
+            else:
+                entrees.append(EntreePdf(racine.strip(), element.path))
+    return entrees, sous_dossiers
+
+def _parcourir(dossier, recursif, avec_stats, threads):
+    """Parcours complet : (entrées, {dossier: mtime_ns} des dossiers parcourus)"""
+    entrees = []
+    dossiers = {}
+
+    def scanner(chemin):
+        dossiers[chemin] = os.stat(chemin).st_mtime_ns
+        return _scanner(chemin, recursif, avec_stats)
+
+    if not recursif or not threads or threads <= 1:
+        a_parcourir = [str(dossier)]
+        while a_parcourir:
+            trouvees, sous_dossiers = scanner(a_parcourir.pop())
+            entrees.extend(trouvees)
+            a_parcourir.extend(sous_dossiers)
+        return entrees, dossiers
+
+    # Chaque sous-dossier découvert est soumis au pool dès que son parent est lu
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        en_cours = {pool.submit(scanner, str(dossier))}
+        while en_cours:
+            terminees, en_cours = wait(en_cours, return_when=FIRST_COMPLETED)
+            for future in terminees:
+                trouvees, sous_dossiers = future.result()
+                entrees.extend(trouvees)
+                en_cours |= {pool.submit(scanner, chemin) for chemin in sous_dossiers}
+    return entrees, dossiers
+
+def _lire_cache(dossier, recursif, avec_stats):
+    try:
+        with open(chemin_cache(dossier), encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (cache.get('version') != VERSION_CACHE or cache.get('racine') != str(dossier)
+            or cache.get('recursif') != recursif or (avec_stats and not cache.get('avec_stats'))):
+        return None
+
+    # Le cache n'est valable que si aucun dossier parcouru n'a changé
+    try:
+        for chemin, mtime_ns in cache['dossiers'].items():
+            if os.stat(chemin).st_mtime_ns != mtime_ns:
+                return None
+    except OSError:
+        return None
+
+    return [EntreePdf(*entree) if avec_stats else EntreePdf(*entree[:2]) for entree in cache['entrees']]
+
+def _ecrire_cache(dossier, recursif, avec_stats, entrees, dossiers, debut_ns):
+    if any(mtime_ns > debut_ns - MARGE_MTIME_NS for mtime_ns in dossiers.values()):
+        return
+    cache = {
+        'version': VERSION_CACHE,
+        'racine': str(dossier),
+        'recursif': recursif,
+        'avec_stats': avec_stats,
+        'dossiers': dossiers,
+        'entrees': [list(entree) for entree in entrees],
+    }
+    destination = chemin_cache(dossier)
+    temporaire = destination.with_name(destination.name + '.tmp')
+    try:
+        with open(temporaire, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(temporaire, destination)
+    except OSError as e:
+        # Dossier parent en lecture seule : l'index n'est simplement pas mis en cache
+        logger.debug("Index de %s non mis en cache : %s", dossier, e)
+
+def indexer_dossier(dossier, recursif=False, avec_stats=False, threads=None, cache=True):
+    """
+    Liste les PDF d'un dossier, triés par chemin.
+
+    - recursif : parcourir aussi les sous-dossiers
+    - avec_stats : renseigner la taille et la date de modification de chaque fichier
+    - threads : nombre de threads pour parcourir les sous-dossiers en parallèle
+    - cache : lire et écrire l'index voisin du dossier
+
+    Lève FileNotFoundError / NotADirectoryError si le dossier n'est pas valide.
+    """
+    dossier = Path(dossier).resolve()
+    if not dossier.exists():
+        raise FileNotFoundError(f"Le dossier {dossier} n'existe pas")
+    if not dossier.is_dir():
+        raise NotADirectoryError(f"{dossier} n'est pas un dossier")
+
+    if cache:
+        entrees = _lire_cache(dossier, recursif, avec_stats)
+        if entrees is not None:
+            return entrees
+
+    debut_ns = time.time_ns()
+    entrees, dossiers = _parcourir(dossier, recursif, avec_stats, threads)
+    entrees.sort(key=lambda entree: entree.chemin)
+
+    if cache:
+        _ecrire_cache(dossier, recursif, avec_stats, entrees, dossiers, debut_ns)
+    return entrees
+
+def fichiers_par_code(entrees):
+    """
+    Dictionnaire {code: chemin}. Si plusieurs fichiers ont le même code
+    (sous-dossiers, ou « a.pdf » et « a.PDF »), le premier par chemin est gardé.
+    """
+    fichiers = {}
+    doublons = 0
+    for entree in entrees:
+        if entree.code in fichiers:
+            doublons += 1
+            continue
+        fichiers[entree.code] = entree.chemin
+    if doublons:
+        logger.warning("%s fichier(s) ignoré(s) : code déjà présent dans le dossier", doublons)
+    return fichiers
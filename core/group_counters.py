@@ -0,0 +1,97 @@
+# group_counters.py
+"""
+Compteurs dénormalisés d'un groupe d'envoi (SendingGroup.total_count,
+sent_count, received_count).
+
+Ils sont tenus à jour par des UPDATE relatifs (F()) au moment où les unités
+changent d'état : création, premier envoi, réception, renvoi d'un lien.
+Le tableau de bord et la page de détail d'un groupe les lisent tels quels,
+sans agréger SendingUnit.
+
+Un écart (écriture directe en base, incident) est corrigé par
+reconcilier_compteurs (commande reconcile_group_counters).
+"""
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import SendingGroup, SendingUnit
+
+logger = logging.getLogger(__name__)
+
+def ajuster_compteurs(group_id, total=0, envoyes=0, recus=0):
+    """Ajoute les écarts donnés aux compteurs du groupe, en un UPDATE relatif"""
+    ecarts = {
+        champ: F(champ) + ecart
+        for champ, ecart in (('total_count', total), ('sent_count', envoyes), ('received_count', recus))
+        if ecart
+    }
+    if ecarts:
+        SendingGroup.objects.filter(pk=group_id).update(**ecarts)
+
+def marquer_envoyees(unit_ids, date_envoi):
+    """
+    Enregistre la date d'envoi des unités et compte, par groupe, celles
+    qui n'avaient encore jamais été envoyées. À appeler dans une transaction.
+    """
+    # Verrouille les unités : un renvoi simultané ne peut pas les compter une seconde fois
+    premiers_envois = Counter(
+        SendingUnit.objects.select_for_update()
+        .filter(pk__in=unit_ids, sending_date__isnull=True)
+        .values_list('sending_group_id', flat=True)
+    )
+    SendingUnit.objects.filter(pk__in=unit_ids).update(sending_date=date_envoi)
+    for group_id, nombre in premiers_envois.items():
+        ajuster_compteurs(group_id, envoyes=nombre)
+
+def compter_unites(groupes=None):
+    """Compteurs recalculés depuis SendingUnit : {group_id: (total, envoyées, reçues)}"""
+    unites = SendingUnit.objects.all()
+    if groupes is not None:
+        unites = unites.filter(sending_group__in=groupes)
+    lignes = (
+        unites.values('sending_group_id')
+        .annotate(
+            total=Count('id'),
+            envoyes=Count('id', filter=Q(sending_date__isnull=False)),
+            recus=Count('id', filter=Q(received=True)),
+        )
+        .order_by()
+    )
+    return {ligne['sending_group_id']: (ligne['total'], ligne['envoyes'], ligne['recus']) for ligne in lignes}
+
+def reconcilier_compteurs(groupes=None, simulation=False):
+    """
+    Compare les compteurs des groupes (tous, ou les ids de `groupes`) aux
+    unités et corrige ceux qui divergent, sauf en simulation. Retourne la
+    liste des écarts : [(groupe, compteurs en base, compteurs recalculés)].
+    """
+    groups = SendingGroup.objects.order_by('id')
+    if groupes is not None:
+        groups = groups.filter(pk__in=groupes)
+
+    with transaction.atomic():
+        # Les groupes sont verrouillés : aucun ajustement ne peut se glisser entre comptage et correction
+        groups = list(groups.select_for_update())
+        reels = compter_unites(None if groupes is None else [group.pk for group in groups])
+
+        ecarts = []
+        for group in groups:
+            en_base = (group.total_count, group.sent_count, group.received_count)
+            attendus = reels.get(group.pk, (0, 0, 0))
+            if en_base != attendus:
+                ecarts.append((group, en_base, attendus))
+                group.total_count, group.sent_count, group.received_count = attendus
+
+        if ecarts and not simulation:
+            SendingGroup.objects.bulk_update(
+                [group for group, _, _ in ecarts], ['total_count', 'sent_count', 'received_count'],
+                batch_size=500,
+            )
+
+    for group, en_base, attendus in ecarts:
+        logger.warning("Compteurs du groupe %s %s : %s au lieu de %s", group.pk,
+                       "divergents" if simulation else "corrigés", en_base, attendus)
+    return ecarts
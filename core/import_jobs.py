@@ -0,0 +1,365 @@
+# import_jobs.py
+"""
+Import des campagnes en arrière-plan.
+
+La vue create_group se contente d'enregistrer les fichiers reçus dans un
+dossier de travail (MEDIA_ROOT/imports/<id>/) et de créer un ImportJob ;
+la commande process_import_jobs exécute ensuite l'import en deux étapes :
+
+1. stockage des PDF (fichiers isolés et archives ZIP) dans blobs/, en
+   parallèle sur un pool de threads ;
+2. lecture du CSV et appariement dans un thread producteur, pendant que le
+   thread principal insère les unités par lots : les deux phases se
+   recouvrent au lieu de s'enchaîner.
+
+Avec IMPORT_PROCESSES > 1, le stockage et l'appariement sont en plus
+répartis sur un pool de processus (voir parallel_import).
+
+Les compteurs de progression sont enregistrés en base au fil de l'eau et
+exposés en JSON (voir progression_import). L'état du job étant persistant,
+un job interrompu par un redémarrage est repris depuis le début : la
+création du groupe est atomique et le stockage par contenu idempotent.
+"""
+import contextvars
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .blob_store import stocker_fichier
+from .ingestion_service import creer_groupe_en_masse
+from .instrumentation import etape, suivre_import
+from .models import ImportJob
+from .parallel_import import iter_correspondances_paralleles, nombre_de_processus, stocker_pdfs_en_parallele
+from .upload_sessions import chemin_assemble, marquer_utilisee, sessions_terminees
+from .utils import iter_correspondances
+from .zip_import import ArchiveInvalide, compter_pdf_zip, importer_zip
+
+logger = logging.getLogger(__name__)
+
+# Intervalle minimal entre deux enregistrements de la progression (secondes)
+INTERVALLE_PROGRESSION = 0.5
+
+def _reglage(nom, defaut):
+    return getattr(settings, nom, defaut)
+
+def dossier_travail(job):
+    return Path(settings.MEDIA_ROOT) / 'imports' / str(job.pk)
+
+# ==================== ENFILEMENT ====================
+
+def _enregistrer(upload, destination):
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    with open(destination, 'wb') as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+
+def enfiler_import(group_name, csv_file, pdf_files=(), pdf_archive=None, upload_session_ids=(), user=None):
+    """
+    Enregistre les fichiers reçus dans le dossier de travail et crée le job.
+
+    Les fichiers sont d'abord écrits dans un dossier provisoire ; le job est
+    créé avec ses sources complètes et le dossier renommé en dossier de
+    travail dans une même transaction : un worker ne voit jamais un job
+    dont les fichiers ne sont pas en place.
+
+    Seules les sessions d'upload terminées (et appartenant à `user`) sont retenues.
+    """
+    racine = Path(settings.MEDIA_ROOT) / 'imports'
+    racine.mkdir(parents=True, exist_ok=True)
+    dossier = Path(tempfile.mkdtemp(prefix='reception-', dir=racine))
+    try:
+        _enregistrer(csv_file, dossier / 'data.csv')
+        pdfs = []
+        for pdf_file in pdf_files:
+            nom = Path(pdf_file.name).name
+            _enregistrer(pdf_file, dossier / 'pdfs' / nom)
+            pdfs.append(f"pdfs/{nom}")
+        archives = []
+        if pdf_archive is not None:
+            _enregistrer(pdf_archive, dossier / 'archive.zip')
+            archives.append('archive.zip')
+
+        sources = {
+            'csv': 'data.csv',
+            'pdfs': pdfs,
+            'archives': archives,
+            'upload_sessions': [str(session.pk) for session in sessions_terminees(upload_session_ids, user)],
+        }
+        with transaction.atomic():
+            job = ImportJob.objects.create(
+                group_name=group_name,
+                created_by=user if user is not None and user.is_authenticated else None,
+                sources=sources,
+            )
+            os.replace(dossier, dossier_travail(job))
+    except BaseException:
+        shutil.rmtree(dossier, ignore_errors=True)
+        raise
+    return job
+
+def progression_import(job):
+    """État du job pour l'interrogation périodique (JSON)"""
+    return {
+        'status': job.status,
+        'stage': job.stage,
+        'files_total': job.files_total,
+        'files_stored': job.files_stored,
+        'rows_parsed': job.rows_parsed,
+        'rows_matched': job.rows_matched,
+        'units_created': job.units_created,
+        'group_id': job.group_id,
+        'error': job.error,
+        'termine': job.status in (ImportJob.STATUS_DONE, ImportJob.STATUS_FAILED),
+    }
+
+# ==================== TRAITEMENT (WORKER) ====================
+
+def reclamer_import():
+    """Réclame le plus ancien job en attente (select_for_update(skip_locked=True))"""
+    with transaction.atomic():
+        job = (
+            ImportJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=ImportJob.STATUS_PENDING)
+            .order_by('created_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        maintenant = timezone.now()
+        ImportJob.objects.filter(pk=job.pk).update(
+            status=ImportJob.STATUS_RUNNING, attempts=F('attempts') + 1, started_at=maintenant,
+            updated_at=maintenant,
+        )
+    job.refresh_from_db()
+    return job
+
+def liberer_imports_bloques(delai=None):
+    """Remet en attente les jobs restés "running" après l'arrêt brutal d'un worker"""
+    delai = delai or timedelta(seconds=_reglage('IMPORT_JOB_STALE_SECONDS', 600))
+    return ImportJob.objects.filter(
+        status=ImportJob.STATUS_RUNNING,
+        updated_at__lt=timezone.now() - delai,
+    ).update(status=ImportJob.STATUS_PENDING)
+
+class _Progression:
+    """Compteurs partagés entre threads, enregistrés en base au plus toutes les 0,5 s"""
+
+    def __init__(self, job):
+        self.job = job
+        self.valeurs = {}
+        self.verrou = threading.Lock()
+        self.dernier_envoi = 0.0
+
+    def incrementer(self, champ, n=1):
+        with self.verrou:
+            self.valeurs[champ] = self.valeurs.get(champ, getattr(self.job, champ)) + n
+
+    def fixer(self, **valeurs):
+        with self.verrou:
+            self.valeurs.update(valeurs)
+
+    def enregistrer(self, forcer=False):
+        """À appeler depuis le thread principal (seul à utiliser la connexion à la base)"""
+        if not forcer and time.monotonic() - self.dernier_envoi < INTERVALLE_PROGRESSION:
+            return
+        with self.verrou:
+            valeurs, self.valeurs = self.valeurs, {}
+        for champ, valeur in valeurs.items():
+            setattr(self.job, champ, valeur)
+        # updated_at sert aussi de battement de cœur (voir liberer_imports_bloques)
+        ImportJob.objects.filter(pk=self.job.pk).update(updated_at=timezone.now(), **valeurs)
+        self.dernier_envoi = time.monotonic()
+
+def _stocker_pdfs(job, progression, threads, processus=1):
+    """Étape 1 : range tous les PDF dans blobs/ et retourne {code: chemin}"""
+    dossier = dossier_travail(job)
+    sessions = sessions_terminees(job.sources.get('upload_sessions', []))
+
+    pdfs = [dossier / nom for nom in job.sources.get('pdfs', [])]
+    archives = [dossier / nom for nom in job.sources.get('archives', [])]
+    for session in sessions:
+        chemin = chemin_assemble(session)
+        (pdfs if chemin.suffix == '.pdf' else archives).append(chemin)
+
+    # Le répertoire central des archives donne le total sans rien décompresser
+    progression.fixer(stage=ImportJob.STAGE_FILES, files_stored=0,
+                      files_total=len(pdfs) + sum(compter_pdf_zip(archive) for archive in archives))
+    progression.enregistrer(forcer=True)
+
+    if processus > 1:
+        def apres_lot(n):
+            progression.incrementer('files_stored', n)
+            progression.enregistrer()
+
+        mapping = stocker_pdfs_en_parallele(pdfs, archives, processus=processus, apres_lot=apres_lot)
+        progression.enregistrer(forcer=True)
+        return mapping, sessions
+
+    def stocker_pdf(chemin):
+        blob = stocker_fichier(chemin)
+        progression.incrementer('files_stored')
+        return {chemin.stem.strip(): str(blob.path)}
+
+    def stocker_archive(chemin):
+        return importer_zip(chemin, apres_membre=lambda: progression.incrementer('files_stored'))
+
+    with ThreadPoolExecutor(max_workers=max(threads, 1)) as pool:
+        futures = [pool.submit(stocker_pdf, chemin) for chemin in pdfs]
+        futures += [pool.submit(stocker_archive, chemin) for chemin in archives]
+        en_cours = set(futures)
+        while en_cours:
+            _, en_cours = wait(en_cours, timeout=INTERVALLE_PROGRESSION, return_when=FIRST_COMPLETED)
+            progression.enregistrer()
+
+    # Fusion dans l'ordre des sources : à code égal, la dernière source l'emporte
+    mapping = {}
+    for future in futures:
+        mapping.update(future.result())
+
+    progression.enregistrer(forcer=True)
+    return mapping, sessions
+
+_FIN = object()
+
+def _creer_unites(job, mapping, progression, processus=1):
+    """
+    Étape 2 : le CSV est lu et apparié dans un thread producteur (réparti sur
+    `processus` processus si plus d'un) ; les correspondances passent par une
+    file bornée jusqu'au thread principal, qui les insère par lots.
+    """
+    progression.fixer(stage=ImportJob.STAGE_ROWS)
+    progression.enregistrer(forcer=True)
+
+    file_attente = queue.Queue(maxsize=_reglage('IMPORT_JOB_QUEUE_SIZE', 10000))
+    arret = threading.Event()
+    statistiques = {}
+
+    chemin_csv = dossier_travail(job) / job.sources['csv']
+    if processus > 1:
+        correspondances = iter_correspondances_paralleles(chemin_csv, mapping, processus=processus,
+                                                          statistiques=statistiques)
+    else:
+        correspondances = iter_correspondances(chemin_csv, mapping, statistiques=statistiques)
+
+    def produire():
+        try:
+            for correspondance in correspondances:
+                if arret.is_set():
+                    return
+                file_attente.put(correspondance)
+            file_attente.put(_FIN)
+        except BaseException as e:
+            file_attente.put(e)
+
+    def consommer():
+        while True:
+            element = file_attente.get()
+            if element is _FIN:
+                return
+            if isinstance(element, BaseException):
+                raise element
+            yield element
+
+    def apres_lot(total):
+        progression.fixer(units_created=total,
+                          rows_parsed=statistiques.get('lignes_lues', 0),
+                          rows_matched=statistiques.get('correspondances', 0))
+        progression.enregistrer()
+
+    # Le producteur hérite du contexte, donc de la mesure d'import courante
+    producteur = threading.Thread(target=contextvars.copy_context().run, args=(produire,),
+                                  name=f'import-{job.pk}-csv', daemon=True)
+    producteur.start()
+    try:
+        group, rapport = creer_groupe_en_masse(job.group_name, consommer(), progression=apres_lot)
+    finally:
+        # En cas d'erreur, vider la file pour débloquer le producteur
+        arret.set()
+        while producteur.is_alive():
+            try:
+                file_attente.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    progression.fixer(rows_parsed=statistiques.get('lignes_lues', 0),
+                      rows_matched=statistiques.get('correspondances', 0),
+                      units_created=rapport['nb_unites'])
+    progression.enregistrer(forcer=True)
+    return group, rapport
+
+def executer_import(job, threads=None, processus=None):
+    """
+    Exécute un job réclamé ; retourne True s'il a abouti.
+
+    Avec plus d'un processus (`processus` ou IMPORT_PROCESSES), le stockage
+    des PDF et l'appariement sont répartis sur un pool de processus.
+    """
+    threads = threads or _reglage('IMPORT_JOB_THREADS', 4)
+    processus = nombre_de_processus(processus)
+    progression = _Progression(job)
+    debut = time.perf_counter()
+
+    # Une synthèse par job (logger core.import) : durées par étape et compteurs
+    with suivre_import('job', job_id=job.pk, group_name=job.group_name, processus=processus) as mesure:
+        try:
+            with etape('store'):
+                mapping, sessions = _stocker_pdfs(job, progression, threads, processus)
+            duree_stockage = time.perf_counter() - debut
+            group, rapport = _creer_unites(job, mapping, progression, processus)
+        except ArchiveInvalide as e:
+            return _echec(job, str(e), mesure)
+        except Exception as e:
+            logger.exception("Échec de l'import %s", job.pk)
+            return _echec(job, f"Erreur inattendue : {e}", mesure)
+
+        if group is None:
+            return _echec(job, "Aucune correspondance entre le CSV et les fichiers PDF", mesure)
+
+        rapport['stockage'] = round(duree_stockage, 4)
+        rapport['processus'] = processus
+        rapport['total'] = round(time.perf_counter() - debut, 4)
+        rapport['etapes'] = mesure.resume()['etapes_s']
+        ImportJob.objects.filter(pk=job.pk).update(
+            status=ImportJob.STATUS_DONE, group=group, report=rapport, finished_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        for session in sessions:
+            marquer_utilisee(session)
+        shutil.rmtree(dossier_travail(job), ignore_errors=True)
+        return True
+
+def _echec(job, message, mesure=None):
+    if mesure is not None:
+        mesure.statut = 'echec'
+    ImportJob.objects.filter(pk=job.pk).update(
+        status=ImportJob.STATUS_FAILED, error=message[:1000], finished_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
+    shutil.rmtree(dossier_travail(job), ignore_errors=True)
+    return False
+
+def traiter_imports(max_jobs=None, threads=None, processus=None):
+    """Traite les jobs en attente jusqu'à épuisement (ou max_jobs jobs)"""
+    reussis = echecs = 0
+    while max_jobs is None or reussis + echecs < max_jobs:
+        job = reclamer_import()
+        if job is None:
+            break
+        if executer_import(job, threads=threads, processus=processus):
+            reussis += 1
+        else:
+            echecs += 1
+    return reussis, echecs
@@ -0,0 +1,125 @@
+# ingestion_service.py
+"""
+Création en masse d'un groupe d'envoi : unités et liens sont insérés par lots
+avec bulk_create, dans une seule transaction.
+"""
+import logging
+import uuid
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.db import transaction
+
+from .blob_store import est_blob, stocker_fichier
+from .group_counters import ajuster_compteurs
+from .instrumentation import compter, mesure_courante
+from .models import SendingGroup, SendingUnit, Link
+
+logger = logging.getLogger(__name__)
+
+# Nombre d'unités insérées par requête
+TAILLE_LOT = 1000
+
+def creer_groupe_en_masse(group_name, correspondances, batch_size=TAILLE_LOT, progression=None):
+    """
+    Crée un groupe et ses unités/liens à partir des correspondances produites
+    par iter_correspondances ({nom: {"email": ..., "file": ...}}).
+
+    Tout est fait dans une transaction : en cas d'erreur, aucun groupe partiel
+    ne reste en base. Retourne (groupe ou None, rapport) où le rapport contient
+    le nombre d'unités créées (nb_unites) et la durée de chaque phase en secondes.
+
+    `progression`, si fourni, est appelé après chaque lot avec le nombre
+    d'unités créées jusque-là.
+    """
+    durees = {'lecture': 0.0, 'preparation': 0.0, 'unites': 0.0, 'liens': 0.0}
+    debut = perf_counter()
+    group = None
+    total = 0
+    # Un même PDF peut servir à plusieurs unités : il n'est stocké qu'une fois
+    noms_stockage = {}
+
+    def stockage(chemin):
+        if chemin not in noms_stockage:
+            noms_stockage[chemin] = nom_dans_stockage(chemin)
+        return noms_stockage[chemin]
+
+    correspondances = iter(correspondances)
+
+    with transaction.atomic():
+        while True:
+            # Lecture : parsing du CSV et appariement, au fil du générateur
+            t = perf_counter()
+            lot = list(islice(correspondances, batch_size))
+            durees['lecture'] += perf_counter() - t
+            if not lot:
+                break
+
+            if group is None:
+                group = SendingGroup.objects.create(label=group_name)
+
+            # Préparation des objets en Python (noms de fichiers, codes, tokens)
+            debut_lot = t = perf_counter()
+            units = [
+                SendingUnit(
+                    sending_group=group,
+                    name=name,
+                    name_search=SendingUnit.forme_recherche(name),
+                    email=data['email'],
+                    file=stockage(data['file']),
+                    file_name=data.get('file_name') or Path(data['file']).name,
+                )
+                for resultat in lot
+                for name, data in resultat.items()
+            ]
+            durees['preparation'] += perf_counter() - t
+
+            t = perf_counter()
+            SendingUnit.objects.bulk_create(units, batch_size=batch_size)
+            durees['unites'] += perf_counter() - t
+
+            t = perf_counter()
+            links = [
+                Link(sending_unit=unit, token=uuid.uuid4(), access_code=Link.generer_code_acces())
+                for unit in units
+            ]
+            Link.objects.bulk_create(links, batch_size=batch_size)
+            durees['liens'] += perf_counter() - t
+
+            mesure_courante().ajouter_duree('persist', perf_counter() - debut_lot)
+            total += len(units)
+            compter('unites_creees', len(units))
+            if progression is not None:
+                progression(total)
+
+        if group is not None:
+            ajuster_compteurs(group.pk, total=total)
+
+    rapport = {'nb_unites': total}
+    rapport.update({phase: round(duree, 4) for phase, duree in durees.items()})
+    rapport['total'] = round(perf_counter() - debut, 4)
+
+    logger.debug("Création en masse du groupe '%s' : %s", group_name, rapport)
+    return group, rapport
+
+def nom_dans_stockage(chemin):
+    """
+    Retourne le nom à affecter au FileField pour un fichier déjà présent sur disque.
+
+    Un blob (MEDIA_ROOT/blobs/) est référencé tel quel, sans recopie : son
+    nom est son empreinte, il ne sera jamais réécrit. Tout autre fichier,
+    même sous MEDIA_ROOT (pdfs/<nom d'origine>, dossier de travail d'un
+    import), est ajouté au stockage par contenu : une campagne suivante qui
+    dépose un fichier de même nom ne peut pas l'écraser.
+    """
+    chemin = Path(chemin).resolve()
+    media_root = Path(settings.MEDIA_ROOT).resolve()
+
+    if chemin.is_relative_to(media_root):
+        name = chemin.relative_to(media_root).as_posix()
+        if est_blob(name):
+            return name
+
+    return stocker_fichier(chemin).name
@@ -0,0 +1,159 @@
+# instrumentation.py
+"""
+Instrumentation de l'import : durées par étape, compteurs et détail par
+enregistrement échantillonné, sur le module logging.
+
+Une mesure (MesureImport) est active pendant un import (voir suivre_import).
+Les fonctions de lecture, d'appariement et d'insertion y ajoutent leurs
+durées (store, parse, normalize, index, match, persist) et leurs compteurs
+sans qu'elle leur soit passée en paramètre. En fin d'import, un seul
+enregistrement de synthèse est émis sur le logger core.import.
+
+Le détail par enregistrement (ligne sans fichier, email invalide...) passe
+par le logger core.import.records, désactivé par défaut. Activé au niveau
+DEBUG, il n'émet qu'une ligne sur IMPORT_RECORD_LOG_SAMPLE de chaque type,
+dans la limite de IMPORT_RECORD_LOG_MAX lignes par import.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger('core.import')
+logger_enregistrements = logging.getLogger('core.import.records')
+
+ETAPES = ('store', 'parse', 'normalize', 'index', 'match', 'persist')
+
+_mesure_courante = contextvars.ContextVar('mesure_import', default=None)
+
+class MesureImport:
+    """Durées par étape et compteurs d'un import, partagés entre threads"""
+
+    def __init__(self, libelle, plafonner=True, **contexte):
+        self.libelle = libelle
+        self.plafonner = plafonner
+        self.contexte = contexte
+        # 'ok' ou 'echec' ; fixé par suivre_import s'il n'est pas fixé avant
+        self.statut = None
+        self.durees = dict.fromkeys(ETAPES, 0.0)
+        self.compteurs = Counter()
+        self.details = Counter()
+        self.details_emis = 0
+        self.verrou = threading.Lock()
+        self.debut = time.perf_counter()
+
+    def ajouter_duree(self, nom, duree):
+        with self.verrou:
+            self.durees[nom] = self.durees.get(nom, 0.0) + duree
+
+    def compter(self, nom, n=1):
+        with self.verrou:
+            self.compteurs[nom] += n
+
+    def echantillonner(self, type_detail):
+        """Rang de l'occurrence si elle doit être journalisée, sinon None"""
+        taux = max(1, getattr(settings, 'IMPORT_RECORD_LOG_SAMPLE', 100))
+        maximum = getattr(settings, 'IMPORT_RECORD_LOG_MAX', 1000)
+        with self.verrou:
+            self.details[type_detail] += 1
+            rang = self.details[type_detail]
+            if (rang - 1) % taux or (self.plafonner and self.details_emis >= maximum):
+                return None
+            self.details_emis += 1
+            return rang
+
+    def resume(self):
+        with self.verrou:
+            return {
+                'import': self.libelle,
+                **self.contexte,
+                'duree_s': round(time.perf_counter() - self.debut, 4),
+                'etapes_s': {nom: round(duree, 4) for nom, duree in self.durees.items()},
+                'compteurs': dict(self.compteurs),
+            }
+
+# Mesure utilisée hors de suivre_import (appels directs de utils) : jamais résumée ni plafonnée
+_MESURE_LIBRE = MesureImport('hors import', plafonner=False)
+
+def mesure_courante():
+    return _mesure_courante.get() or _MESURE_LIBRE
+
+@contextmanager
+def etape(nom):
+    """Chronomètre un bloc et ajoute sa durée à l'étape `nom` de la mesure courante"""
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        mesure_courante().ajouter_duree(nom, time.perf_counter() - debut)
+
+def chronometrer(iterable, nom):
+    """Générateur qui impute à l'étape `nom` le temps passé à produire chaque élément"""
+    iterateur = iter(iterable)
+    mesure = mesure_courante()
+    while True:
+        debut = time.perf_counter()
+        try:
+            element = next(iterateur)
+        except StopIteration:
+            mesure.ajouter_duree(nom, time.perf_counter() - debut)
+            return
+        mesure.ajouter_duree(nom, time.perf_counter() - debut)
+        yield element
+
+def compter(nom, n=1):
+    if n:
+        mesure_courante().compter(nom, n)
+
+def detail(type_detail, message, *args):
+    """Détail par enregistrement, échantillonné (logger core.import.records)"""
+    if not logger_enregistrements.isEnabledFor(logging.DEBUG):
+        return
+    rang = mesure_courante().echantillonner(type_detail)
+    if rang is not None:
+        logger_enregistrements.debug(message, *args,
+                                     extra={'donnees': {'type': type_detail, 'rang': rang}})
+
+@contextmanager
+def suivre_import(libelle, **contexte):
+    """
+    Active une mesure pour la durée du bloc et émet sa synthèse à la sortie.
+
+    Imbriqué dans un import déjà suivi, le bloc réutilise la mesure en cours
+    (une seule synthèse par import). Une exception donne le statut 'echec',
+    tout comme mesure.statut = 'echec' pour un échec sans exception.
+    """
+    mesure = _mesure_courante.get()
+    if mesure is not None:
+        yield mesure
+        return
+
+    mesure = MesureImport(libelle, **contexte)
+    jeton = _mesure_courante.set(mesure)
+    try:
+        yield mesure
+    except BaseException:
+        mesure.statut = 'echec'
+        raise
+    finally:
+        _mesure_courante.reset(jeton)
+        mesure.statut = mesure.statut or 'ok'
+        resume = mesure.resume()
+        resume['statut'] = mesure.statut
+        logger.info("Import %s (%s) : %.2f s", libelle, mesure.statut, resume['duree_s'],
+                    extra={'donnees': resume})
+
+class FormatteurStructure(logging.Formatter):
+    """Ajoute au message les données structurées (extra={'donnees': {...}}) en JSON"""
+
+    def format(self, record):
+        message = super().format(record)
+        donnees = getattr(record, 'donnees', None)
+        if donnees:
+            message = f"{message} {json.dumps(donnees, ensure_ascii=False, default=str)}"
+        return message
@@ -0,0 +1,187 @@
+# mailer.py
+"""
+Envoi des emails de campagne en réutilisant les connexions SMTP.
+
+Au lieu d'ouvrir une connexion (et une négociation TLS) par destinataire
+comme send_mail, les messages sont regroupés en lots : chaque lot part sur
+une seule connexion ouverte avec get_connection(). Pour les gros groupes,
+plusieurs connexions travaillent en parallèle.
+
+Le débit est gouverné par un RateLimiter (voir throttling.py) : limites
+globale et par domaine, ralentissement automatique sur les réponses 4xx.
+Avec max_domain_wait, un message dont le domaine imposerait une plus longue
+attente n'est pas envoyé : il revient en erreur DomaineSature, pour que
+l'appelant le reporte au lieu de bloquer la connexion (voir email_queue).
+"""
+import logging
+import smtplib
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+from .throttling import RateLimiter, est_refus_temporaire
+
+logger = logging.getLogger(__name__)
+
+# Erreurs indiquant que la connexion est tombée et peut être rouverte
+ERREURS_CONNEXION = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+class DomaineSature(Exception):
+    """Message non envoyé : son domaine n'aura pas de jeton avant `attente` secondes"""
+
+    def __init__(self, domaine, attente):
+        super().__init__(f"Débit du domaine {domaine} épuisé, envoi reporté de {attente:.0f} s")
+        self.domaine = domaine
+        self.attente = attente
+
+class CampaignMailer:
+    """
+    Expéditeur de campagne.
+
+    - batch_size : nombre de messages envoyés sur une même connexion
+    - connections : nombre de connexions SMTP utilisées en parallèle
+    - max_reconnects : nombre de reconnexions tentées par lot après une coupure
+    - limiter : RateLimiter partagé (par défaut, celui de EMAIL_RATE_LIMITS)
+    - max_temporary_retries : nouvelles tentatives d'un message refusé en 4xx
+    - max_domain_wait : attente maximale (secondes) pour le jeton d'un domaine ;
+      au-delà, le message est rendu en erreur DomaineSature sans être envoyé
+      (None : attendre le jeton, quel que soit le délai)
+
+    Après chaque appel à envoyer(), `statistiques` contient le nombre de
+    messages envoyés, la durée et le débit obtenu (messages/seconde).
+    """
+
+    def __init__(self, batch_size=None, connections=None, backend=None, max_reconnects=3,
+                 limiter=None, max_temporary_retries=2, max_domain_wait=None):
+        self.batch_size = batch_size or getattr(settings, 'EMAIL_BATCH_SIZE', 50)
+        self.connections = connections or getattr(settings, 'EMAIL_CONNECTIONS', 1)
+        self.backend = backend
+        self.max_reconnects = max_reconnects
+        self.limiter = limiter or RateLimiter.depuis_reglages()
+        self.max_temporary_retries = max_temporary_retries
+        self.max_domain_wait = max_domain_wait
+        self.statistiques = {}
+
+    def construire_message(self, subject, body, to, html_body=None):
+        """Construit un message texte, avec une alternative HTML si fournie"""
+        message = EmailMultiAlternatives(
+            subject=subject,
+            body=body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=to if isinstance(to, (list, tuple)) else [to],
+        )
+        if html_body:
+            message.attach_alternative(html_body, 'text/html')
+        return message
+
+    def envoyer(self, messages):
+        """
+        Envoie les messages et retourne une liste alignée sur l'entrée :
+        None pour un message envoyé, l'exception rencontrée sinon.
+        """
+        messages = list(messages)
+        resultats = [None] * len(messages)
+        debut_envoi = time.perf_counter()
+
+        # Les domaines sont entrelacés : le seau d'un domaine se remplit pendant l'envoi aux autres.
+        # Une connexion attend tout de même le jeton du message suivant, sauf au-delà de
+        # max_domain_wait (message rendu en DomaineSature)
+        ordre = self._entrelacer_par_domaine(messages)
+        lots = [ordre[debut:debut + self.batch_size] for debut in range(0, len(ordre), self.batch_size)]
+
+        def envoyer_lot(indices):
+            erreurs = self._envoyer_lot([messages[i] for i in indices])
+            for i, erreur in zip(indices, erreurs):
+                resultats[i] = erreur
+
+        if self.connections > 1 and len(lots) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.connections, len(lots))) as pool:
+                list(pool.map(envoyer_lot, lots))
+        else:
+            for indices in lots:
+                envoyer_lot(indices)
+
+        duree = time.perf_counter() - debut_envoi
+        envoyes = sum(1 for erreur in resultats if erreur is None)
+        reportes = sum(1 for erreur in resultats if isinstance(erreur, DomaineSature))
+        self.statistiques = {
+            'envoyes': envoyes,
+            'echecs': len(messages) - envoyes - reportes,
+            'reportes': reportes,
+            'duree_s': round(duree, 3),
+            'messages_par_seconde': round(envoyes / duree, 2) if duree > 0 else 0.0,
+        }
+        logger.info("Envoi terminé : %s", self.statistiques)
+        return resultats
+
+    def _entrelacer_par_domaine(self, messages):
+        """Indices des messages, alternant les domaines destinataires (a, b, c, a, b, ...)"""
+        par_domaine = defaultdict(list)
+        for i, message in enumerate(messages):
+            par_domaine[RateLimiter.domaine(message.to[0]) if message.to else ''].append(i)
+        return [i for groupe in zip_longest(*par_domaine.values()) for i in groupe if i is not None]
+
+    def _envoyer_lot(self, lot):
+        """Envoie un lot sur une seule connexion, en la rouvrant si elle tombe"""
+        erreurs = [None] * len(lot)
+        connection = get_connection(backend=self.backend)
+        reconnexions = 0
+        refus = 0
+        i = 0
+
+        try:
+            connection.open()
+            while i < len(lot):
+                destinataire = lot[i].to[0] if lot[i].to else ''
+                if self.max_domain_wait is not None:
+                    attente = self.limiter.attente_domaine(destinataire)
+                    if attente > self.max_domain_wait:
+                        erreurs[i] = DomaineSature(RateLimiter.domaine(destinataire), attente)
+                        refus = 0
+                        i += 1
+                        continue
+                self.limiter.acquerir(destinataire)
+                try:
+                    connection.send_messages([lot[i]])
+                except ERREURS_CONNEXION as e:
+                    if reconnexions >= self.max_reconnects:
+                        erreurs[i] = e
+                        i += 1
+                        continue
+                    reconnexions += 1
+                    logger.warning("Connexion SMTP perdue (%s), reconnexion %s/%s",
+                                   e, reconnexions, self.max_reconnects)
+                    self._fermer(connection)
+                    connection.open()
+                    continue
+                except Exception as e:
+                    # "Réessayez plus tard" : ralentir le domaine puis retenter le message
+                    if est_refus_temporaire(e) and refus < self.max_temporary_retries:
+                        refus += 1
+                        logger.warning("Refus temporaire pour %s (%s), ralentissement", destinataire, e)
+                        self.limiter.signaler_refus(destinataire)
+                        continue
+                    erreurs[i] = e
+                else:
+                    self.limiter.signaler_succes(destinataire)
+                refus = 0
+                i += 1
+        except Exception as e:
+            # Impossible d'ouvrir la connexion : le reste du lot est en échec
+            for j in range(i, len(lot)):
+                erreurs[j] = e
+        finally:
+            self._fermer(connection)
+
+        return erreurs
+
+    @staticmethod
+    def _fermer(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
@@ -0,0 +1,99 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.blob_store import empreinte_fichier, est_blob, nom_blob, stocker_fichier
+from core.models import SendingUnit
+
+
+class Command(BaseCommand):
+    help = ("Range les PDF existants dans le stockage par contenu (blobs/) ; avec --delete-originals, "
+            "supprime ensuite les fichiers migrés")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Nombre d'unités mises à jour par requête")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Calculer l'espace récupérable sans rien modifier")
+        parser.add_argument('--delete-originals', action='store_true',
+                            help="Supprimer les fichiers migrés par cette exécution "
+                                 "(à lancer après un --dry-run)")
+
+    def handle(self, *args, **options):
+        media_root = Path(settings.MEDIA_ROOT)
+        dry_run = options['dry_run']
+
+        blobs = {}            # ancien nom -> nom du blob
+        octets_blobs = {}     # nom du blob -> taille, pour les blobs nouvellement écrits
+        manquants = 0
+        a_mettre_a_jour = []
+
+        units = SendingUnit.objects.exclude(file='').order_by('id').only('id', 'file', 'file_name')
+        for unit in units.iterator(chunk_size=options['batch_size']):
+            ancien = unit.file.name
+            if est_blob(ancien):
+                continue
+
+            if ancien not in blobs:
+                chemin = media_root / ancien
+                if not chemin.is_file():
+                    manquants += 1
+                    self.stderr.write(f"Fichier introuvable pour l'unité {unit.id} : {ancien}")
+                    continue
+                blobs[ancien] = self._migrer(chemin, dry_run, octets_blobs)
+
+            if not dry_run:
+                unit.file_name = unit.file_name or Path(ancien).name
+                unit.file.name = blobs[ancien]
+                a_mettre_a_jour.append(unit)
+                if len(a_mettre_a_jour) >= options['batch_size']:
+                    self._enregistrer(a_mettre_a_jour)
+                    a_mettre_a_jour = []
+
+        if a_mettre_a_jour:
+            self._enregistrer(a_mettre_a_jour)
+
+        # Seuls les fichiers migrés par cette exécution sont candidats à la suppression,
+        # et seulement s'ils ne sont plus référencés (un import a pu les reprendre entre-temps)
+        references = set() if dry_run else set(
+            SendingUnit.objects.filter(file__in=list(blobs)).values_list('file', flat=True)
+        )
+        copies = [media_root / ancien for ancien in blobs if ancien not in references]
+        octets_copies = sum(chemin.stat().st_size for chemin in copies)
+        if not dry_run and options['delete_originals']:
+            for chemin in copies:
+                chemin.unlink(missing_ok=True)
+
+        ecrits = sum(octets_blobs.values())
+        recupere = octets_copies - ecrits
+        self.stdout.write(
+            f"Fichiers migrés : {len(blobs)} • Contenus distincts écrits : {len(octets_blobs)} ({ecrits} octets) • "
+            f"Anciennes copies : {len(copies)} ({octets_copies} octets) • Introuvables : {manquants}"
+        )
+        if dry_run:
+            self.stdout.write(f"Espace récupérable : {recupere} octets (simulation)")
+        elif options['delete_originals']:
+            self.stdout.write(self.style.SUCCESS(f"Espace récupéré : {recupere} octets"))
+        else:
+            self.stdout.write(f"Anciennes copies conservées ({recupere} octets récupérables avec --delete-originals)")
+
+    @staticmethod
+    def _migrer(chemin, dry_run, octets_blobs):
+        """Nom du blob correspondant au fichier, en l'écrivant sauf en simulation"""
+        if dry_run:
+            nom = nom_blob(empreinte_fichier(chemin), chemin.suffix or '.pdf')
+            if not (Path(settings.MEDIA_ROOT) / nom).exists():
+                octets_blobs[nom] = chemin.stat().st_size
+            return nom
+
+        blob = stocker_fichier(chemin)
+        if blob.created:
+            octets_blobs[blob.name] = blob.size
+        return blob.name
+
+    @staticmethod
+    def _enregistrer(units):
+        with transaction.atomic():
+            SendingUnit.objects.bulk_update(units, ['file', 'file_name'])
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.email_queue import liberer_jobs_bloques, mailer_de_file, traiter_file
+
+
+class Command(BaseCommand):
+    help = "Worker d'envoi : traite la file d'attente des emails de campagne (EmailJob)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Nombre de jobs réclamés à la fois (défaut : EMAIL_JOB_BATCH_SIZE)")
+        parser.add_argument('--sleep', type=float, default=5.0,
+                            help="Pause en secondes quand la file est vide")
+        parser.add_argument('--once', action='store_true',
+                            help="Traiter les jobs disponibles puis s'arrêter")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Worker d'envoi démarré")
+        # Un seul expéditeur pour toute la vie du worker : les seaux à jetons et les
+        # ralentissements par domaine persistent d'un cycle à l'autre
+        mailer = mailer_de_file()
+
+        while True:
+            liberes = liberer_jobs_bloques()
+            if liberes:
+                self.stdout.write(f"{liberes} job(s) bloqué(s) remis en attente")
+
+            debut = time.perf_counter()
+            envoyes, echecs = traiter_file(batch_size=options['batch_size'], mailer=mailer)
+            duree = time.perf_counter() - debut
+            if envoyes or echecs:
+                debit = envoyes / duree if duree > 0 else 0.0
+                self.stdout.write(f"Envoyés : {envoyes} • Échecs : {echecs} • {debit:.2f} messages/s")
+
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
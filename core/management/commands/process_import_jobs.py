@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.import_jobs import liberer_imports_bloques, traiter_imports
+
+
+class Command(BaseCommand):
+    help = "Worker d'import : exécute les imports de campagnes en attente (ImportJob)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=None,
+                            help="Threads utilisés pour stocker les PDF (défaut : IMPORT_JOB_THREADS)")
+        parser.add_argument('--processes', type=int, default=None,
+                            help="Processus pour le stockage et l'appariement (défaut : IMPORT_PROCESSES)")
+        parser.add_argument('--sleep', type=float, default=2.0,
+                            help="Pause en secondes quand la file est vide")
+        parser.add_argument('--once', action='store_true',
+                            help="Traiter les imports disponibles puis s'arrêter")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Worker d'import démarré")
+
+        while True:
+            liberes = liberer_imports_bloques()
+            if liberes:
+                self.stdout.write(f"{liberes} import(s) interrompu(s) remis en attente")
+
+            reussis, echecs = traiter_imports(threads=options['threads'], processus=options['processes'])
+            if reussis or echecs:
+                self.stdout.write(f"Imports terminés : {reussis} • Échecs : {echecs}")
+
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.group_counters import reconcilier_compteurs
+
+
+class Command(BaseCommand):
+    help = ("Recalcule les compteurs dénormalisés des groupes (total, envoyés, reçus) "
+            "à partir des unités et corrige les écarts")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, nargs='+', default=None, metavar='ID',
+                            help="Ne vérifier que ces groupes (par défaut : tous)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Signaler les écarts sans les corriger")
+
+    def handle(self, *args, **options):
+        ecarts = reconcilier_compteurs(options['group'], simulation=options['dry_run'])
+        for group, en_base, attendus in ecarts:
+            self.stdout.write(f"Groupe {group.pk} ({group.label}) : {en_base} -> {attendus}")
+
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS("Aucun écart"))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(ecarts)} groupe(s) à corriger (simulation)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{len(ecarts)} groupe(s) corrigé(s)"))
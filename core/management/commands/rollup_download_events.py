@@ -0,0 +1,31 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.download_events import agreger_evenements
+
+
+class Command(BaseCommand):
+    help = "Agrège le journal des téléchargements (DownloadEvent) en compteurs horaires par groupe"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=None,
+                            help="Recalculer les N dernières heures (défaut : depuis le dernier compteur)")
+        parser.add_argument('--all', action='store_true',
+                            help="Recalculer tous les compteurs depuis le début du journal")
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Répéter l'agrégation toutes les N secondes au lieu de s'arrêter")
+
+    def handle(self, *args, **options):
+        while True:
+            depuis = None
+            if options['hours'] is not None:
+                depuis = timezone.now() - timedelta(hours=options['hours'])
+            compteurs = agreger_evenements(depuis, tout=options['all'])
+            self.stdout.write(f"{compteurs} compteur(s) horaire(s) recalculé(s)")
+
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
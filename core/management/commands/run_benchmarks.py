@@ -0,0 +1,125 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core.benchmarks import (
+    ECHELLES,
+    SCENARIOS,
+    bench_index_unites,
+    bench_telechargements_concurrents,
+    charger_resultats,
+    comparer_resultats,
+    enregistrer_resultats,
+    executer_suite,
+)
+
+
+class Command(BaseCommand):
+    help = ("Suite de benchmarks (import, envoi, téléchargement) exécutée dans une base de test ; "
+            "résultats JSON comparables d'un commit à l'autre")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', default=list(ECHELLES),
+                            help="Échelles (nombre de lignes/unités), par défaut 1000 10000 100000")
+        parser.add_argument('--only', nargs='+', default=None, metavar='SCENARIO',
+                            help=f"Scénarios à exécuter (préfixes) parmi : {', '.join(SCENARIOS)}")
+        parser.add_argument('--repetitions', type=int, default=1,
+                            help="Exécutions par mesure (le meilleur temps est retenu)")
+        parser.add_argument('--pdf-size', type=int, default=1024,
+                            help="Taille en octets des PDF générés")
+        parser.add_argument('--output', default=None,
+                            help="Fichier JSON où écrire les résultats")
+        parser.add_argument('--compare', default=None,
+                            help="Fichier JSON de référence (résultats d'un autre commit)")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="Ralentissement toléré avant de signaler une régression (0.2 = 20 %%)")
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help="Sortir en erreur si une régression est détectée")
+        parser.add_argument('--index-units', type=int, default=None, metavar='N',
+                            help="Mesurer plutôt les requêtes indexées sur N unités (ex. 1000000), "
+                                 "avec et sans index")
+        parser.add_argument('--async-downloads', type=int, default=None, metavar='CLIENTS',
+                            help="Mesurer plutôt CLIENTS téléchargements simultanés sur un processus ASGI")
+        parser.add_argument('--client-rate', type=int, default=256,
+                            help="Débit de chaque client lent, en Ko/s (--async-downloads)")
+
+    def handle(self, *args, **options):
+        reference = charger_resultats(options['compare']) if options['compare'] else None
+
+        # Comme le lanceur de tests : base de test créée puis détruite, jamais la base réelle
+        setup_test_environment()
+        if options['async_downloads']:
+            self.base_sqlite_sur_disque()
+        anciens_noms = [
+            (connexion, connexion.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False))
+            for connexion in connections.all()
+        ]
+        try:
+            if options['async_downloads']:
+                return self.mesurer_telechargements(options['async_downloads'], options['pdf_size'],
+                                                    options['client_rate'])
+            if options['index_units']:
+                return self.mesurer_index(options['index_units'], options['repetitions'])
+            document = executer_suite(
+                echelles=options['scales'],
+                scenarios=options['only'],
+                repetitions=options['repetitions'],
+                taille_pdf=options['pdf_size'],
+                apres_mesure=self.afficher_mesure,
+            )
+        finally:
+            for connexion, ancien_nom in anciens_noms:
+                connexion.creation.destroy_test_db(ancien_nom, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            enregistrer_resultats(document, options['output'])
+            self.stdout.write(f"Résultats écrits dans {options['output']}")
+
+        if reference is not None:
+            comparaison = comparer_resultats(reference, document, tolerance=options['tolerance'])
+            regressions = [ligne for ligne in comparaison if ligne['regression']]
+            for ligne in comparaison:
+                style = self.style.ERROR if ligne['regression'] else self.style.SUCCESS
+                self.stdout.write(style(
+                    f"{ligne['cle']:<45} {ligne['avant_s']:>10.4f} s -> {ligne['apres_s']:>10.4f} s "
+                    f"(x{ligne['ratio']})"
+                ))
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} régression(s) au-delà de {options['tolerance']:.0%}")
+
+    @staticmethod
+    def base_sqlite_sur_disque():
+        # La base SQLite de test en mémoire partagée refuse les écritures concurrentes
+        # (« database table is locked ») au lieu de les faire attendre : fichier temporaire
+        for connexion in connections.all():
+            if connexion.vendor == 'sqlite' and not connexion.settings_dict['TEST'].get('NAME'):
+                connexion.settings_dict['TEST']['NAME'] = os.path.join(
+                    tempfile.gettempdir(), f'fastdistrib-benchmarks-{os.getpid()}.sqlite3')
+
+    def mesurer_telechargements(self, clients, taille_pdf, debit_ko):
+        resultat = bench_telechargements_concurrents(clients, taille_pdf=taille_pdf, debit=debit_ko * 1024)
+        self.stdout.write(
+            f"{resultat['reussis']}/{resultat['clients']} téléchargements de {resultat['taille_pdf']} octets "
+            f"à {resultat['debit_client_ko_s']} Ko/s : {resultat['pic_simultanes']} simultanés sur un processus, "
+            f"{resultat['duree_s']} s (≈ {resultat['duree_4_flux_s']} s avec 4 flux synchrones)"
+        )
+
+    def mesurer_index(self, n_unites, repetitions):
+        resultat = bench_index_unites(n_unites, repetitions=max(repetitions, 3))
+        self.stdout.write(f"{resultat['n_unites']} unités ({resultat['base']}), "
+                          f"peuplement en {resultat['peuplement_s']} s")
+        for nom, mesure in resultat['requetes'].items():
+            style = self.style.SUCCESS if mesure['index_utilise'] else self.style.WARNING
+            self.stdout.write(style(
+                f"{nom:<20} {mesure['avec_index_ms']:>10.3f} ms avec index, "
+                f"{mesure['sans_index_ms']:>10.3f} ms sans (x{mesure['acceleration']}), "
+                f"{mesure['lignes']} lignes"
+            ))
+
+    def afficher_mesure(self, cle, mesure):
+        par_element = f"{mesure['par_element_us']} µs/élément" if mesure['par_element_us'] is not None else ''
+        self.stdout.write(f"{cle:<45} {mesure['secondes']:>10.4f} s  {par_element}")
@@ -0,0 +1,268 @@
+# metrics.py
+"""
+Métriques en mémoire du processus, exposées au format texte de Prometheus.
+
+Compteurs et histogrammes à étiquettes, sans dépendance externe.
+
+Derrière gunicorn (WEB_CONCURRENCY workers), tous les workers partagent un
+seul port : chaque scrape tombe sur un worker différent, dont les seules
+valeurs feraient croire à Prometheus à des remises à zéro (rate() faux).
+Avec METRICS_MULTIPROC_DIR (variable PROMETHEUS_MULTIPROC_DIR), chaque
+processus publie ses valeurs dans un fichier de ce dossier, au plus tard
+INTERVALLE_PUBLICATION secondes après une mesure, et l'endpoint additionne
+les fichiers de tous les processus, vivants ou terminés. Comme pour le mode
+multiprocess du client Prometheus officiel, le dossier est vidé au
+démarrage du service.
+"""
+import atexit
+import bisect
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Délai maximal entre une mesure et sa publication dans METRICS_MULTIPROC_DIR (secondes)
+INTERVALLE_PUBLICATION = 1.0
+
+# Bornes par défaut (secondes), proches de celles du client Prometheus officiel
+BORNES_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BORNES_REQUETES = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BORNES_OCTETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2, 1024 ** 3)
+
+def _echapper(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _etiquettes(noms, valeurs, supplement=()):
+    paires = list(zip(noms, valeurs)) + list(supplement)
+    if not paires:
+        return ''
+    return '{' + ','.join(f'{nom}="{_echapper(valeur)}"' for nom, valeur in paires) + '}'
+
+def _nombre(valeur):
+    if valeur == math.inf:
+        return '+Inf'
+    if float(valeur).is_integer():
+        return str(int(valeur))
+    return repr(float(valeur))
+
+class Compteur:
+    type_prometheus = 'counter'
+
+    def __init__(self, nom, aide, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self.valeurs = {}
+        self.verrou = threading.Lock()
+
+    def incrementer(self, *valeurs_etiquettes, n=1):
+        with self.verrou:
+            self.valeurs[valeurs_etiquettes] = self.valeurs.get(valeurs_etiquettes, 0) + n
+
+    def instantane(self):
+        with self.verrou:
+            return [[list(cle), valeur] for cle, valeur in self.valeurs.items()]
+
+    def ajouter(self, series):
+        with self.verrou:
+            for cle, valeur in series:
+                cle = tuple(cle)
+                self.valeurs[cle] = self.valeurs.get(cle, 0) + valeur
+
+    def lignes(self):
+        with self.verrou:
+            valeurs = sorted(self.valeurs.items())
+        for cle, valeur in valeurs:
+            yield f"{self.nom}{_etiquettes(self.etiquettes, cle)} {_nombre(valeur)}"
+
+class Histogramme:
+    type_prometheus = 'histogram'
+
+    def __init__(self, nom, aide, etiquettes=(), bornes=BORNES_DUREE):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self.bornes = tuple(sorted(bornes))
+        # {étiquettes: [effectifs par intervalle (non cumulés, +Inf compris), somme, nombre]}
+        self.series = {}
+        self.verrou = threading.Lock()
+
+    def observer(self, valeur, *valeurs_etiquettes):
+        position = bisect.bisect_left(self.bornes, valeur)
+        with self.verrou:
+            serie = self.series.get(valeurs_etiquettes)
+            if serie is None:
+                serie = self.series[valeurs_etiquettes] = [[0] * (len(self.bornes) + 1), 0.0, 0]
+            serie[0][position] += 1
+            serie[1] += valeur
+            serie[2] += 1
+
+    def instantane(self):
+        with self.verrou:
+            return [[list(cle), list(effectifs), somme, nombre]
+                    for cle, (effectifs, somme, nombre) in self.series.items()]
+
+    def ajouter(self, series):
+        with self.verrou:
+            for cle, effectifs, somme, nombre in series:
+                if len(effectifs) != len(self.bornes) + 1:
+                    continue  # bornes modifiées depuis la publication
+                serie = self.series.setdefault(tuple(cle), [[0] * (len(self.bornes) + 1), 0.0, 0])
+                serie[0] = [a + b for a, b in zip(serie[0], effectifs)]
+                serie[1] += somme
+                serie[2] += nombre
+
+    def lignes(self):
+        with self.verrou:
+            series = sorted((cle, (list(effectifs), somme, nombre))
+                            for cle, (effectifs, somme, nombre) in self.series.items())
+        for cle, (effectifs, somme, nombre) in series:
+            cumul = 0
+            for borne, effectif in zip(self.bornes + (math.inf,), effectifs):
+                cumul += effectif
+                etiquettes = _etiquettes(self.etiquettes, cle, [('le', _nombre(borne))])
+                yield f"{self.nom}_bucket{etiquettes} {cumul}"
+            yield f"{self.nom}_sum{_etiquettes(self.etiquettes, cle)} {_nombre(somme)}"
+            yield f"{self.nom}_count{_etiquettes(self.etiquettes, cle)} {nombre}"
+
+class Registre:
+    def __init__(self):
+        self.metriques = {}
+        self.verrou = threading.Lock()
+        self._publication = None       # minuterie de publication en attente
+        self._fichier = (None, None)   # (pid, nom du fichier de ce processus)
+
+    def _enregistrer(self, classe, nom, *args, **kwargs):
+        with self.verrou:
+            if nom not in self.metriques:
+                self.metriques[nom] = classe(nom, *args, **kwargs)
+            return self.metriques[nom]
+
+    def compteur(self, nom, aide, etiquettes=()):
+        return self._enregistrer(Compteur, nom, aide, etiquettes)
+
+    def histogramme(self, nom, aide, etiquettes=(), bornes=BORNES_DUREE):
+        return self._enregistrer(Histogramme, nom, aide, etiquettes, bornes)
+
+    def reinitialiser(self):
+        with self.verrou:
+            if self._publication is not None:
+                self._publication.cancel()
+                self._publication = None
+            for metrique in self.metriques.values():
+                with metrique.verrou:
+                    (metrique.valeurs if isinstance(metrique, Compteur) else metrique.series).clear()
+
+    def instantane(self):
+        """Valeurs de toutes les métriques, sérialisables en JSON"""
+        with self.verrou:
+            metriques = list(self.metriques.values())
+        return {
+            metrique.nom: {
+                'type': metrique.type_prometheus,
+                'aide': metrique.aide,
+                'etiquettes': list(metrique.etiquettes),
+                'bornes': list(getattr(metrique, 'bornes', ())),
+                'series': metrique.instantane(),
+            }
+            for metrique in metriques
+        }
+
+    def ajouter(self, instantane):
+        """Additionne aux métriques du registre celles d'un instantané"""
+        for nom, description in instantane.items():
+            if description['type'] == Compteur.type_prometheus:
+                metrique = self.compteur(nom, description['aide'], description['etiquettes'])
+            else:
+                metrique = self.histogramme(nom, description['aide'], description['etiquettes'],
+                                            description['bornes'])
+            metrique.ajouter(description['series'])
+
+    def publier(self, dossier):
+        """Écrit les valeurs du processus dans son fichier de `dossier` (remplacement atomique)"""
+        dossier = Path(dossier)
+        dossier.mkdir(parents=True, exist_ok=True)
+        pid, nom = self._fichier
+        if pid != os.getpid():
+            # Un pid peut être réutilisé par un processus ultérieur : l'heure de démarrage départage
+            pid, nom = self._fichier = (os.getpid(), f"{os.getpid()}-{time.time_ns()}.json")
+        fd, temporaire = tempfile.mkstemp(dir=dossier, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.instantane(), f)
+            os.replace(temporaire, dossier / nom)
+        except BaseException:
+            os.unlink(temporaire)
+            raise
+
+    def planifier_publication(self):
+        """Publie dans METRICS_MULTIPROC_DIR au plus tard INTERVALLE_PUBLICATION secondes plus tard"""
+        dossier = dossier_multiprocessus()
+        if not dossier:
+            return
+        with self.verrou:
+            if self._publication is not None:
+                return
+            minuterie = self._publication = threading.Timer(INTERVALLE_PUBLICATION, self._publier_planifie,
+                                                            (dossier,))
+        minuterie.daemon = True
+        minuterie.start()
+
+    def _publier_planifie(self, dossier):
+        with self.verrou:
+            self._publication = None
+        try:
+            self.publier(dossier)
+        except Exception:
+            logger.exception("Publication des métriques impossible dans %s", dossier)
+
+    def exposer_processus(self, dossier):
+        """Texte d'exposition cumulant les fichiers de tous les processus de `dossier`"""
+        self.publier(dossier)
+        cumul = Registre()
+        for fichier in sorted(Path(dossier).glob('*.json')):
+            try:
+                cumul.ajouter(json.loads(fichier.read_text(encoding='utf-8')))
+            except (OSError, ValueError, KeyError, TypeError):
+                logger.warning("Fichier de métriques illisible : %s", fichier)
+        return cumul.exposer()
+
+    def exposer(self):
+        """Texte au format d'exposition Prometheus (version 0.0.4)"""
+        with self.verrou:
+            metriques = sorted(self.metriques.values(), key=lambda metrique: metrique.nom)
+        lignes = []
+        for metrique in metriques:
+            lignes.append(f"# HELP {metrique.nom} {metrique.aide}")
+            lignes.append(f"# TYPE {metrique.nom} {metrique.type_prometheus}")
+            lignes.extend(metrique.lignes())
+        return '\n'.join(lignes) + '\n'
+
+def dossier_multiprocessus():
+    return getattr(settings, 'METRICS_MULTIPROC_DIR', '')
+
+REGISTRE = Registre()
+
+def exposer():
+    """Texte de l'endpoint : tous les processus avec METRICS_MULTIPROC_DIR, sinon ce processus"""
+    dossier = dossier_multiprocessus()
+    return REGISTRE.exposer_processus(dossier) if dossier else REGISTRE.exposer()
+
+@atexit.register
+def _publier_a_l_arret():
+    dossier = dossier_multiprocessus()
+    if dossier:
+        try:
+            REGISTRE.publier(dossier)
+        except Exception:
+            logger.exception("Métriques non publiées à l'arrêt du processus")
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
@@ -0,0 +1,204 @@
+# middleware.py
+"""
+Mesure des performances par vue.
+
+Pour chaque requête : durée totale, nombre et durée des requêtes SQL (toutes
+connexions), taille de la réponse. Les valeurs sont agrégées par nom d'URL
+dans le registre de core.metrics (endpoint « metrics »), journalisées au-delà
+de PERF_SLOW_REQUEST_MS et, si PERF_SERVER_TIMING est actif, renvoyées dans
+l'en-tête Server-Timing.
+
+Pour une réponse en flux (export CSV), la durée et les requêtes SQL sont
+celles de la vue jusqu'au premier octet ; la taille est observée à la fin
+de l'envoi.
+
+Les deux middlewares de ce module fonctionnent en mode synchrone (WSGI)
+comme asynchrone (ASGI) : sous ASGI, un middleware uniquement synchrone
+ferait passer chaque requête par un thread et annulerait l'intérêt des
+vues asynchrones.
+"""
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .delivery import iterer_fichier_async
+from .metrics import BORNES_OCTETS, BORNES_REQUETES, REGISTRE
+
+logger = logging.getLogger('core.performance')
+
+DUREE_REQUETE = REGISTRE.histogramme(
+    'fastdistrib_http_request_duration_seconds', "Durée des requêtes HTTP par vue",
+    ('view', 'method'),
+)
+REQUETES = REGISTRE.compteur(
+    'fastdistrib_http_requests_total', "Requêtes HTTP par vue et code de statut",
+    ('view', 'method', 'status'),
+)
+REQUETES_SQL = REGISTRE.histogramme(
+    'fastdistrib_db_queries_per_request', "Nombre de requêtes SQL par requête HTTP",
+    ('view',), bornes=BORNES_REQUETES,
+)
+DUREE_SQL = REGISTRE.histogramme(
+    'fastdistrib_db_duration_seconds', "Temps passé en base par requête HTTP",
+    ('view',),
+)
+TAILLE_REPONSE = REGISTRE.histogramme(
+    'fastdistrib_http_response_bytes', "Taille des réponses HTTP par vue",
+    ('view',), bornes=BORNES_OCTETS,
+)
+
+VUE_NON_RESOLUE = '<non résolue>'
+
+class _CompteurSql:
+    """execute_wrapper : compte et chronomètre les requêtes SQL"""
+
+    def __init__(self):
+        self.nombre = 0
+        self.duree = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duree += time.perf_counter() - debut
+            self.nombre += 1
+
+def nom_de_vue(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name if match is not None else None) or VUE_NON_RESOLUE
+
+class MesurePerformanceMiddleware:
+    """
+    À placer en tête de MIDDLEWARE (après WhiteNoise, pour ne pas mesurer
+    les fichiers statiques).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        sql = _CompteurSql()
+        debut = time.perf_counter()
+        with ExitStack() as pile:
+            self._suivre_sql(pile, sql)
+            response = self.get_response(request)
+        return self._terminer(request, response, time.perf_counter() - debut, sql)
+
+    async def __acall__(self, request):
+        sql = _CompteurSql()
+        debut = time.perf_counter()
+        # L'ORM asynchrone s'exécute dans le thread de la requête (sync_to_async) :
+        # c'est sur les connexions de ce thread que les requêtes SQL sont comptées
+        pile = ExitStack()
+        await sync_to_async(self._suivre_sql)(pile, sql)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(pile.close)()
+        return self._terminer(request, response, time.perf_counter() - debut, sql)
+
+    @staticmethod
+    def _suivre_sql(pile, sql):
+        for connexion in connections.all():
+            pile.enter_context(connexion.execute_wrapper(sql))
+
+    def _terminer(self, request, response, duree, sql):
+        vue = nom_de_vue(request)
+        DUREE_REQUETE.observer(duree, vue, request.method)
+        REQUETES.incrementer(vue, request.method, str(response.status_code))
+        REQUETES_SQL.observer(sql.nombre, vue)
+        DUREE_SQL.observer(sql.duree, vue)
+        self._mesurer_taille(response, vue)
+        # Avec METRICS_MULTIPROC_DIR, rend ces mesures visibles des autres workers
+        REGISTRE.planifier_publication()
+
+        if getattr(settings, 'PERF_SERVER_TIMING', False):
+            response['Server-Timing'] = (
+                f'app;dur={duree * 1000:.1f}, db;dur={sql.duree * 1000:.1f};desc="{sql.nombre} SQL"'
+            )
+
+        seuil = getattr(settings, 'PERF_SLOW_REQUEST_MS', 1000)
+        if seuil is not None and duree * 1000 >= seuil:
+            logger.warning("Requête lente : %s %s (%s) en %.0f ms, %s requêtes SQL",
+                           request.method, request.path, vue, duree * 1000, sql.nombre,
+                           extra={'donnees': {
+                               'view': vue, 'method': request.method, 'status': response.status_code,
+                               'duree_ms': round(duree * 1000, 1), 'requetes_sql': sql.nombre,
+                               'duree_sql_ms': round(sql.duree * 1000, 1),
+                           }})
+        return response
+
+    def _mesurer_taille(self, response, vue):
+        if not response.streaming:
+            TAILLE_REPONSE.observer(len(response.content), vue)
+        elif response.has_header('Content-Length'):
+            # FileResponse : taille connue, le fichier n'est pas relu
+            TAILLE_REPONSE.observer(int(response['Content-Length']), vue)
+        elif not response.is_async:
+            # Export en flux : taille observée une fois le flux entièrement envoyé
+            response.streaming_content = self._compter_octets(response.streaming_content, vue)
+        else:
+            response.streaming_content = self._acompter_octets(response.streaming_content, vue)
+
+    @staticmethod
+    def _compter_octets(contenu, vue):
+        total = 0
+        for morceau in contenu:
+            total += len(morceau)
+            yield morceau
+        TAILLE_REPONSE.observer(total, vue)
+
+    @staticmethod
+    async def _acompter_octets(contenu, vue):
+        total = 0
+        async for morceau in contenu:
+            total += len(morceau)
+            yield morceau
+        TAILLE_REPONSE.observer(total, vue)
+
+class StatiquesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, utilisable aussi dans une chaîne de middlewares asynchrone.
+
+    Sous ASGI, le fichier statique est envoyé par blocs lus dans des threads
+    (et non chargé en mémoire par le handler ASGI).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+
+        response = await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        if response.file_to_stream is not None:
+            response.streaming_content = iterer_fichier_async(response.file_to_stream)
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_email_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendingunit',
+            name='file_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
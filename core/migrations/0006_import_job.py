@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 12:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_upload_session'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_name', models.CharField(max_length=255)),
+                ('sources', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('done', 'Terminé'), ('failed', 'Échec')], default='pending', max_length=10)),
+                ('stage', models.CharField(blank=True, choices=[('files', 'Stockage des PDF'), ('rows', 'Lecture du CSV et création des unités')], max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('files_total', models.PositiveIntegerField(default=0)),
+                ('files_stored', models.PositiveIntegerField(default=0)),
+                ('rows_parsed', models.PositiveIntegerField(default=0)),
+                ('rows_matched', models.PositiveIntegerField(default=0)),
+                ('units_created', models.PositiveIntegerField(default=0)),
+                ('report', models.JSONField(blank=True, default=dict)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to=settings.AUTH_USER_MODEL)),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to='core.sendinggroup')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='importjob_claim_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 12:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_import_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='link',
+            index=models.Index(fields=['sending_unit', '-id'], name='link_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='link',
+            index=models.Index(condition=models.Q(('used', False)), fields=['sending_unit'], name='link_unused_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sendingunit',
+            index=models.Index(fields=['sending_group', 'name'], name='unit_group_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sendingunit',
+            index=models.Index(condition=models.Q(('sending_date__isnull', True)), fields=['sending_group', 'id'], name='unit_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sendingunit',
+            index=models.Index(condition=models.Q(('received', True)), fields=['sending_group'], name='unit_received_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='used_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sendingunit',
+            name='download_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
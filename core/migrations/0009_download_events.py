@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 12:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_download_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DownloadEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.PositiveSmallIntegerField()),
+                ('bytes_sent', models.BigIntegerField(blank=True, null=True)),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('link', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='download_events', to='core.link')),
+                ('sending_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='download_events', to='core.sendinggroup')),
+                ('sending_unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='download_events', to='core.sendingunit')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='dlevent_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DownloadRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('downloads', models.PositiveIntegerField(default=0)),
+                ('resumes', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('bytes_sent', models.BigIntegerField(default=0)),
+                ('duration_ms_total', models.BigIntegerField(default=0)),
+                ('duration_count', models.PositiveIntegerField(default=0)),
+                ('sending_group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='download_rollups', to='core.sendinggroup')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sending_group', 'hour'), name='dlrollup_group_hour_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 13:09
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def initialiser_compteurs(apps, schema_editor):
+    # Compteurs des groupes existants, calculés en une requête UPDATE
+    SendingGroup = apps.get_model('core', 'SendingGroup')
+    SendingUnit = apps.get_model('core', 'SendingUnit')
+
+    def compte(filtre=Q()):
+        unites = (
+            SendingUnit.objects.filter(filtre, sending_group=OuterRef('pk'))
+            .values('sending_group').annotate(n=Count('id')).values('n')
+        )
+        return Coalesce(Subquery(unites, output_field=IntegerField()), Value(0))
+
+    SendingGroup.objects.update(
+        total_count=compte(),
+        sent_count=compte(Q(sending_date__isnull=False)),
+        received_count=compte(Q(received=True)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_download_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendinggroup',
+            name='received_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sendinggroup',
+            name='sent_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sendinggroup',
+            name='total_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(initialiser_compteurs, migrations.RunPython.noop),
+    ]
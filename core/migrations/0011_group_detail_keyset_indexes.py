@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_group_counters'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sendingunit',
+            name='unit_group_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='sendingunit',
+            index=models.Index(fields=['sending_group', 'name', 'id'], name='unit_group_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sendingunit',
+            index=models.Index(fields=['sending_group', 'name'], name='unit_group_name_prefix_idx', opclasses=['int8_ops', 'text_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='sendingunit',
+            index=models.Index(fields=['sending_group', 'email'], name='unit_group_email_prefix_idx', opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+    ]
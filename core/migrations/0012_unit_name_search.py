@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 13:43
+
+from django.db import migrations, models
+
+
+def remplir_name_search(apps, schema_editor):
+    # En Python, comme SendingUnit.forme_recherche : LOWER() de SQLite ne traite que l'ASCII
+    SendingUnit = apps.get_model('core', 'SendingUnit')
+    lot = []
+    for unit in SendingUnit.objects.only('id', 'name').iterator(chunk_size=2000):
+        unit.name_search = unit.name.lower()
+        lot.append(unit)
+        if len(lot) >= 2000:
+            SendingUnit.objects.bulk_update(lot, ['name_search'])
+            lot = []
+    SendingUnit.objects.bulk_update(lot, ['name_search'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_group_detail_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sendingunit',
+            name='unit_group_name_prefix_idx',
+        ),
+        migrations.AddField(
+            model_name='sendingunit',
+            name='name_search',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(remplir_name_search, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='sendingunit',
+            index=models.Index(fields=['sending_group', 'name_search'], name='unit_group_name_search_idx', opclasses=['int8_ops', 'text_pattern_ops']),
+        ),
+    ]
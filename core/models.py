@@ -1,19 +1,68 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 import secrets
 import uuid
 # Create your models here.
 class SendingGroup(models.Model):
     label = models.TextField(max_length=255)
+    # Compteurs dénormalisés, tenus à jour par core/group_counters.py
+    total_count = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    received_count = models.PositiveIntegerField(default=0)
+
+    @property
+    def pending_count(self):
+        return self.total_count - self.sent_count
+
+    @property
+    def success_rate(self):
+        return round(100 * self.received_count / self.total_count) if self.total_count else 0
 
 class SendingUnit(models.Model):
     # SendingUnit(sending_group: SendingGroup, name: str, email: str, file: File)
     sending_group = models.ForeignKey(SendingGroup, on_delete=models.CASCADE, related_name='sending_units')
     name = models.TextField(max_length=255)
+    # Nom en minuscules, pour la recherche par préfixe insensible à la casse (unit_pages).
+    # Renseigné par save() ; à fournir explicitement avec bulk_create (voir forme_recherche)
+    name_search = models.TextField(blank=True, default='', editable=False)
     email = models.EmailField(max_length=255)
     file = models.FileField(upload_to='sending_files/')
+    # Nom d'origine du PDF : le fichier stocké porte le nom de son empreinte (blobs/)
+    file_name = models.CharField(max_length=255, blank=True)
     received = models.BooleanField(default=False)
     sending_date = models.DateTimeField(null=True, blank=True)
     received_date = models.DateTimeField(null=True, blank=True)
+    download_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Détail d'un groupe, trié par nom : pagination par clé sur (name, id)
+            models.Index(fields=['sending_group', 'name', 'id'], name='unit_group_name_id_idx'),
+            # Recherche par préfixe (LIKE 'préfixe%') dans un groupe. Les classes d'opérateurs
+            # *_pattern_ops ne servent qu'à PostgreSQL (collationnement autre que C) ; ignorées ailleurs
+            models.Index(fields=['sending_group', 'name_search'], opclasses=['int8_ops', 'text_pattern_ops'],
+                         name='unit_group_name_search_idx'),
+            models.Index(fields=['sending_group', 'email'], opclasses=['int8_ops', 'varchar_pattern_ops'],
+                         name='unit_group_email_prefix_idx'),
+            # Unités pas encore envoyées d'un groupe (send_emails, tableau de bord)
+            models.Index(fields=['sending_group', 'id'], condition=models.Q(sending_date__isnull=True),
+                         name='unit_pending_idx'),
+            # Unités reçues d'un groupe (statistiques)
+            models.Index(fields=['sending_group'], condition=models.Q(received=True),
+                         name='unit_received_idx'),
+        ]
+
+    @staticmethod
+    def forme_recherche(name):
+        return name.lower()
+
+    def save(self, *args, **kwargs):
+        self.name_search = self.forme_recherche(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'name_search'}
+        super().save(*args, **kwargs)
 
 class Link(models.Model):
     token = models.UUIDField(default=uuid.uuid4, unique=True)
@@ -21,12 +70,25 @@ class Link(models.Model):
     link = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     access_code = models.CharField(max_length=6, blank=True) # Code a 6 chiffres générée automatiquement lors de la création du lien
     used = models.BooleanField(default=False)
+    used_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Dernier lien d'une unité (export, renvoi)
+            models.Index(fields=['sending_unit', '-id'], name='link_latest_idx'),
+            # Liens encore valides d'une unité
+            models.Index(fields=['sending_unit'], condition=models.Q(used=False), name='link_unused_idx'),
+        ]
 
+    @staticmethod
+    def generer_code_acces():
+        # Code à 6 chiffres, de 100000 à 999999
+        return str(secrets.randbelow(900000) + 100000)
 
     def save(self, *args, **kwargs):
         # Générer automatiquement un code à 6 chiffres si absent
         if not self.access_code:
-            self.access_code = secrets.randbelow(899999) + 100000 # 100000 à 999999
+            self.access_code = self.generer_code_acces()
         super().save(*args, **kwargs)
 
     def get_download_url(self):
@@ -36,4 +98,144 @@ class Link(models.Model):
         return self.access_code
     
     def is_used(self):
-        return self.used
\ No newline at end of file
+        return self.used
+
+class EmailJob(models.Model):
+    # File d'attente persistante des emails de campagne, traitée par la commande process_email_jobs
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_SENDING, 'En cours'),
+        (STATUS_SENT, 'Envoyé'),
+        (STATUS_FAILED, 'Échec'),
+    ]
+
+    sending_group = models.ForeignKey(SendingGroup, on_delete=models.CASCADE, related_name='email_jobs')
+    sending_unit = models.ForeignKey(SendingUnit, on_delete=models.CASCADE, related_name='email_jobs')
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='emailjob_claim_idx'),
+        ]
+
+class UploadSession(models.Model):
+    # Upload d'un gros fichier (archive ZIP de PDF) découpé en morceaux, reprenable
+    STATUS_OPEN = 'open'
+    STATUS_COMPLETE = 'complete'
+    STATUS_CONSUMED = 'consumed'
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'En cours'),
+        (STATUS_COMPLETE, 'Terminé'),
+        (STATUS_CONSUMED, 'Utilisé'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)  # octets reçus et acquittés
+    sha256 = models.CharField(max_length=64, blank=True)  # empreinte attendue du fichier complet (optionnelle)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def is_open(self):
+        return self.status == self.STATUS_OPEN
+
+class ImportJob(models.Model):
+    # Import d'une campagne (CSV + PDF) exécuté en arrière-plan par la commande process_import_jobs
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'En attente'),
+        (STATUS_RUNNING, 'En cours'),
+        (STATUS_DONE, 'Terminé'),
+        (STATUS_FAILED, 'Échec'),
+    ]
+
+    STAGE_FILES = 'files'
+    STAGE_ROWS = 'rows'
+    STAGE_CHOICES = [
+        (STAGE_FILES, 'Stockage des PDF'),
+        (STAGE_ROWS, 'Lecture du CSV et création des unités'),
+    ]
+
+    group_name = models.CharField(max_length=255)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='import_jobs')
+    # Fichiers d'entrée, relatifs au dossier de travail du job, et sessions d'upload référencées
+    sources = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    stage = models.CharField(max_length=10, choices=STAGE_CHOICES, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    # Progression par étape
+    files_total = models.PositiveIntegerField(default=0)
+    files_stored = models.PositiveIntegerField(default=0)
+    rows_parsed = models.PositiveIntegerField(default=0)
+    rows_matched = models.PositiveIntegerField(default=0)
+    units_created = models.PositiveIntegerField(default=0)
+
+    group = models.ForeignKey(SendingGroup, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='import_jobs')
+    report = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='importjob_claim_idx'),
+        ]
+
+class DownloadEvent(models.Model):
+    # Journal des téléchargements, en ajout seul : écrit par lots par core/download_events.py
+    sending_group = models.ForeignKey(SendingGroup, on_delete=models.CASCADE, related_name='download_events')
+    sending_unit = models.ForeignKey(SendingUnit, on_delete=models.CASCADE, related_name='download_events')
+    link = models.ForeignKey(Link, on_delete=models.SET_NULL, null=True, blank=True, related_name='download_events')
+    status = models.PositiveSmallIntegerField()  # 200 (fichier complet) ou 206 (reprise partielle)
+    # Taille annoncée et durée de l'envoi ; inconnues si le serveur frontal envoie le fichier (x-accel-redirect)
+    bytes_sent = models.BigIntegerField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    # Heure de la requête, et non de l'écriture du lot
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='dlevent_created_idx'),
+        ]
+
+class DownloadRollup(models.Model):
+    # Compteurs horaires par groupe, agrégés depuis DownloadEvent par la commande rollup_download_events
+    sending_group = models.ForeignKey(SendingGroup, on_delete=models.CASCADE, related_name='download_rollups')
+    hour = models.DateTimeField()
+    downloads = models.PositiveIntegerField(default=0)  # réponses 200
+    resumes = models.PositiveIntegerField(default=0)  # réponses 206
+    units = models.PositiveIntegerField(default=0)  # unités distinctes dans l'heure
+    bytes_sent = models.BigIntegerField(default=0)
+    duration_ms_total = models.BigIntegerField(default=0)
+    duration_count = models.PositiveIntegerField(default=0)  # événements dont la durée est connue
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sending_group', 'hour'], name='dlrollup_group_hour_uniq'),
+        ]
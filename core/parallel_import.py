@@ -0,0 +1,218 @@
+# parallel_import.py
+"""
+Import parallèle sur plusieurs processus (ProcessPoolExecutor).
+
+Deux étapes de l'import sont réparties entre les cœurs :
+
+- le stockage des PDF (lecture, SHA-256, copie dans blobs/) : les fichiers
+  isolés et les membres des archives ZIP sont découpés en lots ;
+- la normalisation du CSV et l'appariement : chaque bloc brut du CSV est
+  nettoyé puis joint au FileIndex dans un processus, le FileIndex étant
+  construit une fois par processus à son démarrage.
+
+Les résultats sont fusionnés dans l'ordre de soumission et le dédoublonnage
+entre blocs reste fait par le processus principal : le résultat est
+identique à celui du chemin séquentiel (iter_correspondances), quel que
+soit le nombre de processus.
+
+Les processus sont lancés en mode « spawn » : ils n'héritent ni des
+connexions à la base ni des threads du worker, et ce module n'importe pas
+les modèles (les processus fils n'initialisent pas Django, seuls MEDIA_ROOT
+et FILE_UPLOAD_PERMISSIONS leur sont transmis).
+"""
+import logging
+import multiprocessing
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+from .blob_store import stocker_chunks, stocker_fichier
+from .file_index import FileIndex
+from .instrumentation import chronometrer, compter, mesure_courante
+from .utils import TAILLE_BLOC_CSV, _CouplesVus, _iter_blocs_bruts, clean_and_normalize_data
+from .zip_import import ArchiveInvalide, _lire_membre, indexer_zip
+
+logger = logging.getLogger(__name__)
+
+# Nombre de PDF confiés à un processus à la fois
+TAILLE_LOT_FICHIERS = 64
+
+# Index des PDF du processus fils (voir _initialiser)
+_INDEX = None
+
+def nombre_de_processus(processus=None):
+    """Nombre de processus demandé, ou IMPORT_PROCESSES (au moins 1)"""
+    if processus is None:
+        processus = getattr(settings, 'IMPORT_PROCESSES', 1)
+    return max(1, int(processus))
+
+def _reglages_fils():
+    return {
+        'MEDIA_ROOT': str(settings.MEDIA_ROOT),
+        'FILE_UPLOAD_PERMISSIONS': getattr(settings, 'FILE_UPLOAD_PERMISSIONS', None),
+    }
+
+def _initialiser(reglages, fichiers=None):
+    """Démarrage d'un processus fils : réglages minimaux et FileIndex"""
+    global _INDEX
+    if not settings.configured:
+        settings.configure(**reglages)
+    if fichiers is not None:
+        _INDEX = FileIndex(fichiers)
+
+def _pool(processus, fichiers=None):
+    return ProcessPoolExecutor(
+        max_workers=processus,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_initialiser,
+        initargs=(_reglages_fils(), fichiers),
+    )
+
+def _en_ordre(pool, fonction, taches, en_vol):
+    """
+    Comme pool.map, mais sans consommer tout l'itérable d'avance : au plus
+    `en_vol` tâches sont soumises à la fois, les résultats restent dans l'ordre.
+    """
+    futures = deque()
+    for arguments in taches:
+        futures.append(pool.submit(fonction, *arguments))
+        if len(futures) >= en_vol:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+def _decouper(elements, taille):
+    return [elements[i:i + taille] for i in range(0, len(elements), taille)]
+
+# ==================== STOCKAGE DES PDF ====================
+
+def _stocker_lot_fichiers(chemins):
+    """Processus fils : stocke des PDF isolés, retourne [(code, nom du blob)]"""
+    return [(Path(chemin).stem.strip(), stocker_fichier(chemin).name) for chemin in chemins]
+
+def _stocker_lot_membres(chemin_zip, noms):
+    """Processus fils : stocke des membres d'une archive déjà vérifiée"""
+    resultats = []
+    with zipfile.ZipFile(chemin_zip) as archive:
+        for code, nom in noms:
+            info = archive.getinfo(nom)
+            resultats.append((code, stocker_chunks(_lire_membre(archive, info), '.pdf').name))
+    return resultats
+
+def _index_archive(chemin_zip):
+    try:
+        with zipfile.ZipFile(chemin_zip) as archive:
+            return [(code, info.filename) for code, info in indexer_zip(archive).items()]
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, EOFError) as e:
+        raise ArchiveInvalide(f"Archive ZIP illisible : {e}") from e
+
+def stocker_pdfs_en_parallele(pdfs=(), archives=(), processus=None, apres_lot=None):
+    """
+    Range les PDF isolés puis ceux des archives ZIP dans blobs/ et retourne
+    {code: chemin du blob}, comme importer_zip.
+
+    À code égal, la dernière source l'emporte (même règle que le chemin
+    séquentiel). `apres_lot`, si fourni, reçoit le nombre de PDF de chaque
+    lot terminé. Lève ArchiveInvalide si une archive est refusée.
+    """
+    processus = nombre_de_processus(processus)
+    media_root = Path(settings.MEDIA_ROOT)
+
+    # Les archives sont vérifiées ici, avant de confier leurs membres aux processus
+    taches = [(_stocker_lot_fichiers, (lot,))
+              for lot in _decouper([str(chemin) for chemin in pdfs], TAILLE_LOT_FICHIERS)]
+    for archive in archives:
+        membres = _index_archive(archive)
+        taches += [(_stocker_lot_membres, (str(archive), lot))
+                   for lot in _decouper(membres, TAILLE_LOT_FICHIERS)]
+
+    mapping = {}
+    with _pool(processus) as pool:
+        futures = [pool.submit(fonction, *arguments) for fonction, arguments in taches]
+        for future in futures:
+            resultats = future.result()
+            for code, nom in resultats:
+                mapping[code] = str(media_root / nom)
+            if apres_lot is not None:
+                apres_lot(len(resultats))
+    return mapping
+
+# ==================== NORMALISATION ET APPARIEMENT ====================
+
+def _normaliser_et_joindre(bloc):
+    """
+    Processus fils : normalise un bloc brut et l'apparie au FileIndex.
+
+    Retourne le bloc apparié (le processus principal le dédoublonne avec
+    les blocs précédents sur ses colonnes email et code) et les durées des
+    étapes, que le processus principal ajoute à sa mesure.
+    """
+    debut = time.perf_counter()
+    bloc = clean_and_normalize_data(bloc)
+    milieu = time.perf_counter()
+    joint = _INDEX.joindre(bloc)
+    durees = {'normalize': milieu - debut, 'match': time.perf_counter() - milieu}
+    return joint[['nom', 'email', 'code', 'code_fichier', 'fichier']], durees
+
+def iter_correspondances_paralleles(file_path, fichiers, processus=None, chunksize=TAILLE_BLOC_CSV,
+                                    statistiques=None):
+    """
+    Équivalent parallèle de iter_correspondances pour un dictionnaire
+    {code: chemin} : mêmes correspondances, dans le même ordre.
+    """
+    processus = nombre_de_processus(processus)
+    if not fichiers:
+        logger.warning("Aucun fichier PDF trouvé")
+        return
+    if statistiques is None:
+        statistiques = {}
+
+    mesure = mesure_courante()
+    compter('fichiers_indexes', len(fichiers))
+    vus = _CouplesVus()
+    total_enregistrements = 0
+    correspondances_trouvees = 0
+
+    def blocs():
+        for bloc in chronometrer(_iter_blocs_bruts(file_path, chunksize), 'parse'):
+            compter('lignes_lues', len(bloc))
+            yield (bloc,)
+
+    with _pool(processus, dict(fichiers)) as pool:
+        for joint, durees in _en_ordre(pool, _normaliser_et_joindre, blocs(), en_vol=2 * processus):
+            # Temps cumulé des processus fils
+            for nom, duree in durees.items():
+                mesure.ajouter_duree(nom, duree)
+
+            # Dédoublonnage entre blocs, comme iter_csv_chunks
+            nouveaux = vus.nouveaux(joint['email'].tolist(), joint['code'].tolist())
+            if not nouveaux.all():
+                joint = joint[nouveaux]
+
+            total_enregistrements += len(joint)
+            apparies = joint[joint['fichier'].notna()]
+            correspondances_trouvees += len(apparies)
+            statistiques['lignes_lues'] = total_enregistrements
+            statistiques['correspondances'] = correspondances_trouvees
+            compter('lignes_normalisees', len(joint))
+            compter('correspondances', len(apparies))
+            compter('sans_fichier', len(joint) - len(apparies))
+
+            for nom, email, code_fichier, fichier in zip(
+                apparies['nom'].tolist(), apparies['email'].tolist(),
+                apparies['code_fichier'].tolist(), apparies['fichier'].tolist()
+            ):
+                yield {
+                    nom: {
+                        "email": email,
+                        "file": fichier,
+                        "file_name": FileIndex.nom_fichier(code_fichier, fichier),
+                    }
+                }
+
+    logger.debug("Correspondances trouvées : %s/%s (%s processus)",
+                correspondances_trouvees, total_enregistrements, processus)
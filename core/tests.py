@@ -1,3 +1,2058 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gzip
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+import random
+import smtplib
+import socket
+import threading
+import tempfile
+import time
+import unittest
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .benchmarks import (
+    FORMATS_CSV,
+    REQUETES_INDEXEES,
+    SCENARIOS,
+    bench_index_unites,
+    bench_telechargements_concurrents,
+    comparer_resultats,
+    ecrire_csv,
+    executer_suite,
+    index_utilise,
+    peupler_unites,
+    plan_requete,
+    urls_telechargement_async,
+)
+from .blob_store import stocker_chunks, stocker_fichier
+from . import folder_scan, unit_pages
+from .file_index import FileIndex, cle_canonique, cles_canoniques
+from .zip_import import ArchiveInvalide, importer_zip
+from .download_events import TAMPON, agreger_evenements, vider_tampon
+from .email_queue import enfiler_emails, traiter_file
+from .group_counters import reconcilier_compteurs
+from .import_jobs import dossier_travail, enfiler_import, liberer_imports_bloques, reclamer_import, traiter_imports
+from .ingestion_service import creer_groupe_en_masse
+from .instrumentation import FormatteurStructure, suivre_import
+from .parallel_import import iter_correspondances_paralleles, stocker_pdfs_en_parallele
+from .mailer import CampaignMailer
+from .metrics import REGISTRE, Histogramme, Registre
+from .throttling import RateLimiter, TokenBucket, est_refus_temporaire
+from .models import (
+    DownloadEvent,
+    DownloadRollup,
+    EmailJob,
+    ImportJob,
+    Link,
+    SendingGroup,
+    SendingUnit,
+    UploadSession,
+)
+
+from .utils import (
+    _CouplesVus,
+    clean_and_normalize_data,
+    clean_and_normalize_data_rowwise,
+    clean_code,
+    clean_code_series,
+    clean_email,
+    clean_email_series,
+    clean_name,
+    clean_name_series,
+    iter_correspondances,
+    iter_csv_chunks,
+    iter_csv_records,
+    lire_dossier,
+    mappe,
+    read_csv_file,
+)
+
+
+class NormalisationVectoriseeTests(SimpleTestCase):
+    """Parité entre la normalisation vectorisée et les fonctions ligne par ligne"""
+
+    CODES = [
+        '1', '001', '42', '1.0', '1.5', '.5', '1.', '..5', '.', '0', '000', 'abc', 'A-12',
+        '12345678901234567890', '69223173998626065.5', '9223372036854775808.0',
+        '1e5', '١٢', '²', '', 'nan',
+    ]
+    NOMS = ['', 'nan', 'NULL', 'None', 'Jean Dupont', 'marie@ex.com', 'x@y', 'Élodie', 'a.b@c']
+    EMAILS = [
+        'a@b.com', 'A@B.COM', 'contact x@y.fr', 'foo bar', 'a@b.c d@e.f', 'nodomain@x',
+        '', 'nan', 'x\ty@z.com', 'İ@x.com',
+    ]
+
+    def test_codes_identiques(self):
+        attendu = [clean_code(code) for code in self.CODES]
+        obtenu = clean_code_series(pd.Series(self.CODES, dtype=object)).tolist()
+        self.assertEqual(obtenu, attendu)
+
+    def test_emails_identiques(self):
+        attendu = [clean_email(email) for email in self.EMAILS]
+        obtenu = clean_email_series(pd.Series(self.EMAILS, dtype=object)).tolist()
+        self.assertEqual(obtenu, attendu)
+
+    def test_noms_identiques(self):
+        paires = [(nom, email) for nom in self.NOMS for email in self.EMAILS]
+        noms = pd.Series([nom for nom, _ in paires], dtype=object)
+        emails = pd.Series([email for _, email in paires], dtype=object)
+        attendu = [clean_name(nom, email) for nom, email in paires]
+        self.assertEqual(clean_name_series(noms, emails).tolist(), attendu)
+
+    def test_dataframe_identique_sur_donnees_aleatoires(self):
+        rng = random.Random(0)
+        lignes = [
+            [rng.choice(self.NOMS), f" {rng.choice(self.EMAILS)} ", rng.choice(self.CODES)]
+            for _ in range(5000)
+        ]
+        df = pd.DataFrame(lignes, columns=['nom', 'email', 'code'])
+        pd.testing.assert_frame_equal(
+            clean_and_normalize_data(df), clean_and_normalize_data_rowwise(df)
+        )
+
+    def test_codes_decimaux_longs(self):
+        rng = random.Random(1)
+        codes = [
+            ''.join(rng.choice('0123456789.') for _ in range(rng.randint(1, 30)))
+            for _ in range(2000)
+        ]
+        attendu = [clean_code(code) for code in codes]
+        self.assertEqual(clean_code_series(pd.Series(codes, dtype=object)).tolist(), attendu)
+
+    def test_colonnes_manquantes_et_dataframe_vide(self):
+        df = pd.DataFrame({'email': ['a@b.com', ''], 'code': ['7', '8']})
+        pd.testing.assert_frame_equal(
+            clean_and_normalize_data(df), clean_and_normalize_data_rowwise(df)
+        )
+        vide = pd.DataFrame(columns=['nom', 'email', 'code'])
+        self.assertTrue(clean_and_normalize_data(vide).empty)
+
+
+class LectureCsvParBlocsTests(SimpleTestCase):
+    """Lecture du CSV en streaming, bloc par bloc"""
+
+    def ecrire_csv(self, contenu):
+        fd, chemin = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(contenu)
+        self.addCleanup(os.remove, chemin)
+        return chemin
+
+    def test_doublons_retires_entre_blocs(self):
+        lignes = ['nom,email,code'] + [f'Nom {i % 7},user{i % 7}@ex.com,{i % 7}' for i in range(50)]
+        chemin = self.ecrire_csv('\n'.join(lignes) + '\n')
+
+        records = list(iter_csv_records(chemin, chunksize=4))
+
+        self.assertEqual(len(records), 7)
+        self.assertEqual(records[0], {'nom': 'Nom 0', 'email': 'user0@ex.com', 'code': '000'})
+        self.assertEqual(records, read_csv_file(chemin, chunksize=1000))
+
+    def test_couples_proches_conserves_entre_blocs(self):
+        # Même email ou même code dans des blocs différents : destinataires distincts
+        lignes = ['nom,email,code', 'Jean,jean@ex.com,1', 'Jean,jean@ex.com,2',
+                  'Marie,marie@ex.com,1', 'Jean,jean@ex.com,1']
+        chemin = self.ecrire_csv('\n'.join(lignes) + '\n')
+
+        records = list(iter_csv_records(chemin, chunksize=1))
+
+        self.assertEqual([(r['email'], r['code']) for r in records],
+                         [('jean@ex.com', '001'), ('jean@ex.com', '002'), ('marie@ex.com', '001')])
+
+    def test_empreintes_des_couples_vus(self):
+        vus = _CouplesVus()
+
+        self.assertEqual(vus.nouveaux(['b@ex.com', 'a@ex.com'], ['001', '002']).tolist(), [True, True])
+        self.assertEqual(vus.nouveaux(['a@ex.com', 'a@ex.com', 'c@ex.com'], ['002', '001', '001']).tolist(),
+                         [False, True, True])
+        # 16 octets par couple distinct, tableau trié
+        self.assertEqual(vus.empreintes.nbytes, 4 * 16)
+        self.assertEqual(vus.empreintes.tolist(), sorted(vus.empreintes.tolist()))
+
+    def test_blocs_bornes_par_chunksize(self):
+        lignes = [f'user{i}@ex.com,{i}' for i in range(25)]
+        chemin = self.ecrire_csv('\n'.join(lignes) + '\n')
+
+        tailles = [len(bloc) for bloc in iter_csv_chunks(chemin, chunksize=10)]
+
+        self.assertEqual(tailles, [10, 10, 5])
+
+    def test_formats_sans_entete(self):
+        deux_colonnes = self.ecrire_csv('jean@ex.com,1\nmarie@ex.com,2\n')
+        self.assertEqual(
+            list(iter_csv_records(deux_colonnes, chunksize=1)),
+            [
+                {'email': 'jean@ex.com', 'code': '001', 'nom': 'jean'},
+                {'email': 'marie@ex.com', 'code': '002', 'nom': 'marie'},
+            ],
+        )
+
+        une_colonne = self.ecrire_csv('Jean;jean@ex.com;A1\nmarie@ex.com;B2\n')
+        self.assertEqual(
+            list(iter_csv_records(une_colonne, chunksize=1)),
+            [
+                {'nom': 'Jean', 'email': 'jean@ex.com', 'code': 'A1'},
+                {'nom': 'marie', 'email': 'marie@ex.com', 'code': 'B2'},
+            ],
+        )
+
+
+class IndexFichiersTests(SimpleTestCase):
+    """Appariement code -> PDF par clé canonique (FileIndex)"""
+
+    def test_cles_canoniques(self):
+        codes = ['001', '1', '01', ' 1.0 ', '0', '000', '12.00', '1.5', 'MAT-1', 'DOC002', '']
+        attendues = ['1', '1', '1', '1', '0', '0', '12', '1.5', 'MAT-1', 'DOC002', '']
+
+        self.assertEqual([cle_canonique(code) for code in codes], attendues)
+        self.assertEqual(cles_canoniques(pd.Series(codes, dtype=object)).tolist(), attendues)
+
+    def test_recherche_unique(self):
+        index = FileIndex({'1': '/pdfs/1.pdf', 'DOC002': '/pdfs/DOC002.pdf'})
+
+        self.assertEqual(index.rechercher('001'), ('1', '/pdfs/1.pdf'))
+        self.assertEqual(index.rechercher('1.0'), ('1', '/pdfs/1.pdf'))
+        self.assertEqual(index.rechercher('DOC002'), ('DOC002', '/pdfs/DOC002.pdf'))
+        self.assertIsNone(index.rechercher('002'))
+
+    def test_ambiguite_signalee(self):
+        index = FileIndex({'1': '/pdfs/1.pdf', '001': '/pdfs/001.pdf', '7': '/pdfs/7.pdf'})
+
+        self.assertEqual(index.rapport_ambiguites(), [
+            "Clé '1' ambiguë : 001, 1 (seul le code exact est apparié)"
+        ])
+        self.assertEqual(index.rechercher('001'), ('001', '/pdfs/001.pdf'))
+        self.assertEqual(index.rechercher('1'), ('1', '/pdfs/1.pdf'))
+        self.assertIsNone(index.rechercher('01'))
+        self.assertEqual(index.rechercher('007'), ('7', '/pdfs/7.pdf'))
+
+    def test_jointure_identique_a_la_recherche(self):
+        rng = random.Random(0)
+        fichiers = {code: f'/pdfs/{code}.pdf' for code in ['1', '001', '02', '3', '0004', 'A1', '12']}
+        codes = [rng.choice(['001', '1', '01', '002', '2', '003', '004', '4.0', 'A1', 'B2', '012', ''])
+                 for _ in range(300)]
+        records = pd.DataFrame({'nom': [f'Nom {i}' for i in range(300)], 'code': codes},
+                               index=range(1000, 1300))
+
+        index = FileIndex(fichiers)
+        joint = index.joindre(records)
+
+        attendus = [index.rechercher(code) for code in codes]
+        obtenus = [
+            None if pd.isna(code) else (code, fichier)
+            for code, fichier in zip(joint['code_fichier'], joint['fichier'])
+        ]
+        self.assertEqual(obtenus, attendus)
+        self.assertEqual(joint['nom'].tolist(), records['nom'].tolist())
+
+    def test_codes_disponibles_non_repetes(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            for code in ['001', '002', '003']:
+                (Path(dossier) / f'{code}.pdf').write_bytes(b'%PDF-1.4')
+            csv = Path(dossier) / 'data.csv'
+            lignes = ['nom,email,code', 'Jean,jean@ex.com,1'] + [f'N{i},n{i}@ex.com,{100 + i}' for i in range(20)]
+            csv.write_text('\n'.join(lignes) + '\n', encoding='utf-8')
+
+            with self.assertLogs('core', 'DEBUG') as journal:
+                resultats = list(iter_correspondances(csv, dossier))
+
+        self.assertEqual(resultats, [{'Jean': {
+            'email': 'jean@ex.com', 'file': str(Path(dossier) / '001.pdf'), 'file_name': '001.pdf'
+        }}])
+        # L'extrait des codes est journalisé une fois, pas pour chaque ligne sans fichier
+        sortie = '\n'.join(journal.output)
+        self.assertEqual(sortie.count('extrait'), 1)
+        self.assertEqual(sortie.count('Aucun fichier pour le code'), 1)
+
+
+class IndexationDossierTests(SimpleTestCase):
+    """Parcours des dossiers de PDF avec os.scandir et index en cache"""
+
+    def setUp(self):
+        parent = tempfile.TemporaryDirectory()
+        self.addCleanup(parent.cleanup)
+        self.dossier = Path(parent.name) / 'pdfs'
+        (self.dossier / 'lot2').mkdir(parents=True)
+        for nom in ['001.pdf', '002.PDF', '003.Pdf', 'notes.txt', 'lot2/004.pdf']:
+            (self.dossier / nom).write_bytes(b'%PDF-1.4 ' + nom.encode())
+
+    def vieillir(self):
+        """Date les dossiers dans le passé, comme un dossier qui n'est plus modifié"""
+        passe = time.time() - 60
+        for chemin in (self.dossier, self.dossier / 'lot2'):
+            os.utime(chemin, (passe, passe))
+
+    def codes(self, entrees):
+        return sorted(entree.code for entree in entrees)
+
+    def test_extensions_sans_casse_et_sous_dossiers(self):
+        self.assertEqual(self.codes(folder_scan.indexer_dossier(self.dossier, cache=False)),
+                         ['001', '002', '003'])
+
+        recursif = folder_scan.indexer_dossier(self.dossier, recursif=True, cache=False)
+        self.assertEqual(self.codes(recursif), ['001', '002', '003', '004'])
+        self.assertEqual(
+            folder_scan.indexer_dossier(self.dossier, recursif=True, threads=4, cache=False), recursif
+        )
+
+    def test_tailles_et_dates(self):
+        entrees = folder_scan.indexer_dossier(self.dossier, avec_stats=True, cache=False)
+
+        premier = entrees[0]
+        self.assertEqual(premier.taille, len(b'%PDF-1.4 001.pdf'))
+        self.assertAlmostEqual(premier.mtime, (self.dossier / '001.pdf').stat().st_mtime)
+
+    def test_index_reutilise_tant_que_le_dossier_est_inchange(self):
+        self.vieillir()
+        premier = folder_scan.indexer_dossier(self.dossier, recursif=True)
+
+        cache = folder_scan.chemin_cache(self.dossier)
+        self.assertTrue(cache.exists())
+        self.assertEqual(cache.parent, self.dossier.parent)
+
+        with mock.patch.object(folder_scan, '_parcourir') as parcourir:
+            self.assertEqual(folder_scan.indexer_dossier(self.dossier, recursif=True), premier)
+        parcourir.assert_not_called()
+
+        # Un ajout dans un sous-dossier change sa date : l'index est reconstruit
+        (self.dossier / 'lot2' / '005.pdf').write_bytes(b'%PDF-1.4')
+        self.assertIn('005', self.codes(folder_scan.indexer_dossier(self.dossier, recursif=True)))
+
+    def test_dossier_modifie_pendant_le_parcours_non_mis_en_cache(self):
+        folder_scan.indexer_dossier(self.dossier)
+
+        self.assertFalse(folder_scan.chemin_cache(self.dossier).exists())
+
+    def test_lire_dossier(self):
+        fichiers = lire_dossier(self.dossier)
+
+        self.assertEqual(fichiers, {code: str(self.dossier / f'{code}{ext}')
+                                    for code, ext in [('001', '.pdf'), ('002', '.PDF'), ('003', '.Pdf')]})
+        self.assertEqual(lire_dossier(self.dossier / 'absent'), {})
+
+
+class CreationGroupeEnMasseTests(TestCase):
+    """Persistance des unités et liens par lots (bulk_create)"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        reglages = override_settings(MEDIA_ROOT=self.media_root)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        (self.media_root / 'pdfs').mkdir()
+        self.pdf = self.media_root / 'pdfs' / '001.pdf'
+        self.pdf.write_bytes(b'%PDF-1.4 test')
+
+    def correspondances(self, n):
+        for i in range(n):
+            yield {f'Nom {i}': {'email': f'user{i}@ex.com', 'file': str(self.pdf)}}
+
+    def test_unites_et_liens_crees_par_lots(self):
+        with self.assertNumQueries(1 + 2 * 3 + 1 + 2):  # groupe + 3 lots x 2 bulk_create + compteurs + savepoint
+            group, rapport = creer_groupe_en_masse('Campagne', self.correspondances(25), batch_size=10)
+
+        self.assertEqual(rapport['nb_unites'], 25)
+        group.refresh_from_db()
+        self.assertEqual((group.total_count, group.sent_count, group.pending_count), (25, 0, 25))
+        self.assertEqual(group.sending_units.count(), 25)
+        self.assertEqual(Link.objects.filter(sending_unit__sending_group=group).count(), 25)
+        for phase in ('lecture', 'preparation', 'unites', 'liens', 'total'):
+            self.assertIn(phase, rapport)
+
+        link = Link.objects.first()
+        self.assertRegex(link.access_code, r'^[1-9][0-9]{5}$')
+
+    def test_blob_reference_sans_copie(self):
+        blob = stocker_fichier(self.pdf)
+        correspondances = ({f'Nom {i}': {'email': f'user{i}@ex.com', 'file': str(blob.path)}} for i in range(3))
+
+        group, _ = creer_groupe_en_masse('Campagne', correspondances)
+
+        self.assertEqual(set(group.sending_units.values_list('file', flat=True)), {blob.name})
+        self.assertEqual(len(list((self.media_root / 'blobs').rglob('*.pdf'))), 1)
+
+    def test_fichier_du_media_copie_par_campagne(self):
+        premier, _ = creer_groupe_en_masse('Campagne 1', self.correspondances(1))
+        # Une campagne suivante dépose un autre document sous le même nom
+        self.pdf.write_bytes(b'%PDF-1.4 autre campagne')
+        second, _ = creer_groupe_en_masse('Campagne 2', self.correspondances(1))
+
+        unit_1, unit_2 = premier.sending_units.get(), second.sending_units.get()
+        self.assertTrue(unit_1.file.name.startswith('blobs/'))
+        self.assertNotEqual(unit_1.file.name, unit_2.file.name)
+        self.assertEqual(unit_1.file.read(), b'%PDF-1.4 test')
+        unit_1.file.close()
+
+    def test_aucun_groupe_partiel_en_cas_d_erreur(self):
+        def correspondances_interrompues():
+            yield from self.correspondances(5)
+            raise RuntimeError("lecture interrompue")
+
+        with self.assertRaises(RuntimeError):
+            creer_groupe_en_masse('Campagne', correspondances_interrompues(), batch_size=2)
+
+        self.assertFalse(SendingGroup.objects.exists())
+        self.assertFalse(SendingUnit.objects.exists())
+
+    def test_aucune_correspondance(self):
+        group, rapport = creer_groupe_en_masse('Campagne', iter([]))
+
+        self.assertIsNone(group)
+        self.assertEqual(rapport['nb_unites'], 0)
+        self.assertFalse(SendingGroup.objects.exists())
+
+
+@override_settings(EMAIL_RATE_LIMITS={})
+class FileEmailsTests(TestCase):
+    """File d'attente persistante des emails de campagne"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', password='motdepasse', is_staff=True)
+        self.group = SendingGroup.objects.create(label='Campagne')
+        for i in range(3):
+            unit = SendingUnit.objects.create(
+                sending_group=self.group, name=f'Nom {i}', email=f'user{i}@ex.com', file='pdfs/001.pdf'
+            )
+            Link.objects.create(sending_unit=unit)
+
+    def enfiler(self):
+        return enfiler_emails(self.group, 'Sujet', 'Bonjour {nom}, code {code}', lambda url: f'http://test{url}')
+
+    def test_vue_enfile_sans_envoyer(self):
+        self.client.force_login(self.admin)
+
+        response = self.client.post(
+            reverse('send_emails', args=[self.group.id]),
+            {'email_subject': 'Sujet', 'email_body': 'Bonjour {nom} : {lien}'},
+        )
+
+        self.assertRedirects(response, reverse('send_progress', args=[self.group.id]))
+        self.assertEqual(EmailJob.objects.filter(status=EmailJob.STATUS_PENDING).count(), 3)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertIn('/download/', EmailJob.objects.first().body)
+
+    def test_pas_de_double_enfilement(self):
+        self.assertEqual(self.enfiler(), 3)
+        self.assertEqual(self.enfiler(), 0)
+
+    def test_dernier_lien_de_l_unite(self):
+        unit = self.group.sending_units.get(name='Nom 0')
+        dernier = Link.objects.create(sending_unit=unit)
+
+        self.enfiler()
+
+        body = EmailJob.objects.get(sending_unit=unit).body
+        self.assertEqual(body, f'Bonjour Nom 0, code {dernier.access_code}')
+
+    def test_worker_envoie_et_date_les_unites(self):
+        self.enfiler()
+
+        envoyes, echecs = traiter_file(batch_size=2)
+
+        self.assertEqual((envoyes, echecs), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(self.group.sending_units.filter(sending_date__isnull=True).exists())
+        self.assertEqual(EmailJob.objects.filter(status=EmailJob.STATUS_SENT).count(), 3)
+
+        self.client.force_login(self.admin)
+        status = self.client.get(reverse('send_status', args=[self.group.id])).json()
+        self.assertEqual(status['sent'], 3)
+        self.assertTrue(status['termine'])
+        page = self.client.get(reverse('send_progress', args=[self.group.id]))
+        self.assertContains(page, 'Envoi terminé.')
+
+    def test_domaine_sature_reporte_sans_bloquer(self):
+        self.enfiler()
+        horloge = HorlogeFactice()
+        limiter = RateLimiter(domain_rates={'ex.com': 0.01}, clock=horloge, sleep=horloge.sleep)
+        mailer = CampaignMailer(limiter=limiter, max_domain_wait=10)
+
+        self.assertEqual(traiter_file(mailer=mailer), (1, 0))
+
+        self.assertEqual(horloge.attentes, [])
+        self.assertEqual(len(mail.outbox), 1)
+        reportes = EmailJob.objects.filter(status=EmailJob.STATUS_PENDING)
+        self.assertEqual(reportes.count(), 2)
+        for job in reportes:
+            self.assertEqual(job.attempts, 0)
+            self.assertGreater(job.next_attempt_at, job.updated_at)
+        self.assertEqual(mailer.statistiques['reportes'], 2)
+
+    @override_settings(EMAIL_JOB_MAX_ATTEMPTS=2)
+    def test_echec_reprogramme_puis_abandonne(self):
+        self.enfiler()
+
+        with mock.patch('core.mailer.CampaignMailer._envoyer_lot',
+                        side_effect=lambda lot: [OSError('SMTP indisponible')] * len(lot)):
+            self.assertEqual(traiter_file(), (0, 3))
+            job = EmailJob.objects.first()
+            self.assertEqual(job.status, EmailJob.STATUS_PENDING)
+            self.assertGreater(job.next_attempt_at, job.updated_at)
+
+            # Le job n'est pas encore prêt : rien n'est réclamé
+            self.assertEqual(traiter_file(), (0, 0))
+
+            EmailJob.objects.update(next_attempt_at=job.created_at)
+            self.assertEqual(traiter_file(), (0, 3))
+
+        self.assertEqual(EmailJob.objects.filter(status=EmailJob.STATUS_FAILED).count(), 3)
+        self.assertEqual(EmailJob.objects.first().last_error, 'SMTP indisponible')
+
+
+class CompteurBackend(LocmemBackend):
+    """Backend locmem qui compte les connexions ouvertes"""
+    ouvertures = 0
+    verrou = threading.Lock()
+
+    def open(self):
+        with CompteurBackend.verrou:
+            CompteurBackend.ouvertures += 1
+        return True
+
+
+class CoupureBackend(CompteurBackend):
+    """Backend locmem dont la connexion tombe au deuxième message"""
+    deja_coupe = False
+
+    def send_messages(self, messages):
+        if len(mail.outbox) == 1 and not CoupureBackend.deja_coupe:
+            CoupureBackend.deja_coupe = True
+            raise smtplib.SMTPServerDisconnected('Connexion perdue')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_RATE_LIMITS={})
+class CampaignMailerTests(SimpleTestCase):
+    """Réutilisation des connexions SMTP pour les envois de campagne"""
+
+    def setUp(self):
+        CompteurBackend.ouvertures = 0
+        CoupureBackend.deja_coupe = False
+
+    def messages(self, mailer, n):
+        return [mailer.construire_message('Sujet', f'Corps {i}', f'user{i}@ex.com', html_body='<p>Corps</p>')
+                for i in range(n)]
+
+    def test_une_connexion_par_lot(self):
+        mailer = CampaignMailer(batch_size=4, backend='core.tests.CompteurBackend')
+
+        erreurs = mailer.envoyer(self.messages(mailer, 10))
+
+        self.assertEqual(erreurs, [None] * 10)
+        self.assertEqual(len(mail.outbox), 10)
+        self.assertEqual(CompteurBackend.ouvertures, 3)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+
+    def test_pool_de_connexions_paralleles(self):
+        mailer = CampaignMailer(batch_size=5, connections=3, backend='core.tests.CompteurBackend')
+
+        erreurs = mailer.envoyer(self.messages(mailer, 30))
+
+        self.assertEqual(erreurs, [None] * 30)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(f'user{i}@ex.com' for i in range(30)))
+        self.assertEqual(CompteurBackend.ouvertures, 6)
+
+    def test_reconnexion_apres_coupure(self):
+        mailer = CampaignMailer(batch_size=10, backend='core.tests.CoupureBackend')
+
+        erreurs = mailer.envoyer(self.messages(mailer, 3))
+
+        self.assertEqual(erreurs, [None] * 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(CompteurBackend.ouvertures, 2)
+
+
+class RefusTemporaireBackend(LocmemBackend):
+    """Backend locmem qui répond 451 au premier envoi vers gmail.com"""
+    deja_refuse = False
+
+    def send_messages(self, messages):
+        if messages[0].to[0].endswith('@gmail.com') and not RefusTemporaireBackend.deja_refuse:
+            RefusTemporaireBackend.deja_refuse = True
+            raise smtplib.SMTPRecipientsRefused({messages[0].to[0]: (451, b'Try again later')})
+        return super().send_messages(messages)
+
+
+class HorlogeFactice:
+    """Horloge contrôlée par les tests : sleep() fait avancer le temps"""
+
+    def __init__(self):
+        self.maintenant = 0.0
+        self.attentes = []
+
+    def __call__(self):
+        return self.maintenant
+
+    def sleep(self, duree):
+        self.attentes.append(duree)
+        self.maintenant += duree
+
+
+class LimitationDebitTests(SimpleTestCase):
+    """Seaux à jetons global et par domaine"""
+
+    def test_seau_a_jetons(self):
+        horloge = HorlogeFactice()
+        bucket = TokenBucket(2, capacity=2, clock=horloge)
+
+        self.assertEqual([bucket.reserver() for _ in range(4)], [0.0, 0.0, 0.5, 1.0])
+
+    def test_limites_globale_et_par_domaine(self):
+        horloge = HorlogeFactice()
+        limiter = RateLimiter(global_rate=10, default_domain_rate=1, domain_rates={'lent.fr': 0.5},
+                              clock=horloge, sleep=horloge.sleep)
+
+        for _ in range(3):
+            limiter.acquerir('a@lent.fr')
+        # 3 messages à 0,5/s (1 jeton en réserve) : le dernier part à t = 4 s
+        self.assertAlmostEqual(horloge.maintenant, 4.0)
+
+        horloge.attentes.clear()
+        limiter.acquerir('b@autre.fr')
+        self.assertEqual(horloge.attentes, [])
+
+    def test_ralentissement_puis_reprise(self):
+        horloge = HorlogeFactice()
+        limiter = RateLimiter(default_domain_rate=4, retry_pause=10, clock=horloge, sleep=horloge.sleep)
+        limiter.acquerir('a@ex.com')
+
+        limiter.signaler_refus('a@ex.com')
+        bucket = limiter.domain_buckets['ex.com']
+        self.assertEqual(bucket.rate, 2)
+        self.assertGreaterEqual(limiter.acquerir('a@ex.com'), 10)
+
+        for _ in range(20):
+            limiter.signaler_succes('a@ex.com')
+        self.assertEqual(bucket.rate, 4)
+
+    def test_detection_des_refus_temporaires(self):
+        self.assertTrue(est_refus_temporaire(smtplib.SMTPDataError(421, b'Too many messages')))
+        self.assertFalse(est_refus_temporaire(smtplib.SMTPDataError(550, b'No such user')))
+        self.assertTrue(est_refus_temporaire(smtplib.SMTPRecipientsRefused({'a@b.c': (450, b'later')})))
+
+    def test_mailer_retente_apres_refus_temporaire(self):
+        RefusTemporaireBackend.deja_refuse = False
+        horloge = HorlogeFactice()
+        limiter = RateLimiter(default_domain_rate=100, retry_pause=5, clock=horloge, sleep=horloge.sleep)
+        mailer = CampaignMailer(backend='core.tests.RefusTemporaireBackend', limiter=limiter)
+
+        messages = [mailer.construire_message('Sujet', 'Corps', dest)
+                    for dest in ['a@gmail.com', 'b@gmail.com', 'c@ex.com']]
+        erreurs = mailer.envoyer(messages)
+
+        self.assertEqual(erreurs, [None] * 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertLess(limiter.domain_buckets['gmail.com'].rate, 100)
+        self.assertGreaterEqual(sum(horloge.attentes), 5)
+        self.assertEqual(mailer.statistiques['envoyes'], 3)
+        self.assertIn('messages_par_seconde', mailer.statistiques)
+
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:  # dépendance de test optionnelle
+    Controller = None
+
+
+class Collecteur:
+    def __init__(self):
+        self.destinataires = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.destinataires.extend(envelope.rcpt_tos)
+        return '250 OK'
+
+
+@unittest.skipIf(Controller is None, "aiosmtpd n'est pas installé")
+@override_settings(EMAIL_RATE_LIMITS={})
+class CampaignMailerSmtpTests(SimpleTestCase):
+    """Envoi réel sur un serveur SMTP local (aiosmtpd)"""
+
+    def test_envoi_sur_serveur_smtp_local(self):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+
+        collecteur = Collecteur()
+        controleur = Controller(collecteur, hostname='127.0.0.1', port=port)
+        controleur.start()
+        self.addCleanup(controleur.stop)
+
+        with self.settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                           EMAIL_HOST='127.0.0.1', EMAIL_PORT=port,
+                           EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD=''):
+            mailer = CampaignMailer(batch_size=4, connections=2)
+            erreurs = mailer.envoyer(
+                mailer.construire_message('Sujet', 'Corps', f'user{i}@ex.com') for i in range(10)
+            )
+
+        self.assertEqual(erreurs, [None] * 10)
+        self.assertEqual(sorted(collecteur.destinataires), sorted(f'user{i}@ex.com' for i in range(10)))
+
+
+class TableauDeBordTests(TestCase):
+    """Tableau de bord : compteurs dénormalisés des groupes, sans agrégation"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', password='motdepasse', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def creer_groupes(self, n):
+        for g in range(n):
+            group = SendingGroup.objects.create(label=f'Groupe {g}')
+            SendingUnit.objects.bulk_create([
+                SendingUnit(sending_group=group, name='A', email='a@ex.com', file='pdfs/a.pdf',
+                            sending_date=timezone.now(), received=True),
+                SendingUnit(sending_group=group, name='B', email='b@ex.com', file='pdfs/b.pdf',
+                            sending_date=timezone.now()),
+                SendingUnit(sending_group=group, name='C', email='c@ex.com', file='pdfs/c.pdf'),
+            ])
+            reconcilier_compteurs([group.pk])
+
+    def nombre_de_requetes(self):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(requetes), response
+
+    def test_nombre_de_requetes_constant(self):
+        self.creer_groupes(2)
+        peu, _ = self.nombre_de_requetes()
+
+        self.creer_groupes(40)
+        with CaptureQueriesContext(connection) as requetes:
+            beaucoup, response = self.nombre_de_requetes()
+
+        self.assertEqual(peu, beaucoup)
+        self.assertFalse([requete for requete in requetes if 'core_sendingunit' in requete['sql']])
+        group = response.context['groups'][0]
+        self.assertEqual(
+            (group.total_count, group.sent_count, group.pending_count, group.received_count, group.success_rate),
+            (3, 2, 1, 1, 33),
+        )
+
+    def test_pagination(self):
+        self.creer_groupes(30)
+
+        response = self.client.get(reverse('dashboard'), {'page': 2})
+
+        self.assertEqual(len(response.context['groups']), 5)
+        self.assertContains(response, 'Page 2 sur 2')
+
+
+class ExportResultatsTests(TestCase):
+    """Export en streaming, en nombre de requêtes constant"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', password='motdepasse', is_staff=True)
+        self.client.force_login(self.admin)
+        self.group = SendingGroup.objects.create(label='Campagne')
+
+    def creer_unites(self, n):
+        for i in range(n):
+            unit = SendingUnit.objects.create(
+                sending_group=self.group, name=f'Nom {i}', email=f'user{i}@ex.com', file='pdfs/001.pdf'
+            )
+            Link.objects.create(sending_unit=unit, access_code='111111')
+            Link.objects.create(sending_unit=unit, access_code=f'{200000 + i}')
+
+    def exporter(self, **params):
+        response = self.client.get(reverse('export_results', args=[self.group.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_avec_dernier_code_et_requetes_constantes(self):
+        self.creer_unites(3)
+        with CaptureQueriesContext(connection) as peu:
+            self.exporter()
+
+        self.creer_unites(30)
+        with CaptureQueriesContext(connection) as beaucoup:
+            contenu = self.exporter().decode('utf-8')
+
+        self.assertEqual(len(peu), len(beaucoup))
+        lignes = contenu.splitlines()
+        self.assertEqual(len(lignes), 34)
+        self.assertEqual(lignes[1], 'Nom 0,user0@ex.com,,Non,,200000')
+
+    def test_csv_gzip(self):
+        self.creer_unites(5)
+
+        contenu = gzip.decompress(self.exporter(format='csv.gz')).decode('utf-8')
+
+        self.assertEqual(contenu, self.exporter().decode('utf-8'))
+
+    def test_format_inconnu(self):
+        response = self.client.get(reverse('export_results', args=[self.group.id]), {'format': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_formats_analystes(self):
+        self.creer_unites(2)
+        for export_format, module in (('xlsx', 'openpyxl'), ('parquet', 'pyarrow')):
+            response = self.client.get(reverse('export_results', args=[self.group.id]), {'format': export_format})
+            if importlib.util.find_spec(module) is None:
+                self.assertEqual(response.status_code, 501)
+            else:
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(len(b''.join(response.streaming_content)), 0)
+
+
+@override_settings(DOWNLOAD_EVENT_FLUSH_INTERVAL=None)
+class LivraisonFichiersTests(TestCase):
+    """Modes de livraison de download_file_view"""
+
+    CONTENU = b'%PDF-1.4 ' + bytes(range(256)) * 8
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        reglages = override_settings(MEDIA_ROOT=self.media_root)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        (self.media_root / 'pdfs').mkdir()
+        (self.media_root / 'pdfs' / '001.pdf').write_bytes(self.CONTENU)
+        group = SendingGroup.objects.create(label='Campagne')
+        self.unit = SendingUnit.objects.create(
+            sending_group=group, name='Jean', email='jean@ex.com', file='pdfs/001.pdf'
+        )
+        self.link = Link.objects.create(sending_unit=self.unit, access_code='123456')
+
+    def telecharger(self, **entetes):
+        return self.client.post(
+            reverse('download_file', args=[self.link.token]),
+            {'email': 'Jean@ex.com', 'access_code': '123456'},
+            headers=entetes,
+        )
+
+    @override_settings(FILE_DELIVERY_BACKEND='direct')
+    def test_direct_sans_copie(self):
+        response = self.telecharger()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENU)
+        self.assertEqual(list((self.media_root / 'pdfs').iterdir()), [self.media_root / 'pdfs' / '001.pdf'])
+        self.link.refresh_from_db()
+        self.assertTrue(self.link.used)
+
+    @override_settings(FILE_DELIVERY_BACKEND='x-accel-redirect', FILE_DELIVERY_ACCEL_PREFIX='/interne/')
+    def test_x_accel_redirect(self):
+        response = self.telecharger()
+
+        self.assertEqual(response['X-Accel-Redirect'], '/interne/pdfs/001.pdf')
+        self.assertEqual(response.content, b'')
+        self.assertIn('001.pdf', response['Content-Disposition'])
+
+    @override_settings(FILE_DELIVERY_BACKEND='x-sendfile')
+    def test_x_sendfile(self):
+        response = self.telecharger()
+
+        self.assertEqual(response['X-Sendfile'], str(self.media_root / 'pdfs' / '001.pdf'))
+
+    @override_settings(FILE_DELIVERY_BACKEND='range')
+    def test_range_reprise_et_etag(self):
+        redirection = self.telecharger()
+        self.assertEqual(redirection.status_code, 302)
+        url = redirection['Location']
+
+        complet = self.client.get(url)
+        self.assertEqual(complet.status_code, 200)
+        self.assertEqual(b''.join(complet.streaming_content), self.CONTENU)
+        etag = complet['ETag']
+
+        partiel = self.client.get(url, headers={'Range': 'bytes=100-', 'If-Range': etag})
+        self.assertEqual(partiel.status_code, 206)
+        self.assertEqual(partiel['Content-Range'], f'bytes 100-{len(self.CONTENU) - 1}/{len(self.CONTENU)}')
+        self.assertEqual(b''.join(partiel.streaming_content), self.CONTENU[100:])
+
+        suffixe = self.client.get(url, headers={'Range': 'bytes=-10'})
+        self.assertEqual(b''.join(suffixe.streaming_content), self.CONTENU[-10:])
+
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.client.get(url, headers={'Range': 'bytes=99999-'}).status_code, 416)
+        perime = self.client.get(url, headers={'Range': 'bytes=100-', 'If-Range': '"autre"'})
+        self.assertEqual(perime.status_code, 200)
+
+    @override_settings(FILE_DELIVERY_BACKEND='range')
+    def test_range_signature_invalide(self):
+        url = reverse('download_resume', args=[self.link.token, 'signature-invalide'])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    @override_settings(FILE_DELIVERY_BACKEND='range')
+    def test_reprise_refusee_apres_nouveau_lien(self):
+        url = self.telecharger()['Location']
+        autre = Link.objects.create(sending_unit=SendingUnit.objects.create(
+            sending_group=self.unit.sending_group, name='Marie', email='marie@ex.com', file='pdfs/001.pdf'))
+        # La signature d'un lien ne vaut pas pour un autre
+        self.assertEqual(self.client.get(url.replace(str(self.link.token), str(autre.token))).status_code, 403)
+
+        Link.objects.create(sending_unit=self.unit)
+
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class StockageParContenuTests(TestCase):
+    """Stockage des PDF adressé par SHA-256 (blobs/)"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        reglages = override_settings(MEDIA_ROOT=self.media_root)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def test_contenu_identique_stocke_une_fois(self):
+        premier = stocker_chunks([b'%PDF-1.4 ', b'contenu'])
+        second = stocker_chunks(iter([b'%PDF-1.4 contenu']))
+
+        self.assertTrue(premier.created)
+        self.assertFalse(second.created)
+        self.assertEqual(premier.name, second.name)
+        self.assertEqual(premier.name, f'blobs/{premier.sha256[:2]}/{premier.sha256[2:4]}/{premier.sha256}.pdf')
+        self.assertEqual(premier.path.read_bytes(), b'%PDF-1.4 contenu')
+        self.assertEqual(list((self.media_root / 'blobs' / 'tmp').iterdir()), [])
+
+    def test_create_group_deduplique_les_uploads(self):
+        admin = User.objects.create_user('admin', password='motdepasse', is_staff=True)
+        self.client.force_login(admin)
+
+        response = self.client.post(reverse('create_group'), {
+            'group_name': 'Campagne',
+            'csv_file': SimpleUploadedFile('data.csv', b'code,nom,email\n001,Jean,jean@ex.com\n002,Marie,marie@ex.com\n'),
+            'pdf_files': [
+                SimpleUploadedFile('001.pdf', b'%PDF-1.4 identique'),
+                SimpleUploadedFile('002.pdf', b'%PDF-1.4 identique'),
+            ],
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(traiter_imports(), (1, 0))
+        units = SendingUnit.objects.order_by('name')
+        self.assertEqual([unit.file_name for unit in units], ['001.pdf', '002.pdf'])
+        self.assertEqual(len({unit.file.name for unit in units}), 1)
+        self.assertTrue(units[0].file.name.startswith('blobs/'))
+        self.assertFalse((self.media_root / 'pdfs').exists())
+
+    def test_commande_de_migration(self):
+        for dossier, nom in [('pdfs', 'DOC002.pdf'), ('sending_files', 'DOC002_j2QWHa9.pdf'),
+                             ('sending_files', 'DOC003.pdf')]:
+            (self.media_root / dossier).mkdir(exist_ok=True)
+            (self.media_root / dossier / nom).write_bytes(b'%PDF-1.4 ' + nom[:6].encode() * 100)
+        (self.media_root / 'pdfs' / 'orphelin.pdf').write_bytes(b'%PDF-1.4 orphelin')
+
+        group = SendingGroup.objects.create(label='Campagne')
+        for nom in ['pdfs/DOC002.pdf', 'sending_files/DOC002_j2QWHa9.pdf', 'sending_files/DOC003.pdf']:
+            SendingUnit.objects.create(sending_group=group, name=nom, email='a@ex.com', file=nom)
+
+        simulation = io.StringIO()
+        call_command('migrate_to_blobs', '--dry-run', stdout=simulation)
+        self.assertIn("Espace récupérable : 609 octets", simulation.getvalue())
+        self.assertTrue((self.media_root / 'pdfs' / 'DOC002.pdf').exists())
+
+        sortie = io.StringIO()
+        call_command('migrate_to_blobs', '--delete-originals', stdout=sortie)
+
+        self.assertIn("Espace récupéré : 609 octets", sortie.getvalue())
+        fichiers = {unit.name: (unit.file.name, unit.file_name) for unit in SendingUnit.objects.all()}
+        self.assertEqual(fichiers['pdfs/DOC002.pdf'][0], fichiers['sending_files/DOC002_j2QWHa9.pdf'][0])
+        self.assertEqual(fichiers['sending_files/DOC002_j2QWHa9.pdf'][1], 'DOC002_j2QWHa9.pdf')
+        self.assertEqual(len(list((self.media_root / 'blobs').rglob('*.pdf'))), 2)
+        # Un fichier qu'aucune unité ne référençait n'est pas touché
+        self.assertEqual(list((self.media_root / 'pdfs').iterdir()), [self.media_root / 'pdfs' / 'orphelin.pdf'])
+        self.assertEqual(list((self.media_root / 'sending_files').iterdir()), [])
+
+    def test_migration_conserve_les_originaux_par_defaut(self):
+        (self.media_root / 'pdfs').mkdir()
+        (self.media_root / 'pdfs' / '001.pdf').write_bytes(b'%PDF-1.4 original')
+        group = SendingGroup.objects.create(label='Campagne')
+        unit = SendingUnit.objects.create(sending_group=group, name='Jean', email='a@ex.com', file='pdfs/001.pdf')
+
+        sortie = io.StringIO()
+        call_command('migrate_to_blobs', stdout=sortie)
+
+        unit.refresh_from_db()
+        self.assertTrue(unit.file.name.startswith('blobs/'))
+        self.assertTrue((self.media_root / 'pdfs' / '001.pdf').exists())
+        self.assertIn("Anciennes copies conservées", sortie.getvalue())
+
+
+class ImportZipTests(TestCase):
+    """Import des PDF depuis une archive ZIP, sans extraction"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        reglages = override_settings(MEDIA_ROOT=self.media_root)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        admin = User.objects.create_user('admin', password='motdepasse', is_staff=True)
+        self.client.force_login(admin)
+
+    def archive(self, membres, compression=zipfile.ZIP_DEFLATED):
+        tampon = io.BytesIO()
+        with zipfile.ZipFile(tampon, 'w', compression) as archive:
+            for nom, contenu in membres.items():
+                archive.writestr(nom, contenu)
+        return SimpleUploadedFile('pdfs.zip', tampon.getvalue(), content_type='application/zip')
+
+    def creer_groupe(self, archive):
+        response = self.client.post(reverse('create_group'), {
+            'group_name': 'Campagne',
+            'csv_file': SimpleUploadedFile('data.csv', b'code,nom,email\n001,Jean,jean@ex.com\n002,Marie,marie@ex.com\n'),
+            'pdf_archive': archive,
+        })
+        self.assertEqual(response.status_code, 302)
+        traiter_imports()
+        return ImportJob.objects.get()
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_membres_stockes_sans_extraction(self):
+        contenu = b'%PDF-1.4 ' + os.urandom(4096)
+        job = self.creer_groupe(self.archive({
+            'lot/001.pdf': contenu,
+            'lot/002.PDF': b'%PDF-1.4 marie',
+            '__MACOSX/lot/._001.pdf': b'metadonnees',
+            'lisezmoi.txt': b'texte',
+        }))
+
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        self.assertEqual((job.files_total, job.files_stored), (2, 2))
+        units = {unit.name: unit for unit in SendingUnit.objects.all()}
+        self.assertEqual(set(units), {'Jean', 'Marie'})
+        self.assertEqual(units['Jean'].file.read(), contenu)
+        self.assertEqual(units['Marie'].file_name, '002.pdf')
+        fichiers = [p.relative_to(self.media_root).parts[0] for p in self.media_root.rglob('*') if p.is_file()]
+        self.assertEqual(set(fichiers), {'blobs'})
+
+    def test_chemin_remontant_refuse(self):
+        job = self.creer_groupe(self.archive({'../../001.pdf': b'%PDF-1.4'}))
+
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertIn("Chemin interdit", job.error)
+        self.assertFalse(SendingGroup.objects.exists())
+
+    def test_zip_bomb_refusee(self):
+        job = self.creer_groupe(self.archive({'001.pdf': b'\0' * (2 * 1024 * 1024)}))
+
+        self.assertIn("Taux de compression suspect", job.error)
+        self.assertFalse(SendingGroup.objects.exists())
+        self.assertFalse(any(p.is_file() for p in self.media_root.rglob('*.pdf')))
+
+    def test_taille_reelle_superieure_a_l_annonce(self):
+        tampon = io.BytesIO()
+        with zipfile.ZipFile(tampon, 'w', zipfile.ZIP_STORED) as archive:
+            archive.writestr('001.pdf', b'%PDF-1.4 ' + b'x' * 100)
+        donnees = bytearray(tampon.getvalue())
+        # Taille décompressée annoncée de 10 octets, dans l'en-tête local et le répertoire central
+        for signature, position in ((b'PK\x03\x04', 22), (b'PK\x01\x02', 24)):
+            debut = donnees.index(signature)
+            donnees[debut + position:debut + position + 4] = (10).to_bytes(4, 'little')
+
+        with self.assertRaises(ArchiveInvalide):
+            importer_zip(io.BytesIO(bytes(donnees)))
+        self.assertFalse(any(p.is_file() for p in self.media_root.rglob('*.pdf')))
+
+    def test_archive_illisible(self):
+        job = self.creer_groupe(SimpleUploadedFile('pdfs.zip', b'pas un zip'))
+
+        self.assertIn("Archive ZIP illisible", job.error)
+        self.assertFalse((self.media_root / 'imports' / str(job.pk)).exists())
+
+
+class UploadParMorceauxTests(TestCase):
+    """API d'upload reprenable et création de groupe depuis une session"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        reglages = override_settings(MEDIA_ROOT=self.media_root)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        self.admin = User.objects.create_user('admin', password='motdepasse', is_staff=True)
+        self.client.force_login(self.admin)
+
+        tampon = io.BytesIO()
+        with zipfile.ZipFile(tampon, 'w') as archive:
+            archive.writestr('001.pdf', b'%PDF-1.4 ' + os.urandom(3000))
+        self.archive = tampon.getvalue()
+
+    def ouvrir(self, **donnees):
+        response = self.client.post(reverse('upload_sessions_api'),
+                                    {'filename': 'lot.zip', 'size': len(self.archive), **donnees})
+        self.assertEqual(response.status_code, 201)
+        return response['Location']
+
+    def envoyer(self, url, offset, morceau, somme=None):
+        somme = somme if somme is not None else hashlib.sha256(morceau).digest()
+        return self.client.generic('PATCH', url, morceau, content_type='application/offset+octet-stream', headers={
+            'Upload-Offset': str(offset),
+            'Upload-Checksum': 'sha256 ' + base64.b64encode(somme).decode(),
+        })
+
+    def test_reprise_et_creation_du_groupe(self):
+        url = self.ouvrir(sha256=hashlib.sha256(self.archive).hexdigest())
+        moitie = len(self.archive) // 2
+
+        self.assertEqual(self.envoyer(url, 0, self.archive[:moitie])['Upload-Offset'], str(moitie))
+
+        # Morceau corrompu : refusé, le décalage acquitté ne bouge pas
+        corrompu = self.envoyer(url, moitie, self.archive[moitie:], somme=b'\0' * 32)
+        self.assertEqual(corrompu.status_code, 460)
+        self.assertEqual(corrompu['Upload-Offset'], str(moitie))
+
+        # Reprise : le client redemande le décalage, un mauvais décalage est refusé
+        self.assertEqual(self.client.head(url)['Upload-Offset'], str(moitie))
+        self.assertEqual(self.envoyer(url, 0, self.archive[:10]).status_code, 409)
+
+        fin = self.envoyer(url, moitie, self.archive[moitie:])
+        self.assertEqual(fin.json()['status'], 'complete')
+        session = UploadSession.objects.get()
+
+        response = self.client.post(reverse('create_group'), {
+            'group_name': 'Campagne',
+            'csv_file': SimpleUploadedFile('data.csv', b'code,nom,email\n001,Jean,jean@ex.com\n'),
+            'upload_session': str(session.id),
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(traiter_imports(), (1, 0))
+        self.assertEqual(SendingUnit.objects.get().name, 'Jean')
+        session.refresh_from_db()
+        self.assertEqual(session.status, UploadSession.STATUS_CONSUMED)
+        self.assertEqual(list((self.media_root / 'uploads').iterdir()), [])
+
+    def test_empreinte_complete_incorrecte(self):
+        url = self.ouvrir(sha256='0' * 64)
+
+        response = self.envoyer(url, 0, self.archive)
+
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(response['Upload-Offset'], '0')
+        self.assertEqual(UploadSession.objects.get().status, UploadSession.STATUS_OPEN)
+
+    def test_session_privee(self):
+        url = self.ouvrir()
+        autre = User.objects.create_user('autre', password='motdepasse', is_staff=True)
+        self.client.force_login(autre)
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ImportEnArrierePlanTests(TestCase):
+    """Import des campagnes par le worker process_import_jobs"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        reglages = override_settings(MEDIA_ROOT=self.media_root)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        self.admin = User.objects.create_user('admin', password='motdepasse', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def poster(self, csv=b'code,nom,email\n001,Jean,jean@ex.com\n002,Marie,marie@ex.com\n003,Paul,paul@ex.com\n'):
+        return self.client.post(reverse('create_group'), {
+            'group_name': 'Campagne',
+            'csv_file': SimpleUploadedFile('data.csv', csv),
+            'pdf_files': [
+                SimpleUploadedFile('001.pdf', b'%PDF-1.4 jean'),
+                SimpleUploadedFile('002.pdf', b'%PDF-1.4 marie'),
+            ],
+        })
+
+    def test_la_vue_enfile_sans_importer(self):
+        response = self.poster()
+
+        job = ImportJob.objects.get()
+        self.assertRedirects(response, reverse('import_progress', args=[job.pk]))
+        self.assertEqual(job.status, ImportJob.STATUS_PENDING)
+        self.assertFalse(SendingGroup.objects.exists())
+        self.assertTrue((self.media_root / 'imports' / str(job.pk) / 'data.csv').exists())
+
+        statut = self.client.get(reverse('import_status', args=[job.pk])).json()
+        self.assertEqual(statut['status'], 'pending')
+        self.assertFalse(statut['termine'])
+
+    def test_compteurs_de_progression(self):
+        self.poster()
+        call_command('process_import_jobs', '--once', '--threads', '2')
+
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        self.assertEqual((job.files_total, job.files_stored), (2, 2))
+        self.assertEqual((job.rows_parsed, job.rows_matched, job.units_created), (3, 2, 2))
+        self.assertEqual(job.group.sending_units.count(), 2)
+        self.assertIn('stockage', job.report)
+        self.assertGreater(job.report['etapes']['persist'], 0)
+        self.assertFalse((self.media_root / 'imports' / str(job.pk)).exists())
+
+        statut = self.client.get(reverse('import_status', args=[job.pk])).json()
+        self.assertTrue(statut['termine'])
+        self.assertEqual(statut['group_id'], job.group_id)
+        page = self.client.get(reverse('import_progress', args=[job.pk]))
+        self.assertContains(page, reverse('group_detail', args=[job.group_id]))
+
+    def test_aucune_correspondance(self):
+        self.poster(csv=b'code,nom,email\n999,Jean,jean@ex.com\n')
+        self.assertEqual(traiter_imports(), (0, 1))
+
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertIn("Aucune correspondance", job.error)
+        self.assertFalse(SendingGroup.objects.exists())
+
+    def test_job_bloque_remis_en_attente(self):
+        self.poster()
+        ImportJob.objects.update(status=ImportJob.STATUS_RUNNING,
+                                 updated_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(liberer_imports_bloques(), 1)
+        self.assertEqual(traiter_imports(), (1, 0))
+        self.assertEqual(ImportJob.objects.get().attempts, 1)
+
+
+class EnfilementImportConcurrentTests(TransactionTestCase):
+    """Un worker ne peut pas réclamer un job dont les fichiers sont en cours d'écriture"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        reglages = override_settings(MEDIA_ROOT=media.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def reclamer_depuis_un_worker(self):
+        resultat = []
+
+        def reclamer():
+            try:
+                resultat.append(reclamer_import())
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=reclamer)
+        worker.start()
+        worker.join()
+        return resultat[0]
+
+    def test_job_invisible_jusqu_a_ses_sources(self):
+        reclames = []
+        creer = ImportJob.objects.create
+
+        def creer_puis_reclamer(**kwargs):
+            job = creer(**kwargs)
+            # Un worker interroge la file juste après la création du job
+            reclames.append(self.reclamer_depuis_un_worker())
+            return job
+
+        with mock.patch.object(ImportJob.objects, 'create', side_effect=creer_puis_reclamer):
+            job = enfiler_import('Campagne', SimpleUploadedFile('data.csv', b'code,nom,email\n001,Jean,jean@ex.com\n'),
+                                 [SimpleUploadedFile('001.pdf', b'%PDF-1.4 test')])
+
+        self.assertEqual(reclames, [None])
+        reclame = reclamer_import()
+        self.assertEqual(reclame.pk, job.pk)
+        self.assertEqual(reclame.sources['csv'], 'data.csv')
+        self.assertTrue((dossier_travail(job) / 'data.csv').is_file())
+        self.assertTrue((dossier_travail(job) / 'pdfs' / '001.pdf').is_file())
+
+
+class ImportParalleleTests(TestCase):
+    """Import réparti sur un pool de processus : résultat identique au chemin séquentiel"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        reglages = override_settings(MEDIA_ROOT=self.media_root)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def test_correspondances_identiques(self):
+        csv_path = self.media_root / 'data.csv'
+        csv_path.write_text(
+            'code,nom,email\n'
+            '1,Jean,jean@ex.com\n002,Marie,MARIE@ex.com\n3.0,Paul,paul@ex.com\n'
+            '1,Jean,jean@ex.com\n999,Absent,absent@ex.com\n004,,luc@ex.com\n'
+            '002,Marie,marie@ex.com\nA-7,Zoé,zoe@ex.com\n',
+            encoding='utf-8',
+        )
+        fichiers = {'001': '/pdfs/001.pdf', '002': '/pdfs/002.pdf', '3': '/pdfs/3.pdf',
+                    '004': '/pdfs/004.pdf', 'A-7': '/pdfs/A-7.pdf'}
+
+        sequentiel, parallele = {}, {}
+        attendu = list(iter_correspondances(csv_path, fichiers, chunksize=2, statistiques=sequentiel))
+        obtenu = list(iter_correspondances_paralleles(csv_path, fichiers, processus=2, chunksize=2,
+                                                      statistiques=parallele))
+
+        self.assertEqual(obtenu, attendu)
+        self.assertEqual(parallele, sequentiel)
+        self.assertEqual([nom for resultat in obtenu for nom in resultat], ['Jean', 'Marie', 'Paul', 'Luc', 'Zoé'])
+
+    def test_stockage_identique(self):
+        pdfs = []
+        for code in ('001', '002'):
+            chemin = self.media_root / 'source' / f'{code}.pdf'
+            chemin.parent.mkdir(exist_ok=True)
+            chemin.write_bytes(b'%PDF-1.4 ' + code.encode())
+            pdfs.append(chemin)
+        archive = self.media_root / 'source' / 'lot.zip'
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('lot/002.pdf', b'%PDF-1.4 remplace')
+            zf.writestr('lot/003.pdf', b'%PDF-1.4 003')
+
+        lots = []
+        mapping = stocker_pdfs_en_parallele(pdfs, [archive], processus=2, apres_lot=lots.append)
+
+        attendu = {chemin.stem: str(stocker_fichier(chemin).path) for chemin in pdfs}
+        attendu.update(importer_zip(archive))
+        self.assertEqual(mapping, attendu)
+        self.assertEqual(sum(lots), 4)
+        self.assertEqual(Path(mapping['002']).read_bytes(), b'%PDF-1.4 remplace')
+
+    def test_archive_refusee(self):
+        archive = self.media_root / 'lot.zip'
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('../001.pdf', b'%PDF-1.4')
+
+        with self.assertRaises(ArchiveInvalide):
+            stocker_pdfs_en_parallele(archives=[archive], processus=2)
+
+    def test_job_en_mode_parallele(self):
+        admin = User.objects.create_user('admin', password='motdepasse', is_staff=True)
+        self.client.force_login(admin)
+        self.client.post(reverse('create_group'), {
+            'group_name': 'Campagne',
+            'csv_file': SimpleUploadedFile('data.csv', b'code,nom,email\n001,Jean,jean@ex.com\n002,Marie,marie@ex.com\n'),
+            'pdf_files': [SimpleUploadedFile('001.pdf', b'%PDF-1.4 jean'), SimpleUploadedFile('2.pdf', b'%PDF-1.4 marie')],
+        })
+
+        self.assertEqual(traiter_imports(processus=2), (1, 0))
+        job = ImportJob.objects.get()
+        self.assertEqual(job.report['processus'], 2)
+        self.assertEqual((job.files_stored, job.units_created), (2, 2))
+        self.assertEqual(sorted(job.group.sending_units.values_list('file_name', flat=True)), ['001.pdf', '2.pdf'])
+
+
+class InstrumentationImportTests(TestCase):
+    """Journalisation de l'import : synthèse par import, détail échantillonné"""
+
+    def setUp(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        self.dossier = Path(dossier.name)
+        (self.dossier / 'pdfs').mkdir()
+        (self.dossier / 'pdfs' / '001.pdf').write_bytes(b'%PDF-1.4')
+        self.csv = self.dossier / 'data.csv'
+        lignes = ['nom,email,code', 'Jean,jean@ex.com,1'] + [f'N{i},n{i}@ex.com,{100 + i}' for i in range(20)]
+        self.csv.write_text('\n'.join(lignes) + '\n', encoding='utf-8')
+
+    def test_une_synthese_par_import(self):
+        with self.assertLogs('core.import', 'INFO') as journal:
+            resultats = mappe(self.csv, self.dossier / 'pdfs')
+
+        self.assertEqual(len(resultats), 1)
+        self.assertEqual(len(journal.records), 1)
+        synthese = journal.records[0].donnees
+        self.assertEqual(synthese['import'], 'mappe')
+        self.assertEqual(synthese['statut'], 'ok')
+        self.assertEqual(set(synthese['etapes_s']), {'store', 'parse', 'normalize', 'index', 'match', 'persist'})
+        self.assertEqual(synthese['compteurs']['lignes_lues'], 21)
+        self.assertEqual(synthese['compteurs']['correspondances'], 1)
+        self.assertEqual(synthese['compteurs']['sans_fichier'], 20)
+        self.assertEqual(synthese['compteurs']['fichiers_indexes'], 1)
+
+    def test_detail_desactive_par_defaut(self):
+        with self.assertLogs('core', 'DEBUG') as journal:
+            logging.getLogger('core.import.records').setLevel(logging.WARNING)
+            self.addCleanup(logging.getLogger('core.import.records').setLevel, logging.NOTSET)
+            mappe(self.csv, self.dossier / 'pdfs')
+
+        self.assertFalse([r for r in journal.records if r.name == 'core.import.records'])
+
+    @override_settings(IMPORT_RECORD_LOG_SAMPLE=5, IMPORT_RECORD_LOG_MAX=3)
+    def test_detail_echantillonne_et_plafonne(self):
+        with self.assertLogs('core.import.records', 'DEBUG') as journal:
+            with suivre_import('test'):
+                list(iter_correspondances(self.csv, self.dossier / 'pdfs'))
+
+        # Lignes sans fichier n° 1, 6 et 11 : une sur cinq, trois au plus
+        self.assertEqual([r.donnees['rang'] for r in journal.records], [1, 6, 11])
+        self.assertIn("'100'", journal.records[0].getMessage())
+
+    def test_synthese_en_echec(self):
+        with self.assertLogs('core.import', 'INFO') as journal:
+            with self.assertRaises(ValueError):
+                with suivre_import('test', job_id=7):
+                    raise ValueError("boum")
+
+        self.assertEqual(journal.records[0].donnees['statut'], 'echec')
+        self.assertEqual(journal.records[0].donnees['job_id'], 7)
+
+    def test_formatteur_structure(self):
+        record = logging.LogRecord('core.import', logging.INFO, __file__, 1, "Import %s", ('job',), None)
+        record.donnees = {'compteurs': {'correspondances': 2}}
+
+        self.assertEqual(FormatteurStructure('%(message)s').format(record),
+                         'Import job {"compteurs": {"correspondances": 2}}')
+
+
+class MesurePerformanceTests(TestCase):
+    """Middleware de mesure par vue et endpoint Prometheus"""
+
+    def setUp(self):
+        REGISTRE.reinitialiser()
+        self.admin = User.objects.create_user('admin', password='motdepasse', is_staff=True)
+
+    def test_histogramme_cumule(self):
+        histogramme = Histogramme('test_duree', "Durée", ('view',), bornes=(0.1, 1))
+        for valeur in (0.05, 0.1, 0.5, 3):
+            histogramme.observer(valeur, 'home')
+
+        self.assertEqual(list(histogramme.lignes()), [
+            'test_duree_bucket{view="home",le="0.1"} 2',
+            'test_duree_bucket{view="home",le="1"} 3',
+            'test_duree_bucket{view="home",le="+Inf"} 4',
+            'test_duree_sum{view="home"} 3.65',
+            'test_duree_count{view="home"} 4',
+        ])
+
+    def test_mesures_par_vue(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse('dashboard'))
+        self.client.get('/inexistant/')
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        texte = response.content.decode()
+        self.assertIn('# TYPE fastdistrib_http_request_duration_seconds histogram', texte)
+        self.assertIn('fastdistrib_http_requests_total{view="dashboard",method="GET",status="200"} 1', texte)
+        self.assertIn('fastdistrib_http_requests_total{view="<non résolue>",method="GET",status="404"} 1', texte)
+        self.assertIn('fastdistrib_http_request_duration_seconds_bucket{view="dashboard",method="GET",le="+Inf"} 1',
+                      texte)
+        # Requêtes SQL de la vue (session, utilisateur, groupes)
+        self.assertIn('fastdistrib_db_queries_per_request_bucket{view="dashboard",le="0"} 0', texte)
+        self.assertIn('fastdistrib_http_response_bytes_count{view="dashboard"} 1', texte)
+
+    def test_taille_des_exports_en_flux(self):
+        group = SendingGroup.objects.create(label='Campagne')
+        SendingUnit.objects.create(sending_group=group, name='Jean', email='jean@ex.com', file='blobs/a.pdf')
+        self.client.force_login(self.admin)
+
+        response = self.client.get(reverse('export_results', args=[group.id]))
+        taille = len(b''.join(response.streaming_content))
+
+        texte = REGISTRE.exposer()
+        self.assertIn(f'fastdistrib_http_response_bytes_sum{{view="export_results"}} {taille}', texte)
+
+    def test_cumul_des_processus(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        # Annule la publication planifiée par le middleware avant la suppression du dossier
+        self.addCleanup(REGISTRE.reinitialiser)
+        # Un autre worker a publié ses valeurs dans le dossier partagé
+        autre_worker = Registre()
+        autre_worker.compteur('fastdistrib_http_requests_total', "Requêtes HTTP par vue et code de statut",
+                              ('view', 'method', 'status')).incrementer('dashboard', 'GET', '200', n=2)
+        autre_worker.publier(dossier.name)
+        self.client.force_login(self.admin)
+
+        with override_settings(METRICS_MULTIPROC_DIR=dossier.name):
+            self.client.get(reverse('dashboard'))
+            texte = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('fastdistrib_http_requests_total{view="dashboard",method="GET",status="200"} 3', texte)
+        self.assertIn('fastdistrib_http_request_duration_seconds_count{view="dashboard",method="GET"} 1', texte)
+        self.assertEqual(len(list(Path(dossier.name).glob('*.json'))), 2)
+
+    def test_acces_reserve(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics'), headers={
+                'Authorization': 'Bearer faux'}).status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), headers={
+                'Authorization': 'Bearer secret'}).status_code, 200)
+
+    def test_server_timing_et_requetes_lentes(self):
+        with override_settings(PERF_SERVER_TIMING=False):
+            self.assertFalse(self.client.get(reverse('home')).has_header('Server-Timing'))
+
+        with override_settings(PERF_SERVER_TIMING=True, PERF_SLOW_REQUEST_MS=0):
+            with self.assertLogs('core.performance', 'WARNING') as journal:
+                response = self.client.get(reverse('home'))
+
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ SQL"$')
+        self.assertEqual(journal.records[0].donnees['view'], 'home')
+
+
+class SuiteBenchmarksTests(TestCase):
+    """Suite de benchmarks : générateurs, scénarios et comparaison des résultats"""
+
+    def test_formats_csv_lus_par_read_csv_file(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            for format_csv in FORMATS_CSV:
+                chemin = ecrire_csv(Path(dossier) / f'{format_csv}.csv', 50, format_csv)
+                records = read_csv_file(chemin)
+                self.assertEqual(len(records), 50, format_csv)
+                self.assertEqual(records[0]['email'], 'user0@example.com', format_csv)
+
+    def test_suite_a_petite_echelle(self):
+        mesures = []
+        document = executer_suite(echelles=(20,), apres_mesure=lambda cle, mesure: mesures.append(cle))
+
+        self.assertEqual(set(document['resultats']), {f'{nom}[20]' for nom in SCENARIOS})
+        self.assertEqual(mesures, list(document['resultats']))
+        self.assertEqual(document['resultats']['download_file_view[20]']['elements'], 20)
+        self.assertTrue(SendingGroup.objects.filter(label='Benchmark 20').exists())
+
+    def test_comparaison(self):
+        reference = {'resultats': {'mappe[1000]': {'secondes': 1.0}, 'export_results[1000]': {'secondes': 1.0}}}
+        actuel = {'resultats': {'mappe[1000]': {'secondes': 1.5}, 'export_results[1000]': {'secondes': 1.1},
+                                'send_emails[1000]': {'secondes': 2.0}}}
+
+        comparaison = {ligne['cle']: ligne for ligne in comparer_resultats(reference, actuel)}
+
+        self.assertEqual(set(comparaison), {'mappe[1000]', 'export_results[1000]'})
+        self.assertTrue(comparaison['mappe[1000]']['regression'])
+        self.assertFalse(comparaison['export_results[1000]']['regression'])
+
+
+class IndexRequetesTests(TestCase):
+    """Index des recherches fréquentes sur SendingUnit et Link (plans d'exécution)"""
+
+    def setUp(self):
+        self.group = SendingGroup.objects.get(id=peupler_unites(300, taille_groupe=100)[1])
+        self.unit = self.group.sending_units.order_by('id')[50]
+
+    def test_plans_utilisent_les_index(self):
+        # SQLite (EXPLAIN QUERY PLAN) comme PostgreSQL (DATABASE_URL), parcours séquentiel désactivé
+        for nom, (fabrique, index) in REQUETES_INDEXEES.items():
+            with self.subTest(nom):
+                plan = plan_requete(fabrique(self.group, self.unit), forcer_index=True)
+                self.assertTrue(index_utilise(index, plan), plan)
+
+    def test_renvoi_invalide_les_liens_valides(self):
+        User.objects.create_user('admin', password='secret', is_staff=True)
+        self.client.login(username='admin', password='secret')
+        Link.objects.create(sending_unit=self.unit)
+
+        with self.settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            self.client.post(reverse('resend_link', args=[self.unit.id]))
+
+        nouveau = self.unit.links.order_by('-id').first()
+        self.assertEqual(list(self.unit.links.filter(used=False)), [nouveau])
+
+
+class BenchmarksHorsTransactionTests(TransactionTestCase):
+    # Hors transaction : les index sont supprimés puis recréés par le schema editor,
+    # et les requêtes ASGI lisent la base depuis leurs propres threads
+
+    def test_benchmark_index_a_petite_echelle(self):
+        resultat = bench_index_unites(300, taille_groupe=100, repetitions=1)
+
+        self.assertEqual(set(resultat['requetes']), set(REQUETES_INDEXEES))
+        self.assertEqual(resultat['requetes']['detail_groupe']['lignes'], 100)
+        self.assertEqual(SendingUnit.objects.count(), 300)
+        # Index recréés
+        group = SendingGroup.objects.order_by('id').first()
+        fabrique, index = REQUETES_INDEXEES['unites_en_attente']
+        self.assertIn(index, plan_requete(fabrique(group, None), forcer_index=True))
+
+    def test_charge_asgi(self):
+        resultat = bench_telechargements_concurrents(3, taille_pdf=4096, debit=1024 * 1024)
+
+        self.assertEqual(resultat['reussis'], 3)
+        self.assertEqual(resultat['octets'], 3 * 4096)
+        self.assertGreaterEqual(resultat['pic_simultanes'], 1)
+
+
+@override_settings(DOWNLOAD_EVENT_FLUSH_INTERVAL=None)
+class TelechargementAsynchroneTests(TestCase):
+    """Vues de téléchargement asynchrones (ASGI, DOWNLOAD_ASYNC)"""
+
+    CONTENU = b'%PDF-1.4 ' + bytes(range(256)) * 1024
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        reglages = override_settings(MEDIA_ROOT=self.media_root, ROOT_URLCONF=urls_telechargement_async())
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        (self.media_root / 'pdfs').mkdir()
+        (self.media_root / 'pdfs' / '001.pdf').write_bytes(self.CONTENU)
+        group = SendingGroup.objects.create(label='Campagne')
+        self.unit = SendingUnit.objects.create(
+            sending_group=group, name='Jean', email='jean@ex.com', file='pdfs/001.pdf'
+        )
+        self.link = Link.objects.create(sending_unit=self.unit, access_code='123456')
+        self.url = reverse('download_file', args=[self.link.token])
+
+    async def telecharger(self, **entetes):
+        return await self.async_client.post(self.url, {'email': 'Jean@ex.com', 'access_code': '123456'},
+                                            headers=entetes)
+
+    @staticmethod
+    async def lire(response):
+        return b''.join([bloc async for bloc in response.streaming_content])
+
+    @override_settings(FILE_DELIVERY_BACKEND='direct')
+    async def test_fichier_envoye_par_blocs_asynchrones(self):
+        self.assertEqual((await self.async_client.get(self.url)).status_code, 200)
+
+        response = await self.telecharger()
+
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Length'], str(len(self.CONTENU)))
+        self.assertEqual(await self.lire(response), self.CONTENU)
+        await self.link.arefresh_from_db()
+        await self.unit.arefresh_from_db()
+        self.assertTrue(self.link.used)
+        self.assertTrue(self.unit.received)
+        self.assertIsNotNone(self.unit.received_date)
+
+    @override_settings(FILE_DELIVERY_BACKEND='direct')
+    async def test_lien_consomme_une_seule_fois(self):
+        reponses = await asyncio.gather(self.telecharger(), self.telecharger())
+
+        self.assertEqual(sorted(response.status_code for response in reponses), [200, 403])
+
+    @override_settings(FILE_DELIVERY_BACKEND='range')
+    async def test_reprise_asynchrone(self):
+        redirection = await self.telecharger()
+        self.assertEqual(redirection.status_code, 302)
+
+        TAMPON.reinitialiser()
+        partiel = await self.async_client.get(redirection['Location'], headers={'Range': 'bytes=10-19'})
+
+        self.assertEqual(partiel.status_code, 206)
+        self.assertEqual(await self.lire(partiel), self.CONTENU[10:20])
+        # Fin du flux asynchrone : l'événement est en tampon
+        self.assertEqual([(e.status, e.bytes_sent) for e in TAMPON.evenements], [(206, 10)])
+
+    @override_settings(FILE_DELIVERY_BACKEND='direct')
+    async def test_fichier_absent(self):
+        (self.media_root / 'pdfs' / '001.pdf').unlink()
+
+        response = await self.telecharger()
+
+        self.assertEqual(response.status_code, 404)
+
+    async def test_mesures_en_mode_asynchrone(self):
+        REGISTRE.reinitialiser()
+
+        await self.async_client.get(self.url)
+
+        exposition = REGISTRE.exposer()
+        self.assertIn('fastdistrib_http_requests_total{view="download_file",method="GET",status="200"} 1',
+                      exposition)
+        self.assertRegex(exposition, r'fastdistrib_db_queries_per_request_count\{view="download_file"\} 1')
+        self.assertNotIn('fastdistrib_db_queries_per_request_bucket{view="download_file",le="0"} 1', exposition)
+
+
+@override_settings(DOWNLOAD_EVENT_FLUSH_INTERVAL=None)
+class ConsommationLienConcurrenteTests(TransactionTestCase):
+    """Un lien n'est consommé qu'une fois, même par des requêtes simultanées"""
+
+    CLIENTS = 16
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        reglages = override_settings(MEDIA_ROOT=media.name, FILE_DELIVERY_BACKEND='direct')
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        (Path(media.name) / 'pdfs').mkdir()
+        (Path(media.name) / 'pdfs' / '001.pdf').write_bytes(b'%PDF-1.4 contenu')
+        group = SendingGroup.objects.create(label='Campagne')
+        self.unit = SendingUnit.objects.create(
+            sending_group=group, name='Jean', email='jean@ex.com', file='pdfs/001.pdf'
+        )
+        self.link = Link.objects.create(sending_unit=self.unit, access_code='123456')
+
+    def test_un_seul_telechargement_par_lien(self):
+        url = reverse('download_file', args=[self.link.token])
+        depart = threading.Barrier(self.CLIENTS)
+        statuts = []
+
+        def telecharger():
+            client = Client()
+            try:
+                depart.wait()
+                response = client.post(url, {'email': 'jean@ex.com', 'access_code': '123456'})
+                statuts.append(response.status_code)
+                response.close()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=telecharger) for _ in range(self.CLIENTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuts), [200] + [403] * (self.CLIENTS - 1))
+        self.link.refresh_from_db()
+        self.unit.refresh_from_db()
+        self.assertTrue(self.link.used)
+        self.assertIsNotNone(self.link.used_at)
+        self.assertTrue(self.unit.received)
+        self.assertEqual(self.unit.download_count, 1)
+
+
+class JournalTelechargementsTests(TestCase):
+    """Journal des téléchargements (tampon, bulk_create) et compteurs horaires"""
+
+    CONTENU = b'%PDF-1.4 ' + bytes(range(256)) * 4
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        reglages = override_settings(MEDIA_ROOT=media.name, DOWNLOAD_EVENT_FLUSH_INTERVAL=None)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        TAMPON.reinitialiser()
+        self.addCleanup(TAMPON.reinitialiser)
+
+        (Path(media.name) / 'pdfs').mkdir()
+        (Path(media.name) / 'pdfs' / '001.pdf').write_bytes(self.CONTENU)
+        self.group = SendingGroup.objects.create(label='Campagne')
+        self.unit = SendingUnit.objects.create(
+            sending_group=self.group, name='Jean', email='jean@ex.com', file='pdfs/001.pdf'
+        )
+        self.link = Link.objects.create(sending_unit=self.unit, access_code='123456')
+
+    def telecharger(self):
+        return self.client.post(reverse('download_file', args=[self.link.token]),
+                                {'email': 'jean@ex.com', 'access_code': '123456'}, follow=True)
+
+    @override_settings(FILE_DELIVERY_BACKEND='direct')
+    def test_evenement_ecrit_par_lot_apres_l_envoi(self):
+        response = self.telecharger()
+        # Lue jusqu'au bout, la réponse est fermée par le client de test : événement en tampon
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENU)
+
+        self.assertEqual(DownloadEvent.objects.count(), 0)
+        self.assertEqual(len(TAMPON), 1)
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertEqual(vider_tampon(), 1)
+        self.assertEqual(len(requetes), 1)
+
+        evenement = DownloadEvent.objects.get()
+        self.assertEqual((evenement.sending_group_id, evenement.sending_unit_id, evenement.link_id),
+                         (self.group.id, self.unit.id, self.link.id))
+        self.assertEqual(evenement.status, 200)
+        self.assertEqual(evenement.bytes_sent, len(self.CONTENU))
+        self.assertIsNotNone(evenement.duration_ms)
+
+    @override_settings(FILE_DELIVERY_BACKEND='range')
+    def test_reprise_et_envoi_delegue(self):
+        complet = self.telecharger()
+        b''.join(complet.streaming_content)
+        url = complet.redirect_chain[-1][0]
+        partiel = self.client.get(url, headers={'Range': 'bytes=0-99'})
+        b''.join(partiel.streaming_content)
+
+        with override_settings(FILE_DELIVERY_BACKEND='x-accel-redirect'):
+            self.client.get(url)
+        vider_tampon()
+
+        # Reprise complète, plage partielle, puis envoi par nginx (taille et durée inconnues)
+        self.assertEqual(list(DownloadEvent.objects.order_by('id').values_list('status', 'bytes_sent')),
+                         [(200, len(self.CONTENU)), (206, 100), (200, None)])
+        self.assertIsNone(DownloadEvent.objects.order_by('id').last().duration_ms)
+
+    def test_compteurs_horaires(self):
+        heure = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+        autre = SendingGroup.objects.create(label='Autre')
+        autre_unit = SendingUnit.objects.create(sending_group=autre, name='Luc', email='luc@ex.com', file='x.pdf')
+
+        def evenement(unit, decalage, status=200, octets=100, duree=10):
+            return DownloadEvent(sending_group_id=unit.sending_group_id, sending_unit=unit, status=status,
+                                 bytes_sent=octets, duration_ms=duree, created_at=heure + decalage)
+
+        DownloadEvent.objects.bulk_create([
+            evenement(self.unit, timedelta(minutes=5)),
+            evenement(self.unit, timedelta(minutes=50), status=206, octets=40, duree=None),
+            evenement(self.unit, timedelta(hours=2, minutes=1), duree=30),
+            evenement(autre_unit, timedelta(minutes=10)),
+        ])
+
+        self.assertEqual(agreger_evenements(), 3)
+        premiere = DownloadRollup.objects.get(sending_group=self.group, hour=heure)
+        self.assertEqual((premiere.downloads, premiere.resumes, premiere.units), (1, 1, 1))
+        self.assertEqual((premiere.bytes_sent, premiere.duration_ms_total, premiere.duration_count), (140, 10, 1))
+
+        # Événement écrit en retard dans l'heure précédant le dernier compteur : pris en compte
+        DownloadEvent.objects.bulk_create([evenement(self.unit, timedelta(hours=1, minutes=30))])
+        self.assertEqual(agreger_evenements(), 2)
+        call_command('rollup_download_events', '--all', stdout=io.StringIO())
+        self.assertEqual(DownloadRollup.objects.filter(sending_group=self.group).count(), 3)
+        self.assertEqual(sum(DownloadRollup.objects.values_list('downloads', flat=True)), 4)
+
+        User.objects.create_user('admin', password='secret', is_staff=True)
+        self.client.login(username='admin', password='secret')
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('group_detail', args=[self.group.id]))
+
+        self.assertNotIn('core_downloadevent', ' '.join(requete['sql'] for requete in requetes))
+        self.assertEqual(response.context['downloads']['downloads'], 3)
+        self.assertEqual(response.context['downloads']['resumes'], 1)
+        self.assertEqual(response.context['downloads']['duree_moyenne_ms'], 17)
+        self.assertEqual(len(response.context['downloads']['heures']), 3)
+
+
+class EcritureDiffereeTests(TransactionTestCase):
+    # Hors transaction : le tampon est écrit par un thread d'arrière-plan, sur sa propre connexion
+
+    def setUp(self):
+        TAMPON.reinitialiser()
+        self.addCleanup(TAMPON.reinitialiser)
+        group = SendingGroup.objects.create(label='Campagne')
+        self.unit = SendingUnit.objects.create(sending_group=group, name='Jean', email='jean@ex.com', file='x.pdf')
+
+    def attendre_evenements(self, nombre):
+        for _ in range(200):
+            if DownloadEvent.objects.count() >= nombre:
+                break
+            time.sleep(0.01)
+        return DownloadEvent.objects.count()
+
+    def evenement(self):
+        return DownloadEvent(sending_group_id=self.unit.sending_group_id, sending_unit=self.unit, status=200)
+
+    @override_settings(DOWNLOAD_EVENT_FLUSH_INTERVAL=0.05, DOWNLOAD_EVENT_BUFFER_SIZE=1000)
+    def test_ecrit_apres_l_intervalle(self):
+        TAMPON.ajouter(self.evenement())
+        TAMPON.ajouter(self.evenement())
+
+        self.assertEqual(DownloadEvent.objects.count(), 0)
+        self.assertEqual(self.attendre_evenements(2), 2)
+        self.assertEqual(len(TAMPON), 0)
+
+    @override_settings(DOWNLOAD_EVENT_FLUSH_INTERVAL=3600, DOWNLOAD_EVENT_BUFFER_SIZE=3)
+    def test_ecrit_des_que_le_tampon_est_plein(self):
+        for _ in range(3):
+            TAMPON.ajouter(self.evenement())
+
+        self.assertEqual(self.attendre_evenements(3), 3)
+
+
+class CompteursGroupeTests(TestCase):
+    """Compteurs dénormalisés des groupes, tenus à jour à chaque changement d'état des unités"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = Path(media.name)
+        reglages = override_settings(MEDIA_ROOT=self.media_root, FILE_DELIVERY_BACKEND='direct',
+                                     EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                                     DOWNLOAD_EVENT_FLUSH_INTERVAL=None)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        TAMPON.reinitialiser()
+        self.addCleanup(TAMPON.reinitialiser)
+
+        (self.media_root / 'pdfs').mkdir()
+        pdf = self.media_root / 'pdfs' / '001.pdf'
+        pdf.write_bytes(b'%PDF-1.4 test')
+        self.group, _ = creer_groupe_en_masse('Campagne', (
+            {f'Nom {i}': {'email': f'user{i}@ex.com', 'file': str(pdf)}} for i in range(3)
+        ))
+        User.objects.create_user('admin', password='secret', is_staff=True)
+
+    def compteurs(self):
+        self.group.refresh_from_db()
+        return self.group.total_count, self.group.sent_count, self.group.received_count
+
+    def telecharger(self, link):
+        response = self.client.post(reverse('download_file', args=[link.token]),
+                                    {'email': link.sending_unit.email, 'access_code': link.access_code})
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def test_cycle_de_vie(self):
+        units = list(self.group.sending_units.order_by('id'))
+        self.assertEqual(self.compteurs(), (3, 0, 0))
+
+        enfiler_emails(self.group, 'Sujet', '{lien}', lambda url: f'http://test{url}')
+        EmailJob.objects.filter(sending_unit=units[2]).delete()
+        traiter_file()
+        self.assertEqual(self.compteurs(), (3, 2, 0))
+
+        link = units[0].links.get()
+        self.assertEqual(self.telecharger(link), 200)
+        self.assertEqual(self.telecharger(link), 403)
+        self.assertEqual(self.compteurs(), (3, 2, 1))
+
+        # Renvoi : l'unité reçue redevient en attente de réception, l'unité jamais envoyée est envoyée
+        self.client.login(username='admin', password='secret')
+        self.client.post(reverse('resend_link', args=[units[0].id]))
+        self.client.post(reverse('resend_link', args=[units[2].id]))
+        self.assertEqual(self.compteurs(), (3, 3, 0))
+
+        self.assertEqual(self.telecharger(units[0].links.order_by('-id').first()), 200)
+        self.assertEqual(self.compteurs(), (3, 3, 1))
+        self.assertEqual(reconcilier_compteurs(), [])
+
+    def test_detail_sans_agregation(self):
+        self.client.login(username='admin', password='secret')
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('group_detail', args=[self.group.id]))
+
+        self.assertEqual(response.context['total_count'], 3)
+        self.assertFalse([requete for requete in requetes if 'COUNT(' in requete['sql'].upper()])
+
+    def test_reconciliation(self):
+        autre = SendingGroup.objects.create(label='Vide', total_count=4)
+        SendingUnit.objects.filter(sending_group=self.group).update(sending_date=timezone.now())
+
+        sortie = io.StringIO()
+        call_command('reconcile_group_counters', '--dry-run', stdout=sortie)
+        self.assertIn('2 groupe(s)', sortie.getvalue())
+        self.assertEqual(self.compteurs(), (3, 0, 0))
+
+        call_command('reconcile_group_counters', stdout=io.StringIO())
+        self.assertEqual(self.compteurs(), (3, 3, 0))
+        autre.refresh_from_db()
+        self.assertEqual(autre.total_count, 0)
+        self.assertEqual(reconcilier_compteurs(), [])
+
+
+class PageDetailGroupeTests(TestCase):
+    """Page de détail d'un groupe : pagination par clé, recherche et filtre côté serveur"""
+
+    def setUp(self):
+        self.group = SendingGroup.objects.create(label='Campagne')
+        maintenant = timezone.now()
+        units = []
+        for i in range(125):
+            # Homonymes : l'ordre est départagé par l'id
+            units.append(SendingUnit(
+                sending_group=self.group, name=f'Dupont {i // 2:03d}', name_search=f'dupont {i // 2:03d}',
+                email=f'user{i:03d}@ex.com', file='pdfs/001.pdf',
+                sending_date=maintenant if i % 3 else None, received=i % 3 == 2,
+            ))
+        units.append(SendingUnit(sending_group=self.group, name='Martin', name_search='martin',
+                                 email='zoe@ex.com', file='pdfs/002.pdf'))
+        SendingUnit.objects.bulk_create(units)
+        reconcilier_compteurs([self.group.pk])
+        Link.objects.create(sending_unit=units[0], access_code='111111')
+        Link.objects.create(sending_unit=units[0], access_code='222222')
+
+        User.objects.create_user('admin', password='secret', is_staff=True)
+        self.client.login(username='admin', password='secret')
+        self.url = reverse('group_detail', args=[self.group.id])
+
+    def page(self, parametres=''):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(f'{self.url}?{parametres}')
+        self.assertEqual(response.status_code, 200)
+        sql = ' '.join(requete['sql'].upper() for requete in requetes)
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT(', sql)
+        return response, len(requetes)
+
+    def test_parcours_par_cle(self):
+        attendus = list(self.group.sending_units.order_by('name', 'id').values_list('id', flat=True))
+
+        vus, pages, nombres = [], [], set()
+        response, nombre = self.page()
+        while True:
+            pages.append([unit.id for unit in response.context['units']])
+            vus += pages[-1]
+            nombres.add(nombre)
+            if not response.context['page_suivante']:
+                break
+            response, nombre = self.page(response.context['page_suivante'])
+
+        self.assertEqual(vus, attendus)
+        self.assertEqual([len(page) for page in pages], [50, 50, 26])
+        # Nombre de requêtes identique à chaque page, première page comprise (un repère en plus ensuite)
+        self.assertLessEqual(len(nombres), 2)
+
+        precedente, _ = self.page(response.context['page_precedente'])
+        self.assertEqual([unit.id for unit in precedente.context['units']], pages[1])
+        premiere, _ = self.page(precedente.context['page_precedente'])
+        self.assertEqual([unit.id for unit in premiere.context['units']], pages[0])
+        self.assertIsNone(premiere.context['page_precedente'])
+
+        # Dernier code d'accès de chaque unité, sans requête par ligne
+        self.assertEqual(premiere.context['units'][0].latest_access_code, '222222')
+        self.assertEqual(premiere.context['total_count'], 126)
+
+    def test_recherche_et_filtre(self):
+        response, _ = self.page('q=dupont 01')
+        self.assertEqual([unit.name for unit in response.context['units']], ['Dupont 010', 'Dupont 010'] + [
+            f'Dupont {i:03d}' for i in range(11, 20) for _ in range(2)
+        ])
+
+        response, _ = self.page('q=ZOE')
+        self.assertEqual([unit.name for unit in response.context['units']], ['Martin'])
+
+        response, _ = self.page('statut=received&q=dupont')
+        self.assertTrue(response.context['units'])
+        self.assertTrue(all(unit.received for unit in response.context['units']))
+        # Filtres conservés d'une page à l'autre
+        self.assertEqual(response.context['filtres'], 'q=dupont&statut=received')
+
+        response, _ = self.page('statut=pending&q=mar')
+        self.assertEqual([unit.name for unit in response.context['units']], ['Martin'])
+
+        # Envoyés : même périmètre que sent_count, unités reçues comprises
+        response, _ = self.page('statut=sent')
+        units = response.context['units']
+        self.assertTrue(all(unit.sending_date for unit in units))
+        self.assertTrue(any(unit.received for unit in units))
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.sending_units.filter(unit_pages.STATUTS['sent']).count(), self.group.sent_count)
+
+    def test_recherche_insensible_a_la_casse(self):
+        for nom in ['McDonald', 'Jean-Pierre Élie', 'DE LA TOUR']:
+            SendingUnit.objects.create(sending_group=self.group, name=nom, email='x@ex.com', file='pdfs/003.pdf')
+
+        for recherche, attendu in [('mcdonald', 'McDonald'), ('MCD', 'McDonald'), ('jean-pierre é', 'Jean-Pierre Élie'),
+                                   ('JEAN-PIERRE', 'Jean-Pierre Élie'), ('de la t', 'DE LA TOUR')]:
+            with self.subTest(recherche):
+                response, _ = self.page(f'q={recherche}')
+                self.assertEqual([unit.name for unit in response.context['units']], [attendu])
+
+    def test_repere_invalide(self):
+        response, _ = self.page('apres=abc&statut=inconnu')
+
+        self.assertEqual(len(response.context['units']), 50)
+        self.assertEqual(response.context['statut'], '')
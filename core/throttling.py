@@ -0,0 +1,151 @@
+# throttling.py
+"""
+Limitation du débit d'envoi des emails.
+
+Un seau à jetons global et un seau par domaine destinataire (gmail.com,
+outlook.com, ...) bornent le nombre de messages par seconde. Quand un
+serveur répond "réessayez plus tard" (code SMTP 4xx), le débit du domaine
+est divisé par deux puis remonte progressivement au fil des succès.
+"""
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+
+# Plancher de débit après ralentissements successifs (messages/seconde)
+DEBIT_MINIMUM = 0.05
+
+class TokenBucket:
+    """
+    Seau à jetons : `rate` jetons par seconde, au plus `capacity` en réserve.
+
+    Les jetons sont réservés à l'avance (le solde peut devenir négatif) :
+    l'appelant reçoit le temps d'attente avant de pouvoir utiliser le sien.
+    Non thread-safe, protégé par le verrou du RateLimiter.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.nominal_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated_at = clock()
+        self.paused_until = 0.0
+
+    def _remplir(self, maintenant):
+        self.tokens = min(self.capacity, self.tokens + (maintenant - self.updated_at) * self.rate)
+        self.updated_at = maintenant
+
+    def reserver(self):
+        """Réserve un jeton et retourne le délai (secondes) avant de l'utiliser"""
+        maintenant = self.clock()
+        self._remplir(maintenant)
+        self.tokens -= 1
+        attente = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(attente, self.paused_until - maintenant)
+
+    def delai(self):
+        """Délai avant qu'un jeton soit disponible, sans le réserver"""
+        maintenant = self.clock()
+        self._remplir(maintenant)
+        attente = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        return max(attente, self.paused_until - maintenant)
+
+    def ralentir(self, pause=0.0):
+        """Divise le débit par deux et suspend les envois pendant `pause` secondes"""
+        maintenant = self.clock()
+        self._remplir(maintenant)
+        self.rate = max(self.rate / 2, DEBIT_MINIMUM)
+        self.tokens = min(self.tokens, 0.0)
+        self.paused_until = max(self.paused_until, maintenant + pause)
+
+    def accelerer(self):
+        """Remonte le débit d'un dixième du nominal, sans le dépasser"""
+        if self.rate < self.nominal_rate:
+            self._remplir(self.clock())
+            self.rate = min(self.nominal_rate, self.rate + self.nominal_rate / 10)
+
+class RateLimiter:
+    """
+    Limiteur global + par domaine, partagé entre les threads d'envoi.
+
+    `domain_rates` associe un domaine à son débit ; les autres domaines
+    utilisent `default_domain_rate`. Un débit None désactive la limite.
+    """
+
+    def __init__(self, global_rate=None, default_domain_rate=None, domain_rates=None,
+                 retry_pause=30.0, clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.retry_pause = retry_pause
+        self.default_domain_rate = default_domain_rate
+        self.domain_rates = {domaine.lower(): debit for domaine, debit in (domain_rates or {}).items()}
+        self.global_bucket = TokenBucket(global_rate, clock=clock) if global_rate else None
+        self.domain_buckets = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def depuis_reglages(cls):
+        """Construit le limiteur décrit par settings.EMAIL_RATE_LIMITS"""
+        reglages = getattr(settings, 'EMAIL_RATE_LIMITS', {}) or {}
+        return cls(
+            global_rate=reglages.get('global'),
+            default_domain_rate=reglages.get('default_domain'),
+            domain_rates=reglages.get('domains'),
+            retry_pause=reglages.get('retry_pause', 30.0),
+        )
+
+    @staticmethod
+    def domaine(email):
+        return email.rsplit('@', 1)[-1].strip().lower()
+
+    def _bucket_domaine(self, domaine):
+        if domaine not in self.domain_buckets:
+            debit = self.domain_rates.get(domaine, self.default_domain_rate)
+            self.domain_buckets[domaine] = TokenBucket(debit, clock=self.clock) if debit else None
+        return self.domain_buckets[domaine]
+
+    def acquerir(self, email):
+        """Bloque jusqu'à ce qu'un message vers `email` puisse partir"""
+        with self._lock:
+            attente = 0.0
+            for bucket in (self.global_bucket, self._bucket_domaine(self.domaine(email))):
+                if bucket is not None:
+                    attente = max(attente, bucket.reserver())
+        if attente > 0:
+            self.sleep(attente)
+        return attente
+
+    def attente_domaine(self, email):
+        """Attente imposée par le seul domaine de `email` (sans réserver de jeton)"""
+        with self._lock:
+            bucket = self._bucket_domaine(self.domaine(email))
+            return bucket.delai() if bucket is not None else 0.0
+
+    def signaler_refus(self, email):
+        """Le serveur a demandé de réessayer plus tard : ralentir ce domaine"""
+        with self._lock:
+            bucket = self._bucket_domaine(self.domaine(email))
+            if bucket is not None:
+                bucket.ralentir(self.retry_pause)
+            elif self.global_bucket is not None:
+                self.global_bucket.ralentir(self.retry_pause)
+
+    def signaler_succes(self, email):
+        with self._lock:
+            bucket = self._bucket_domaine(self.domaine(email))
+            if bucket is not None:
+                bucket.accelerer()
+            if self.global_bucket is not None:
+                self.global_bucket.accelerer()
+
+def est_refus_temporaire(erreur):
+    """Vrai si l'erreur SMTP est une réponse 4xx ("réessayez plus tard")"""
+    if isinstance(erreur, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in erreur.recipients.values()]
+        return bool(codes) and all(400 <= code < 500 for code in codes)
+    if isinstance(erreur, smtplib.SMTPResponseException):
+        return 400 <= erreur.smtp_code < 500
+    return False
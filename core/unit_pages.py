@@ -0,0 +1,88 @@
+# unit_pages.py
+"""
+Liste des unités d'un groupe (page de détail), pour des groupes de
+plusieurs centaines de milliers d'unités.
+
+Pagination par clé (keyset) sur (name, id) : une page est lue dans l'index
+unit_group_name_id_idx à partir de la dernière unité de la page précédente
+(ou, en arrière, de la première de la page suivante), sans OFFSET ni COUNT.
+Le coût d'une page ne dépend ni de sa profondeur ni de la taille du groupe.
+
+Recherche par préfixe du nom ou de l'email, insensible à la casse, servie
+par les index unit_group_name_search_idx et unit_group_email_prefix_idx :
+les emails sont stockés en minuscules, et le nom l'est dans name_search.
+"""
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import Link, SendingUnit
+
+# Unités par page
+TAILLE_PAGE = 50
+
+# Filtres par statut, mêmes définitions que les compteurs du groupe (voir compter_unites) :
+# une unité reçue compte aussi parmi les envoyées
+STATUTS = {
+    'received': Q(received=True),
+    'sent': Q(sending_date__isnull=False),
+    'pending': Q(sending_date__isnull=True),
+}
+
+def filtre_recherche(recherche):
+    """Préfixe du nom ou de l'email, sans tenir compte de la casse"""
+    return (Q(name_search__startswith=SendingUnit.forme_recherche(recherche))
+            | Q(email__startswith=recherche.lower()))
+
+def unites_filtrees(group, recherche='', statut=''):
+    units = group.sending_units.all()
+    if statut in STATUTS:
+        units = units.filter(STATUTS[statut])
+    recherche = recherche.strip()
+    if recherche:
+        units = units.filter(filtre_recherche(recherche))
+    return units
+
+def apres_repere(units, nom, pk):
+    """Unités situées après (nom, pk) dans l'ordre (name, id)"""
+    # name >= nom, redondant, borne le parcours d'index
+    return units.filter(Q(name__gt=nom) | Q(name=nom, id__gt=pk), name__gte=nom)
+
+def avant_repere(units, nom, pk):
+    """Unités situées avant (nom, pk) dans l'ordre (name, id)"""
+    return units.filter(Q(name__lt=nom) | Q(name=nom, id__lt=pk), name__lte=nom)
+
+def page_unites(group, recherche='', statut='', apres=None, avant=None, taille=TAILLE_PAGE):
+    """
+    Page d'unités du groupe triées par (name, id) : celles qui suivent
+    l'unité d'id `apres`, celles qui précèdent l'unité d'id `avant`, ou la
+    première page. Chaque unité porte son dernier code d'accès
+    (latest_access_code).
+
+    Retourne {'unites': [...], 'suivant': id ou None, 'precedent': id ou None},
+    `suivant` et `precedent` étant les repères des pages voisines.
+    """
+    dernier_code = Link.objects.filter(sending_unit=OuterRef('pk')).order_by('-id').values('access_code')[:1]
+    units = unites_filtrees(group, recherche, statut).annotate(latest_access_code=Subquery(dernier_code))
+
+    repere_id = avant if avant is not None else apres
+    repere = None
+    if repere_id is not None:
+        repere = group.sending_units.filter(pk=repere_id).values_list('name', 'id').first()
+
+    if repere is not None and avant is not None:
+        lignes = list(avant_repere(units, *repere).order_by('-name', '-id')[:taille + 1])
+        a_precedent, a_suivant = len(lignes) > taille, True
+        lignes = lignes[:taille][::-1]
+    elif repere is not None:
+        lignes = list(apres_repere(units, *repere).order_by('name', 'id')[:taille + 1])
+        a_precedent, a_suivant = True, len(lignes) > taille
+        lignes = lignes[:taille]
+    else:
+        lignes = list(units.order_by('name', 'id')[:taille + 1])
+        a_precedent, a_suivant = False, len(lignes) > taille
+        lignes = lignes[:taille]
+
+    return {
+        'unites': lignes,
+        'suivant': lignes[-1].pk if a_suivant and lignes else None,
+        'precedent': lignes[0].pk if a_precedent and lignes else None,
+    }
@@ -0,0 +1,206 @@
+# upload_sessions.py
+"""
+Uploads reprenables, découpés en morceaux (dans l'esprit de tus / S3 multipart).
+
+1. Le client ouvre une session (nom, taille totale, empreinte SHA-256 optionnelle).
+2. Il envoie les morceaux dans l'ordre, chacun avec son décalage (Upload-Offset)
+   et sa somme de contrôle (Upload-Checksum: sha256 <base64>). Un morceau
+   n'est acquitté qu'une fois écrit et vérifié.
+3. Après une coupure, il demande le décalage acquitté et reprend de là.
+4. Au dernier octet, le fichier est assemblé sous MEDIA_ROOT/uploads/ et peut
+   être référencé par create_group à la place de request.FILES.
+
+Les morceaux sont lus par blocs depuis la requête : la mémoire utilisée ne
+dépend pas de leur taille.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadSession
+
+TAILLE_BLOC = 64 * 1024
+
+class ErreurUpload(Exception):
+    """Erreur de protocole ; `status` est le code HTTP à renvoyer"""
+    status = 400
+
+    def __init__(self, message, session=None):
+        super().__init__(message)
+        self.session = session
+
+class DecalageInvalide(ErreurUpload):
+    status = 409
+
+class SommeDeControleInvalide(ErreurUpload):
+    # Code utilisé par tus pour « Checksum Mismatch »
+    status = 460
+
+class SessionFermee(ErreurUpload):
+    status = 410
+
+def _reglage(nom, defaut):
+    return getattr(settings, nom, defaut)
+
+def chemin_partiel(session):
+    return Path(settings.MEDIA_ROOT) / 'uploads' / f"{session.id}.part"
+
+def chemin_assemble(session):
+    """Fichier complet ; l'extension d'origine est conservée (.zip, .pdf)"""
+    extension = Path(session.filename).suffix.lower()
+    return Path(settings.MEDIA_ROOT) / 'uploads' / f"{session.id}{extension}"
+
+def ouvrir_session(filename, size, sha256='', user=None):
+    """Crée une session et son fichier partiel vide"""
+    filename = Path(str(filename)).name
+    if not filename:
+        raise ErreurUpload("Nom de fichier manquant")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise ErreurUpload("Taille invalide") from None
+    if size <= 0 or size > _reglage('UPLOAD_SESSION_MAX_SIZE', 20 * 1024 ** 3):
+        raise ErreurUpload("Taille invalide")
+    sha256 = (sha256 or '').strip().lower()
+    if sha256 and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256)):
+        raise ErreurUpload("Empreinte SHA-256 invalide")
+
+    session = UploadSession.objects.create(
+        filename=filename, size=size, sha256=sha256,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    chemin = chemin_partiel(session)
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    chemin.touch()
+    return session
+
+def _lire_somme_de_controle(entete):
+    """Décode « sha256 <base64> » (en-tête Upload-Checksum de tus)"""
+    if not entete:
+        return None
+    algorithme, _, valeur = entete.strip().partition(' ')
+    if algorithme.lower() != 'sha256':
+        raise ErreurUpload("Algorithme de somme de contrôle non pris en charge")
+    try:
+        return base64.b64decode(valeur.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        raise ErreurUpload("Somme de contrôle illisible") from None
+
+def ecrire_morceau(session_id, offset, flux, longueur, somme_de_controle=None):
+    """
+    Ajoute un morceau à la session et retourne la session mise à jour.
+
+    `flux` est lu par blocs jusqu'à `longueur` octets. Le morceau n'est
+    acquitté (offset avancé) que si la somme de contrôle est correcte ; sinon
+    le fichier partiel est tronqué à son état précédent.
+    """
+    attendu = _lire_somme_de_controle(somme_de_controle)
+    taille_max = _reglage('UPLOAD_CHUNK_MAX_SIZE', 16 * 1024 * 1024)
+
+    with transaction.atomic():
+        # Verrou : deux envois concurrents du même morceau ne s'entrelacent pas
+        session = UploadSession.objects.select_for_update().get(pk=session_id)
+        if not session.is_open:
+            raise SessionFermee("Session terminée", session)
+        if offset != session.offset:
+            raise DecalageInvalide("Décalage inattendu", session)
+        if longueur <= 0 or longueur > taille_max or session.offset + longueur > session.size:
+            raise ErreurUpload("Taille de morceau invalide", session)
+
+        empreinte = hashlib.sha256()
+        recus = 0
+        with open(chemin_partiel(session), 'r+b') as f:
+            f.seek(session.offset)
+            while recus < longueur:
+                bloc = flux.read(min(TAILLE_BLOC, longueur - recus))
+                if not bloc:
+                    break
+                empreinte.update(bloc)
+                f.write(bloc)
+                recus += len(bloc)
+
+            if recus != longueur or (attendu is not None and empreinte.digest() != attendu):
+                f.truncate(session.offset)
+                if recus != longueur:
+                    raise ErreurUpload("Morceau incomplet", session)
+                raise SommeDeControleInvalide("Somme de contrôle incorrecte", session)
+            f.flush()
+            os.fsync(f.fileno())
+
+        session.offset += recus
+        assemble = True
+        if session.offset == session.size:
+            assemble = _assembler(session)
+        session.save()
+
+    if not assemble:
+        raise SommeDeControleInvalide("Empreinte du fichier complet incorrecte", session)
+    return session
+
+def _assembler(session):
+    """
+    Vérifie l'empreinte du fichier complet et le met à sa place définitive.
+
+    Retourne False si l'empreinte ne correspond pas : le fichier est alors
+    vidé et la session repart de zéro.
+    """
+    partiel = chemin_partiel(session)
+    if session.sha256:
+        empreinte = hashlib.sha256()
+        with open(partiel, 'rb') as f:
+            while bloc := f.read(TAILLE_BLOC):
+                empreinte.update(bloc)
+        if empreinte.hexdigest() != session.sha256:
+            with open(partiel, 'r+b') as f:
+                f.truncate(0)
+            session.offset = 0
+            return False
+
+    os.replace(partiel, chemin_assemble(session))
+    session.status = UploadSession.STATUS_COMPLETE
+    session.completed_at = timezone.now()
+    return True
+
+def annuler_session(session):
+    for chemin in (chemin_partiel(session), chemin_assemble(session)):
+        if chemin.exists():
+            chemin.unlink()
+    session.delete()
+
+def sessions_terminees(ids, user=None):
+    """Sessions complètes référencées par create_group (ids invalides ignorés)"""
+    valides = []
+    for identifiant in ids:
+        try:
+            valides.append(uuid.UUID(str(identifiant)))
+        except ValueError:
+            continue
+    sessions = UploadSession.objects.filter(pk__in=valides, status=UploadSession.STATUS_COMPLETE)
+    if user is not None and not user.is_superuser:
+        sessions = sessions.filter(created_by=user)
+    return list(sessions)
+
+def marquer_utilisee(session):
+    """Une fois ses PDF importés, le fichier assemblé n'est plus nécessaire"""
+    chemin = chemin_assemble(session)
+    if chemin.exists():
+        chemin.unlink()
+    session.status = UploadSession.STATUS_CONSUMED
+    session.save(update_fields=['status', 'updated_at'])
+
+def etat(session):
+    return {
+        'id': str(session.id),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.offset,
+        'status': session.status,
+        'chunk_size': _reglage('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024),
+    }
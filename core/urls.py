@@ -3,20 +3,44 @@ from django.contrib.auth import views as auth_views
 from . import views
 
 from django.urls import path
+from django.conf import settings
 from . import views
 
+def download_urls(asynchrone=None):
+    """
+    Routes du téléchargement. Sous ASGI (DOWNLOAD_ASYNC), les vues
+    asynchrones : un client lent n'occupe pas de thread pendant l'envoi.
+    """
+    if asynchrone is None:
+        asynchrone = settings.DOWNLOAD_ASYNC
+    if asynchrone:
+        fichier, reprise = views.download_file_async_view, views.download_resume_async_view
+    else:
+        fichier, reprise = views.download_file_view, views.download_resume_view
+    return [
+        path('download/<uuid:token>/', fichier, name='download_file'),
+        path('download/<uuid:token>/fichier/<str:signature>/', reprise, name='download_resume'),
+    ]
+
 urlpatterns = [
         path('', views.home, name='home'),
   
     path('dashboard/', views.admin_dashboard, name='dashboard'),
-    path('download/<uuid:token>/', views.download_file_view, name='download_file'),
+    *download_urls(),
     path('login/', auth_views.LoginView.as_view(template_name='admin/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(next_page='/login/'), name='logout'),
     path('admin/create/', views.create_group, name='create_group'),
+    path('admin/import/<int:job_id>/', views.import_progress, name='import_progress'),
+    path('admin/import/<int:job_id>/status/', views.import_status, name='import_status'),
     path('admin/group/<int:group_id>/', views.group_detail, name='group_detail'),
     path('admin/group/<int:group_id>/send/', views.send_emails, name='send_emails'),
+    path('admin/group/<int:group_id>/send/progress/', views.send_progress, name='send_progress'),
+    path('admin/group/<int:group_id>/send/status/', views.send_status, name='send_status'),
     path('admin/unit/<int:unit_id>/resend/', views.resend_link, name='resend_link'),
     path('admin/group/<int:group_id>/export/', views.export_results, name='export_results'),
+    path('admin/metrics/', views.metrics_view, name='metrics'),
+    path('api/uploads/', views.upload_sessions_api, name='upload_sessions_api'),
+    path('api/uploads/<uuid:session_id>/', views.upload_session_api, name='upload_session_api'),
     path('admin/create_user/', views.create_user_view, name='create_user_view')
 
 ]
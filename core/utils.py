@@ -3,227 +3,444 @@ import pandas as pd
 import numpy as np
 import re
 import os
+import hashlib
 import logging
 from pathlib import Path
 from django.core.files import File
 
+from .file_index import FileIndex
+from .folder_scan import fichiers_par_code, indexer_dossier
+from .instrumentation import chronometrer, compter, detail, etape, suivre_import
+
 logger = logging.getLogger(__name__)
 
 # ==================== FONCTIONS DE LECTURE DE DOSSIER ====================
 
-def lire_dossier(dossier_path):
-    """Lit un dossier et retourne un dictionnaire {code: chemin}"""
+def lire_dossier(dossier_path, recursif=False, threads=None):
+    """
+    Lit un dossier et retourne un dictionnaire {code: chemin}.
+
+    Le dossier est parcouru une seule fois avec os.scandir (voir folder_scan),
+    extensions .pdf sans tenir compte de la casse, et l'index est mis en cache
+    tant que le dossier n'est pas modifié.
+    """
     try:
         dossier_path = Path(dossier_path)
-        print(f"=== Lecture du dossier : {dossier_path} ===")
-        
-        if not dossier_path.exists():
-            print(f"ERREUR: Le dossier {dossier_path} n'existe pas")
-            return {}
-        
-        if not dossier_path.is_dir():
-            print(f"ERREUR: {dossier_path} n'est pas un dossier")
-            return {}
-        
-        fichiers = {}
-        extensions = ['.pdf', '.PDF']  # Prendre en compte les extensions en majuscules/minuscules
-        
-        # Lister tous les fichiers du dossier
-        for extension in extensions:
-            for fichier in dossier_path.glob(f"*{extension}"):
-                code = fichier.stem  # Nom du fichier sans extension
-                code = str(code).strip()
-                
-                print(f"  Trouvé: {fichier.name} -> code: '{code}'")
-                fichiers[code] = str(fichier)
-        
-        print(f"Total fichiers trouvés: {len(fichiers)}")
-        print("Codes disponibles:", list(fichiers.keys()))
+        fichiers = fichiers_par_code(indexer_dossier(dossier_path, recursif=recursif, threads=threads))
+        logger.debug("Dossier %s : %s fichier(s) PDF", dossier_path, len(fichiers))
         return fichiers
-        
-    except Exception as e:
-        print(f"ERREUR dans lire_dossier: {str(e)}")
-        import traceback
-        traceback.print_exc()
+
+    except (FileNotFoundError, NotADirectoryError) as e:
+        logger.error("%s", e)
+        return {}
+    except Exception:
+        logger.exception("Erreur dans lire_dossier (%s)", dossier_path)
         return {}
 
 # ==================== FONCTIONS DE TRAITEMENT CSV ====================
 
-def read_csv_file(file_path):
+# Nombre de lignes lues à la fois en mode streaming
+TAILLE_BLOC_CSV = 50000
+
+def read_csv_file(file_path, chunksize=TAILLE_BLOC_CSV):
     """
     Lit un fichier CSV avec différentes structures et le normalise
     Gère plusieurs formats :
     1. Avec en-tête : nom,email,code
     2. Sans en-tête : 2 colonnes (email, code) ou 3 colonnes
     3. Codes numériques ou textuels
+
+    Retourne la liste complète des enregistrements. Pour les gros fichiers,
+    préférer iter_csv_records qui produit les enregistrements au fil de l'eau.
     """
     try:
-        print(f"=== Lecture du CSV : {file_path} ===")
-        
-        # Détection du format du fichier
-        with open(file_path, 'r', encoding='utf-8') as f:
-            first_line = f.readline().strip()
-            second_line = f.readline() if f.readline() else ""
-            f.seek(0)
-        
-        # Analyse de la première ligne pour déterminer le format
-        first_line_parts = first_line.split(',')
-        
-        # Vérifier si c'est un en-tête
-        has_header = any(col in first_line.lower() for col in ['nom', 'name', 'email', 'mail', 'code', 'id'])
-        
-        # Options de lecture
-        if has_header:
-            print("Format détecté : Avec en-tête")
-            df = pd.read_csv(file_path, dtype=str, keep_default_na=False, encoding='utf-8')
-            
+        with suivre_import('read_csv_file', fichier=str(file_path)):
+            return list(iter_csv_records(file_path, chunksize=chunksize))
+
+    except Exception:
+        logger.exception("Erreur dans read_csv_file (%s)", file_path)
+        return None
+
+def iter_csv_records(file_path, chunksize=TAILLE_BLOC_CSV):
+    """
+    Générateur d'enregistrements {nom, email, code} normalisés.
+
+    Le fichier est lu par blocs de `chunksize` lignes : la mémoire utilisée
+    reste bornée par la taille d'un bloc, quelle que soit la taille du fichier.
+    """
+    for bloc in iter_csv_chunks(file_path, chunksize=chunksize):
+        # Équivalent de bloc.to_dict('records'), sans la conversion cellule par cellule
+        colonnes = list(bloc.columns)
+        for valeurs in zip(*(bloc[col].tolist() for col in colonnes)):
+            yield dict(zip(colonnes, valeurs))
+
+def iter_csv_chunks(file_path, chunksize=TAILLE_BLOC_CSV):
+    """
+    Générateur de DataFrames normalisés, bloc par bloc.
+
+    Chaque bloc passe par clean_and_normalize_data, puis les doublons
+    email+code déjà vus dans les blocs précédents sont retirés. Seule une
+    empreinte de 16 octets par couple est conservée entre les blocs (voir
+    _CouplesVus).
+    """
+    logger.debug("Lecture du CSV %s (blocs de %s lignes)", file_path, chunksize)
+    vus = _CouplesVus()
+    total = 0
+
+    for bloc in chronometrer(_iter_blocs_bruts(file_path, chunksize), 'parse'):
+        compter('lignes_lues', len(bloc))
+        with etape('normalize'):
+            bloc = clean_and_normalize_data(bloc)
+            if bloc.empty:
+                continue
+
+            # Dédoublonnage entre blocs sur email+code
+            nouveaux = vus.nouveaux(bloc['email'].tolist(), bloc['code'].tolist())
+            if not nouveaux.all():
+                bloc = bloc[nouveaux].reset_index(drop=True)
+
+        total += len(bloc)
+        compter('lignes_normalisees', len(bloc))
+        yield bloc
+
+    logger.debug("Enregistrements normalisés : %s", total)
+
+class _CouplesVus:
+    """
+    Couples (email, code) déjà rencontrés, pour le dédoublonnage entre blocs.
+
+    Chaque couple est conservé sous forme d'empreinte blake2b de 16 octets,
+    dans un tableau numpy trié où les empreintes d'un bloc sont insérées en
+    une passe. La mémoire reste de 16 octets par couple distinct (environ
+    16 Mo pour un million de lignes, le double pendant l'insertion d'un bloc),
+    quelle que soit la longueur des emails et des codes. Sur 128 bits, une
+    collision entre deux couples distincts est négligeable (de l'ordre de
+    1e-26 pour un million de couples).
+    """
+
+    def __init__(self):
+        self.empreintes = np.empty(0, dtype='S16')
+
+    @staticmethod
+    def empreinte(email, code):
+        return hashlib.blake2b(f"{email}\x00{code}".encode('utf-8'), digest_size=16).digest()
+
+    def nouveaux(self, emails, codes):
+        """
+        Masque des couples absents des blocs précédents, qui sont ensuite
+        retenus. Les couples d'un même bloc sont supposés distincts (voir
+        _filtrer_et_dedoublonner).
+        """
+        empreintes = np.array([self.empreinte(email, code) for email, code in zip(emails, codes)],
+                              dtype='S16')
+        positions = np.searchsorted(self.empreintes, empreintes)
+        deja_vus = np.zeros(len(empreintes), dtype=bool)
+        dans_tableau = positions < len(self.empreintes)
+        deja_vus[dans_tableau] = self.empreintes[positions[dans_tableau]] == empreintes[dans_tableau]
+
+        nouvelles = np.sort(empreintes[~deja_vus])
+        self.empreintes = np.insert(self.empreintes, np.searchsorted(self.empreintes, nouvelles), nouvelles)
+        return ~deja_vus
+
+def _iter_blocs_bruts(file_path, chunksize):
+    """Détecte le format du fichier et produit des blocs bruts nom/email/code"""
+    # Détection du format du fichier
+    with open(file_path, 'r', encoding='utf-8') as f:
+        first_line = f.readline().strip()
+
+    # Vérifier si c'est un en-tête
+    has_header = any(col in first_line.lower() for col in ['nom', 'name', 'email', 'mail', 'code', 'id'])
+
+    # Options de lecture
+    if has_header:
+        logger.debug("Format détecté : avec en-tête")
+        lecteur = pd.read_csv(file_path, dtype=str, keep_default_na=False, encoding='utf-8',
+                              chunksize=chunksize)
+        renommage = None
+
+        for bloc in lecteur:
             # Normalisation des noms de colonnes
-            df.columns = df.columns.str.strip().str.lower()
-            
-            # Déterminer quel champ correspond à quoi
-            column_mapping = {}
-            
-            for col in df.columns:
-                col_lower = col.strip().lower()
-                if any(keyword in col_lower for keyword in ['nom', 'name', 'prenom', 'first']):
-                    column_mapping['nom'] = col
-                elif any(keyword in col_lower for keyword in ['email', 'mail', 'courriel']):
-                    column_mapping['email'] = col
-                elif any(keyword in col_lower for keyword in ['code', 'id', 'identifiant', 'matricule']):
-                    column_mapping['code'] = col
-                elif 'code' in column_mapping:
-                    # Si on a déjà un code, ne rien faire
-                    pass
-                else:
-                    # Par défaut, assigner aux colonnes manquantes
-                    if 'nom' not in column_mapping:
-                        column_mapping['nom'] = col
-                    elif 'email' not in column_mapping:
-                        column_mapping['email'] = col
-                    elif 'code' not in column_mapping:
-                        column_mapping['code'] = col
-            
-            # Renommer les colonnes
-            df = df.rename(columns={v: k for k, v in column_mapping.items() if k in ['nom', 'email', 'code']})
-            
-        else:
-            print("Format détecté : Sans en-tête")
-            # Lire sans en-tête
-            df = pd.read_csv(file_path, header=None, dtype=str, keep_default_na=False, encoding='utf-8')
-            
+            bloc.columns = bloc.columns.str.strip().str.lower()
+
+            # Le mapping des colonnes est calculé une seule fois, sur le premier bloc
+            if renommage is None:
+                column_mapping = _detecter_colonnes(bloc.columns)
+                renommage = {v: k for k, v in column_mapping.items() if k in ['nom', 'email', 'code']}
+
+            yield bloc.rename(columns=renommage)
+
+    else:
+        logger.debug("Format détecté : sans en-tête")
+        # Lire sans en-tête
+        lecteur = pd.read_csv(file_path, header=None, dtype=str, keep_default_na=False, encoding='utf-8',
+                              chunksize=chunksize)
+
+        for bloc in lecteur:
             # Déterminer le nombre de colonnes
-            num_cols = len(df.columns)
-            print(f"Nombre de colonnes détectées : {num_cols}")
-            
+            num_cols = len(bloc.columns)
+
             if num_cols == 3:
                 # Format : nom, email, code
-                df.columns = ['nom', 'email', 'code']
+                bloc.columns = ['nom', 'email', 'code']
             elif num_cols == 2:
-                # Format : email, code (probablement votre cas)
-                df.columns = ['email', 'code']
+                # Format : email, code
+                bloc.columns = ['email', 'code']
                 # Créer un nom à partir de l'email
-                df['nom'] = df['email'].apply(lambda x: x.split('@')[0] if '@' in str(x) else x)
+                bloc['nom'] = bloc['email'].str.split('@', n=1).str[0]
             elif num_cols == 1:
                 # Une seule colonne - essayer de parser différemment
-                print("Format à une seule colonne détecté - tentative de parsing...")
-                df = parse_single_column_csv(file_path)
+                logger.debug("Format à une seule colonne détecté")
+                lecteur.close()
+                yield from iter_single_column_csv(file_path, chunksize)
+                return
             else:
                 # Prendre les 3 premières colonnes
-                df = df.iloc[:, :3]
-                df.columns = ['nom', 'email', 'code']
-        
-        print(f"DataFrame initial - Shape: {df.shape}")
-        print(f"Colonnes: {df.columns.tolist()}")
-        print(f"Premières lignes:\n{df.head()}")
-        
-        # Nettoyage et normalisation des données
-        df = clean_and_normalize_data(df)
-        
-        # Conversion finale en liste de dictionnaires
-        result = df.to_dict('records')
-        
-        print(f"=== Résultat final : {len(result)} enregistrements ===")
-        for i, item in enumerate(result):
-            print(f"{i+1}. {item}")
-        
-        return result
-        
-    except Exception as e:
-        print(f"ERREUR dans read_csv_file: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return None
+                bloc = bloc.iloc[:, :3]
+                bloc.columns = ['nom', 'email', 'code']
+
+            yield bloc
+
+def _detecter_colonnes(colonnes):
+    """Détermine quel champ (nom, email, code) correspond à quelle colonne"""
+    column_mapping = {}
+
+    for col in colonnes:
+        col_lower = col.strip().lower()
+        if any(keyword in col_lower for keyword in ['nom', 'name', 'prenom', 'first']):
+            column_mapping['nom'] = col
+        elif any(keyword in col_lower for keyword in ['email', 'mail', 'courriel']):
+            column_mapping['email'] = col
+        elif any(keyword in col_lower for keyword in ['code', 'id', 'identifiant', 'matricule']):
+            column_mapping['code'] = col
+        elif 'code' in column_mapping:
+            # Si on a déjà un code, ne rien faire
+            pass
+        else:
+            # Par défaut, assigner aux colonnes manquantes
+            if 'nom' not in column_mapping:
+                column_mapping['nom'] = col
+            elif 'email' not in column_mapping:
+                column_mapping['email'] = col
+            elif 'code' not in column_mapping:
+                column_mapping['code'] = col
+
+    return column_mapping
 
 def parse_single_column_csv(file_path):
     """Parse un CSV avec une seule colonne contenant des données combinées"""
+    blocs = list(iter_single_column_csv(file_path))
+    if not blocs:
+        return pd.DataFrame(columns=['nom', 'email', 'code'])
+    return pd.concat(blocs, ignore_index=True)
+
+def iter_single_column_csv(file_path, chunksize=TAILLE_BLOC_CSV):
+    """Version par blocs de parse_single_column_csv"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = [line.strip() for line in f if line.strip()]
-        
         data = []
-        for line in lines:
-            # Essayer différents séparateurs
-            if ';' in line:
-                parts = line.split(';')
-            elif ',' in line:
-                parts = line.split(',')
-            elif '\t' in line:
-                parts = line.split('\t')
-            else:
-                parts = [line]
-            
-            # Nettoyer les parties
-            parts = [p.strip() for p in parts if p.strip()]
-            
-            if len(parts) >= 3:
-                data.append(parts[:3])
-            elif len(parts) == 2:
-                # Ajouter un nom par défaut
-                data.append([parts[0].split('@')[0] if '@' in parts[0] else parts[0]] + parts)
-            else:
-                # Une seule partie - utiliser comme email
-                email = parts[0] if parts else ""
-                data.append([email.split('@')[0] if '@' in email else email, email, ""])
-        
-        return pd.DataFrame(data, columns=['nom', 'email', 'code'])
-    except Exception as e:
-        print(f"Erreur dans parse_single_column_csv: {e}")
-        return pd.DataFrame(columns=['nom', 'email', 'code'])
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+
+                data.append(_parser_ligne_combinee(line))
+                if len(data) >= chunksize:
+                    yield pd.DataFrame(data, columns=['nom', 'email', 'code'])
+                    data = []
+
+        if data:
+            yield pd.DataFrame(data, columns=['nom', 'email', 'code'])
+    except Exception:
+        logger.exception("Erreur dans parse_single_column_csv (%s)", file_path)
+
+def _parser_ligne_combinee(line):
+    """Découpe une ligne combinée en [nom, email, code]"""
+    # Essayer différents séparateurs
+    if ';' in line:
+        parts = line.split(';')
+    elif ',' in line:
+        parts = line.split(',')
+    elif '\t' in line:
+        parts = line.split('\t')
+    else:
+        parts = [line]
+
+    # Nettoyer les parties
+    parts = [p.strip() for p in parts if p.strip()]
+
+    if len(parts) >= 3:
+        return parts[:3]
+    elif len(parts) == 2:
+        # Ajouter un nom par défaut
+        return [parts[0].split('@')[0] if '@' in parts[0] else parts[0]] + parts
+    else:
+        # Une seule partie - utiliser comme email
+        email = parts[0] if parts else ""
+        return [email.split('@')[0] if '@' in email else email, email, ""]
 
 def clean_and_normalize_data(df):
-    """Nettoie et normalise les données du DataFrame"""
-    
+    """
+    Nettoie et normalise les données du DataFrame (version vectorisée).
+
+    Produit exactement le même résultat que clean_and_normalize_data_rowwise,
+    mais en s'appuyant sur les opérations .str de pandas et des masques NumPy
+    au lieu d'appels Series.apply / DataFrame.apply ligne par ligne.
+    """
+    df = _preparer_colonnes(df)
+
+    df['email'] = clean_email_series(df['email'])
+    df['nom'] = clean_name_series(df['nom'], df['email'])
+    df['code'] = clean_code_series(df['code'])
+
+    return _filtrer_et_dedoublonner(df)
+
+def clean_and_normalize_data_rowwise(df):
+    """
+    Version ligne par ligne de clean_and_normalize_data.
+
+    Conservée comme implémentation de référence pour les tests de parité
+    et les benchmarks.
+    """
+    df = _preparer_colonnes(df)
+
+    # Traitement spécial pour les emails
+    df['email'] = df['email'].apply(lambda x: clean_email(x))
+
+    # Traitement spécial pour les noms
+    df['nom'] = df.apply(lambda row: clean_name(row['nom'], row['email']), axis=1)
+
+    # Traitement spécial pour les codes
+    df['code'] = df['code'].apply(clean_code)
+
+    return _filtrer_et_dedoublonner(df)
+
+def _preparer_colonnes(df):
+    """Ajoute les colonnes manquantes et convertit tout en chaînes nettoyées"""
+    df = df.copy()
+
     # S'assurer que toutes les colonnes existent
     for col in ['nom', 'email', 'code']:
         if col not in df.columns:
             df[col] = ''
-    
+
     # Conversion en string et nettoyage
     df = df.fillna('')
-    
+
     for col in df.columns:
         df[col] = df[col].astype(str).str.strip()
-    
-    # Traitement spécial pour les emails
-    df['email'] = df['email'].apply(lambda x: clean_email(x))
-    
-    # Traitement spécial pour les noms
-    df['nom'] = df.apply(lambda row: clean_name(row['nom'], row['email']), axis=1)
-    
-    # Traitement spécial pour les codes
-    df['code'] = df['code'].apply(clean_code)
-    
+
+    return df
+
+def _filtrer_et_dedoublonner(df):
+    """Supprime les lignes incomplètes et les doublons email+code"""
     # Supprimer les lignes où email ou code est vide
     df = df[(df['email'] != '') & (df['code'] != '')]
-    
+
     # Supprimer les doublons basés sur email+code
     df = df.drop_duplicates(subset=['email', 'code'])
-    
+
     # Réinitialiser l'index
     df = df.reset_index(drop=True)
-    
+
     return df
 
+# ==================== NORMALISATION VECTORISÉE ====================
+
+def clean_email_series(emails):
+    """Équivalent vectorisé de clean_email pour une Series de chaînes"""
+    emails = emails.astype(str).str.strip().str.lower()
+
+    # Si l'email contient des espaces, prendre la dernière partie qui ressemble à un email
+    avec_espaces = emails.str.contains(' ', regex=False).to_numpy(dtype=bool)
+    if avec_espaces.any():
+        parties = emails[avec_espaces].str.split().explode()
+        candidates = parties[
+            parties.str.contains('@', regex=False) & parties.str.contains('.', regex=False)
+        ]
+        derniere = candidates.groupby(level=0, sort=False).last()
+        emails = emails.copy()
+        emails.loc[derniere.index] = derniere
+
+    # Validation basique d'email
+    valides = emails.str.contains('@', regex=False).to_numpy(dtype=bool)
+    valides[valides] = emails[valides].str.contains('.', regex=False).to_numpy(dtype=bool)
+    invalides = emails[~valides & (emails != '').to_numpy(dtype=bool)]
+    if len(invalides):
+        compter('emails_invalides', len(invalides))
+        for email in invalides.tolist():
+            detail('email_invalide', "Email potentiellement invalide : %s", email)
+
+    return emails
+
+def clean_name_series(noms, emails):
+    """
+    Équivalent vectorisé de clean_name pour deux Series alignées.
+
+    Les noms doivent déjà être des chaînes sans espaces en bordure,
+    comme après la préparation faite par clean_and_normalize_data.
+    """
+    resultat = noms.to_numpy(dtype=object, copy=True)
+
+    # Noms vides ou valeurs "nulles" textuelles (au plus 4 caractères)
+    courts = (noms.str.len() <= 4).to_numpy(dtype=bool)
+    nom_vide = np.zeros(len(noms), dtype=bool)
+    nom_vide[courts] = noms[courts].str.lower().isin(['nan', 'null', 'none', '']).to_numpy(dtype=bool)
+
+    if nom_vide.any():
+        emails_vides = emails[nom_vide]
+        avec_arobase = emails_vides.str.contains('@', regex=False).to_numpy(dtype=bool)
+        remplacement = np.full(len(emails_vides), 'Utilisateur', dtype=object)
+        remplacement[avec_arobase] = (
+            emails_vides[avec_arobase].str.split('@', n=1).str[0].str.capitalize().to_numpy(dtype=object)
+        )
+        resultat[nom_vide] = remplacement
+
+    # Si le nom ressemble à un email, extraire le nom d'utilisateur
+    nom_est_email = ~nom_vide
+    nom_est_email[nom_est_email] = noms[nom_est_email].str.contains('@', regex=False).to_numpy(dtype=bool)
+    nom_est_email[nom_est_email] = noms[nom_est_email].str.contains('.', regex=False).to_numpy(dtype=bool)
+    if nom_est_email.any():
+        resultat[nom_est_email] = (
+            noms[nom_est_email].str.split('@', n=1).str[0].str.capitalize().to_numpy(dtype=object)
+        )
+
+    return pd.Series(resultat, index=noms.index, dtype=object)
+
+def clean_code_series(codes):
+    """
+    Équivalent vectorisé de clean_code pour une Series de chaînes.
+
+    Les codes doivent déjà être des chaînes sans espaces en bordure,
+    comme après la préparation faite par clean_and_normalize_data.
+    """
+    resultat = codes.copy()
+
+    # Codes numériques (1, 2, 001, 1.0, etc.)
+    numeriques = codes.str.replace('.', '', regex=False).str.isdigit().to_numpy(dtype=bool)
+    if not numeriques.any():
+        return resultat
+
+    # Seuls les nombres ASCII avec au plus un point sont convertis en masse :
+    # NumPy les analyse comme float(), ce qui garantit un arrondi identique
+    simples = numeriques.copy()
+    simples[simples] = codes[simples].str.fullmatch(r'[0-9]*\.?[0-9]*').to_numpy(dtype=bool)
+    entiers = np.trunc(codes[simples].to_numpy(dtype=str).astype(np.float64))
+
+    # Cas courant : entiers représentables en int64, formatés sur 3 chiffres
+    convertibles = entiers < 2 ** 63
+    index_simples = codes.index[simples]
+    if convertibles.any():
+        formates = pd.Series(entiers[convertibles].astype(np.int64)).astype(str).str.zfill(3)
+        resultat.loc[index_simples[convertibles]] = formates.to_numpy()
+
+    # Cas rares (chiffres Unicode, plusieurs points, très grands nombres) :
+    # on délègue à clean_code pour garantir un résultat identique
+    restants = codes.index[numeriques].difference(index_simples[convertibles], sort=False)
+    if len(restants):
+        resultat.loc[restants] = [clean_code(code) for code in codes.loc[restants]]
+
+    return resultat
+
 def clean_email(email):
     """Nettoie une adresse email"""
     if not email or pd.isna(email):
@@ -241,7 +458,8 @@ def clean_email(email):
     
     # Validation basique d'email
     if '@' not in email or '.' not in email:
-        print(f"AVERTISSEMENT: Email potentiellement invalide: {email}")
+        compter('emails_invalides')
+        detail('email_invalide', "Email potentiellement invalide : %s", email)
     
     return email
 
@@ -288,87 +506,102 @@ def clean_code(code):
 def mappe(file_path, dossier_pdf):
     """Fonction principale qui mappe les fichiers aux destinataires"""
     try:
-        print("=== DÉBUT mappe ===")
-        
-        # Lire les données CSV
-        data_frame = read_csv_file(file_path)
-        
-        if not data_frame:
-            print("ERREUR: Aucune donnée chargée du CSV")
-            return []
-        
-        print(f"Données chargées: {len(data_frame)} enregistrements")
-        
-        # Lire les fichiers PDF
-        fichiers = lire_dossier(dossier_pdf)
-        if not fichiers:
-            print("AVERTISSEMENT: Aucun fichier PDF trouvé")
-            return []
-        
-        print(f"Fichiers PDF trouvés: {len(fichiers)}")
-        print("Codes PDF disponibles:", list(fichiers.keys())[:10])
-        
-        # Faire la correspondance
-        resultats = []
-        correspondances_trouvees = 0
-        
-        for record in data_frame:
-            code = record.get('code', '')
-            nom = record.get('nom', '')
-            email = record.get('email', '')
-            
-            if not code or not email:
-                print(f"AVERTISSEMENT: Ligne ignorée - code ou email manquant: {record}")
-                continue
-            
-            # Chercher le fichier correspondant
-            fichier_trouve = None
-            
-            # Essayer plusieurs formats de correspondance
-            formats_a_essayer = [
-                code,                    # Format exact
-                code.lstrip('0'),        # Sans les zéros de début
-                code.zfill(3),           # Avec 3 chiffres
-                str(code).split('.')[0]  # Sans décimale
-            ]
-            
-            # Également essayer avec différentes extensions
-            for format_code in formats_a_essayer:
-                if format_code in fichiers:
-                    fichier_trouve = fichiers[format_code]
-                    break
-            
-            if fichier_trouve:
-                correspondances_trouvees += 1
-                resultat = {
-                    nom: {
-                        "email": email,
-                        "file": fichier_trouve
-                    }
-                }
-                resultats.append(resultat)
-                print(f"✓ Correspondance trouvée: {nom} -> {code} -> {fichier_trouve}")
-            else:
-                print(f"✗ Aucun fichier trouvé pour le code: '{code}' (nom: {nom})")
-                print(f"  Codes disponibles: {list(fichiers.keys())}")
-        
-        print(f"=== FIN mappe ===")
-        print(f"Correspondances trouvées: {correspondances_trouvees}/{len(data_frame)}")
-        
-        if correspondances_trouvees == 0:
-            print("AVERTISSEMENT: Aucune correspondance trouvée. Vérifiez que:")
-            print("1. Les codes dans le CSV correspondent aux noms des fichiers PDF")
-            print("2. Les fichiers PDF ont la bonne extension (.pdf)")
-            print("3. Les codes sont dans le même format (001 vs 1)")
-        
-        return resultats
-        
-    except Exception as e:
-        print(f"ERREUR dans mappe: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        with suivre_import('mappe', fichier=str(file_path)):
+            return list(iter_correspondances(file_path, dossier_pdf))
+
+    except Exception:
+        logger.exception("Erreur dans mappe (%s)", file_path)
         return []
 
+def iter_correspondances(file_path, dossier_pdf, chunksize=TAILLE_BLOC_CSV, statistiques=None):
+    """
+    Générateur des correspondances {nom: {"email": ..., "file": ..., "file_name": ...}}.
+
+    Les enregistrements du CSV sont lus par blocs (voir iter_csv_chunks) et
+    chaque bloc est apparié aux PDF par une jointure sur l'index FileIndex,
+    construit une seule fois : une correspondance est produite dès que son
+    bloc a été lu, sans charger le fichier complet en mémoire.
+
+    `dossier_pdf` est un dossier, un dictionnaire {code: chemin} (par exemple
+    les PDF uploadés, rangés dans le stockage par contenu) ou un FileIndex.
+    Si `statistiques` est un dictionnaire, les compteurs 'lignes_lues' et
+    'correspondances' y sont tenus à jour au fil des blocs. Les durées par
+    étape et le détail des lignes sans fichier vont à la mesure d'import
+    courante (voir instrumentation).
+    """
+    # Indexer les fichiers PDF
+    with etape('index'):
+        if isinstance(dossier_pdf, FileIndex):
+            index = dossier_pdf
+        elif isinstance(dossier_pdf, dict):
+            index = FileIndex(dossier_pdf)
+        else:
+            index = FileIndex.depuis_dossier(dossier_pdf)
+    if not index:
+        logger.warning("Aucun fichier PDF trouvé")
+        return
+
+    compter('fichiers_indexes', len(index))
+    logger.debug("Fichiers PDF indexés : %s (extrait : %s)", len(index), index.apercu_codes())
+    ambiguites = index.rapport_ambiguites()
+    if ambiguites:
+        compter('cles_ambigues', len(ambiguites))
+        logger.warning("%s clé(s) ambiguë(s) dans les PDF, par exemple : %s", len(ambiguites), ambiguites[0])
+        for ligne in ambiguites:
+            detail('cle_ambigue', "%s", ligne)
+
+    # Faire la correspondance
+    total_enregistrements = 0
+    correspondances_trouvees = 0
+    if statistiques is None:
+        statistiques = {}
+
+    for bloc in iter_csv_chunks(file_path, chunksize=chunksize):
+        total_enregistrements += len(bloc)
+
+        with etape('match'):
+            complets = (bloc['code'] != '') & (bloc['email'] != '')
+            for code, email in zip(bloc.loc[~complets, 'code'], bloc.loc[~complets, 'email']):
+                detail('ligne_incomplete', "Ligne ignorée, code ou email manquant : code=%r email=%r", code, email)
+
+            joint = index.joindre(bloc[complets])
+            trouves = joint['fichier'].notna()
+        nb_trouves = int(trouves.sum())
+        correspondances_trouvees += nb_trouves
+        statistiques['lignes_lues'] = total_enregistrements
+        statistiques['correspondances'] = correspondances_trouvees
+        compter('lignes_incompletes', int((~complets).sum()))
+        compter('correspondances', nb_trouves)
+        compter('sans_fichier', len(joint) - nb_trouves)
+
+        for nom, code in zip(joint.loc[~trouves, 'nom'], joint.loc[~trouves, 'code']):
+            detail('sans_fichier', "Aucun fichier pour le code %r (nom : %s)", code, nom)
+
+        apparies = joint[trouves]
+        for nom, email, code_fichier, fichier in zip(
+            apparies['nom'].tolist(), apparies['email'].tolist(),
+            apparies['code_fichier'].tolist(), apparies['fichier'].tolist()
+        ):
+            yield {
+                nom: {
+                    "email": email,
+                    "file": fichier,
+                    # Nom d'origine : le code du PDF suivi de son extension
+                    "file_name": FileIndex.nom_fichier(code_fichier, fichier)
+                }
+            }
+
+    logger.debug("Correspondances trouvées : %s/%s", correspondances_trouvees, total_enregistrements)
+
+    if total_enregistrements == 0:
+        logger.error("Aucune donnée chargée du CSV %s", file_path)
+    elif correspondances_trouvees == 0:
+        logger.warning(
+            "Aucune correspondance trouvée (%s lignes). Vérifiez que les codes du CSV correspondent "
+            "aux noms des fichiers PDF (.pdf) et sont au même format (001 vs 1). Codes disponibles : %s",
+            total_enregistrements, index.apercu_codes(),
+        )
+
 # ==================== FONCTIONS UTILITAIRES SUPPLEMENTAIRES ====================
 
 def sauvegarder_fichier_upload(fichier_upload, dossier_destination):
@@ -384,34 +617,22 @@ def sauvegarder_fichier_upload(fichier_upload, dossier_destination):
                 destination.write(chunk)
         
         return chemin
-    except Exception as e:
-        print(f"Erreur lors de la sauvegarde du fichier: {e}")
+    except Exception:
+        logger.exception("Erreur lors de la sauvegarde du fichier %s", fichier_upload.name)
         return None
 
-def extraire_zip(zip_path, destination):
-    """Extrait un fichier ZIP"""
-    try:
-        import zipfile
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(destination)
-        return True
-    except Exception as e:
-        print(f"Erreur lors de l'extraction du ZIP: {e}")
-        return False
-
 def valider_fichiers(csv_path, pdfs_path):
     """Valide la cohérence entre CSV et fichiers PDF"""
     try:
-        # Lire le CSV
-        data = read_csv_file(csv_path)
-        if not data:
+        # Lire le CSV bloc par bloc
+        codes_csv = {item['code'] for item in iter_csv_records(csv_path)}
+        if not codes_csv:
             return False, "Erreur de lecture du CSV"
         
         # Lire les PDFs
         pdfs = lire_dossier(pdfs_path)
         
         # Vérifier les correspondances
-        codes_csv = {item['code'] for item in data}
         codes_pdf = set(pdfs.keys())
         
         correspondances = codes_csv.intersection(codes_pdf)
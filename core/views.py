@@ -5,18 +5,22 @@ from .models import Link, SendingUnit
 from .forms import VerificationForm
 
 import os
-import shutil
 from django.conf import settings
-from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseForbidden, FileResponse, HttpResponse
+from django.core.signing import BadSignature, TimestampSigner
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponseForbidden, FileResponse, HttpResponse, Http404
 from django.utils import timezone
 from .models import Link, SendingUnit
 from .forms import VerificationForm
+from .delivery import get_delivery_backend
+from .LinkService import consommer_lien
+from .download_events import suivre_telechargement
+from asgiref.sync import sync_to_async
 
 def download_file_view(request, token):
     """
-    Vue de téléchargement sécurisée qui gère les fichiers temporaires
-    et les copie dans le dossier media/ avant de les servir.
+    Vue de téléchargement sécurisée : vérifie l'email et le code d'accès,
+    puis sert le fichier stocké de l'unité selon FILE_DELIVERY_BACKEND.
     """
     # 1. Récupérer le lien via le token UUID
     link_obj = get_object_or_404(Link, token=token)
@@ -45,87 +49,21 @@ def download_file_view(request, token):
             unit_email = unit.email.strip().lower() if unit.email else ""
 
             if input_email == unit_email and input_code == link_obj.access_code:
-                # A. Marquer le lien comme utilisé (One-Time Link)
-                link_obj.used = True
-                link_obj.used_at = timezone.now()
-                link_obj.save()
-
-                # B. Mettre à jour le statut de réception
-                unit.received = True
-                unit.received_date = timezone.now()
-                unit.save()
-
-                # C. Vérifier et copier le fichier dans media/ si nécessaire
-                try:
-                    # Chemin d'origine du fichier
-                    original_path = unit.file.path
-                    
-                    # Vérifier si le fichier est dans un dossier temporaire
-                    is_temp_file = any(tmp_dir in str(original_path) for tmp_dir in ['/tmp', '/var/tmp', tempfile.gettempdir()])
-                    
-                    # Définir le chemin sûr dans media/pdfs/
-                    safe_dir = settings.MEDIA_ROOT / 'pdfs'
-                    safe_dir.mkdir(exist_ok=True)
-                    
-                    # Nom du fichier sécurisé (utiliser l'ID du lien pour éviter les conflits)
-                    safe_filename = f"{link_obj.token}_{os.path.basename(unit.file.name)}"
-                    safe_path = safe_dir / safe_filename
-                    
-                    # Si le fichier est temporaire ou n'existe pas à l'emplacement original
-                    if is_temp_file or not os.path.exists(original_path):
-                        # Si le fichier existe déjà dans le dossier safe, l'utiliser
-                        if safe_path.exists():
-                            file_to_serve = safe_path
-                        else:
-                            # Chercher le fichier par son nom original dans media/pdfs/
-                            original_name = os.path.basename(unit.file.name)
-                            possible_path = safe_dir / original_name
-                            
-                            if possible_path.exists():
-                                file_to_serve = possible_path
-                            else:
-                                return render(request, 'core/error_page.html', {
-                                    'message': "Le fichier demandé n'est pas disponible."
-                                }, status=404)
-                    else:
-                        # Le fichier original existe et n'est pas temporaire
-                        # Le copier dans le dossier safe pour usage futur
-                        if not safe_path.exists():
-                            shutil.copy2(original_path, safe_path)
-                        file_to_serve = safe_path
-                    
-                    # D. Servir le fichier
-                    filename_display = unit.file.name.split('/')[-1]  # Nom convivial
-                    response = FileResponse(
-                        open(file_to_serve, 'rb'),
-                        as_attachment=True,
-                        filename=filename_display,
-                        content_type='application/pdf'
-                    )
-                    
-                    # Incrémenter le compteur de téléchargements
-                    unit.download_count = getattr(unit, 'download_count', 0) + 1
-                    unit.save()
-                    
-                    return response
-                    
-                except FileNotFoundError:
-                    return render(request, 'core/error_page.html', {
-                        'message': "Le fichier n'a pas été trouvé sur le serveur."
-                    }, status=404)
-                except PermissionError:
+                # A. Consommer le lien (One-Time Link) et marquer l'unité reçue, en deux UPDATE
+                if not consommer_lien(link_obj):
                     return render(request, 'core/error_page.html', {
-                        'message': "Permission refusée pour accéder au fichier."
+                        'message': "Ce lien de téléchargement a déjà été utilisé et n'est plus valide."
                     }, status=403)
-                except Exception as e:
-                    # Log l'erreur pour le debug
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.error(f"Erreur de téléchargement: {str(e)}")
-                    
-                    return render(request, 'core/error_page.html', {
-                        'message': f"Erreur lors du traitement du fichier: {str(e)[:100]}..."
-                    }, status=500)
+
+                # B. Servir le fichier stocké, sans copie
+                backend = get_delivery_backend()
+                if backend.reprise:
+                    # Le fichier est servi par une URL signée, rejouable avec Range
+                    # pendant FILE_DELIVERY_RESUME_WINDOW secondes
+                    return redirect('download_resume', token=token,
+                                    signature=signer_reprise(link_obj))
+
+                return suivre_telechargement(servir_fichier(request, unit, backend), unit, link_obj)
             else:
                 form.add_error(None, "Les informations (Email ou Code) ne correspondent pas.")
     else:
@@ -142,6 +80,157 @@ def download_file_view(request, token):
         'unit_name': unit.name,
         'token': token
     })
+
+def valeur_reprise(link):
+    """
+    Valeur signée pour la reprise : le lien et l'instant où il a été consommé.
+    Un lien n'étant consommé qu'une fois, la signature ne vaut que pour ce
+    téléchargement-là.
+    """
+    return f"{link.token}.{link.pk}.{int(link.used_at.timestamp() * 1000000)}"
+
+def signer_reprise(link):
+    valeur = valeur_reprise(link)
+    return TimestampSigner(salt='download-resume').sign(valeur)[len(valeur) + 1:]
+
+def signature_reprise_valide(link, signature):
+    """Signature émise pour ce lien consommé, il y a moins de FILE_DELIVERY_RESUME_WINDOW secondes"""
+    if not link.used or link.used_at is None:
+        return False
+    try:
+        TimestampSigner(salt='download-resume').unsign(
+            f"{valeur_reprise(link)}:{signature}",
+            max_age=getattr(settings, 'FILE_DELIVERY_RESUME_WINDOW', 1800)
+        )
+    except BadSignature:
+        return False
+    return True
+
+def liens_plus_recents(link):
+    """Liens émis après celui-ci pour la même unité (renvoi) : la reprise n'est plus permise"""
+    return Link.objects.filter(sending_unit_id=link.sending_unit_id, pk__gt=link.pk)
+
+def page_reprise_invalide(request):
+    return render(request, 'core/error_page.html', {
+        'message': "Ce lien de reprise n'est pas valide ou a expiré."
+    }, status=403)
+
+def download_resume_view(request, token, signature):
+    """
+    Téléchargement reprenable (mode 'range') : accessible sans formulaire
+    grâce à une signature horodatée émise après la vérification du code.
+
+    La signature porte sur le lien consommé : elle cesse de valoir quand
+    un nouveau lien est envoyé à l'unité (resend_link).
+    """
+    link_obj = get_object_or_404(Link.objects.select_related('sending_unit'), token=token)
+    if not signature_reprise_valide(link_obj, signature) or liens_plus_recents(link_obj).exists():
+        return page_reprise_invalide(request)
+
+    unit = link_obj.sending_unit
+    return suivre_telechargement(servir_fichier(request, unit, get_delivery_backend()), unit, link_obj)
+
+def servir_fichier(request, unit, backend):
+    """Sert le fichier de l'unité et traduit les erreurs d'accès en pages d'erreur"""
+    try:
+        return backend.servir(request, unit)
+    except Exception as e:
+        return page_erreur_fichier(request, e)
+
+def page_erreur_fichier(request, e):
+    if isinstance(e, FileNotFoundError):
+        return render(request, 'core/error_page.html', {
+            'message': "Le fichier n'a pas été trouvé sur le serveur."
+        }, status=404)
+    if isinstance(e, PermissionError):
+        return render(request, 'core/error_page.html', {
+            'message': "Permission refusée pour accéder au fichier."
+        }, status=403)
+
+    # Log l'erreur pour le debug
+    import logging
+    logger = logging.getLogger(__name__)
+    logger.error(f"Erreur de téléchargement: {str(e)}")
+
+    return render(request, 'core/error_page.html', {
+        'message': f"Erreur lors du traitement du fichier: {str(e)[:100]}..."
+    }, status=500)
+
+# ==================== TÉLÉCHARGEMENT ASYNCHRONE (ASGI) ====================
+# Mêmes étapes que download_file_view et download_resume_view, servies par
+# la boucle d'événements quand DOWNLOAD_ASYNC est actif (voir urls.py).
+
+async def download_file_async_view(request, token):
+    """
+    Version asynchrone de download_file_view : requêtes par l'ORM asynchrone
+    et fichier envoyé par blocs.
+    """
+    link_obj = await Link.objects.select_related('sending_unit').filter(token=token).afirst()
+    if link_obj is None:
+        raise Http404("Lien inconnu")
+    unit = link_obj.sending_unit
+
+    if link_obj.used:
+        return render(request, 'core/error_page.html', {
+            'message': "Ce lien de téléchargement a déjà été utilisé et n'est plus valide."
+        }, status=403)
+
+    if not unit.file:
+        return render(request, 'core/error_page.html', {
+            'message': "Aucun fichier associé à ce lien."
+        }, status=404)
+
+    if request.method == 'POST':
+        form = VerificationForm(request.POST)
+        if form.is_valid():
+            input_email = form.cleaned_data['email'].strip().lower()
+            input_code = form.cleaned_data['access_code']
+
+            unit_email = unit.email.strip().lower() if unit.email else ""
+
+            if input_email == unit_email and input_code == link_obj.access_code:
+                # A. Consommer le lien : de deux POST simultanés, un seul l'obtient
+                if not await sync_to_async(consommer_lien)(link_obj):
+                    return render(request, 'core/error_page.html', {
+                        'message': "Ce lien de téléchargement a déjà été utilisé et n'est plus valide."
+                    }, status=403)
+
+                # B. Servir le fichier stocké
+                backend = get_delivery_backend()
+                if backend.reprise:
+                    return redirect('download_resume', token=token, signature=signer_reprise(link_obj))
+                return suivre_telechargement(await servir_fichier_async(request, unit, backend), unit, link_obj)
+            else:
+                form.add_error(None, "Les informations (Email ou Code) ne correspondent pas.")
+    else:
+        initial_data = {}
+        if unit.email:
+            initial_data['email'] = unit.email
+
+        form = VerificationForm(initial=initial_data)
+
+    return render(request, 'core/download_page.html', {
+        'form': form,
+        'unit_name': unit.name,
+        'token': token
+    })
+
+async def download_resume_async_view(request, token, signature):
+    link_obj = await Link.objects.select_related('sending_unit').filter(token=token).afirst()
+    if link_obj is None:
+        raise Http404("Lien inconnu")
+    if not signature_reprise_valide(link_obj, signature) or await liens_plus_recents(link_obj).aexists():
+        return page_reprise_invalide(request)
+
+    unit = link_obj.sending_unit
+    return suivre_telechargement(await servir_fichier_async(request, unit, get_delivery_backend()), unit, link_obj)
+
+async def servir_fichier_async(request, unit, backend):
+    try:
+        return await backend.aservir(request, unit)
+    except Exception as e:
+        return page_erreur_fichier(request, e)
+
 # views.py - Ajoutez ces vues à votre fichier existant
 
 from django.shortcuts import render, redirect, get_object_or_404
@@ -149,12 +238,27 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.paginator import Paginator
+from django.db.models import Q
 import csv
 from django.http import HttpResponse
-from .models import SendingGroup, SendingUnit, Link
+from .models import SendingGroup, SendingUnit, Link, UploadSession, ImportJob
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods
 from .forms import VerificationForm
-from .utils import mappe
+from . import upload_sessions
+from .import_jobs import enfiler_import, progression_import
+from .email_queue import enfiler_emails, progression
+from .mailer import CampaignMailer
+from . import exports
+from .download_events import statistiques_groupe
+from .group_counters import ajuster_compteurs
+from . import unit_pages
+from urllib.parse import urlencode
+from django.db import transaction
+from . import metrics
+from django.utils.crypto import constant_time_compare
 import os
 from pathlib import Path
 import tempfile
@@ -170,6 +274,9 @@ def home(request):
     else:
         return redirect('login')
 
+# Nombre de groupes par page du tableau de bord
+DASHBOARD_PAGE_SIZE = 25
+
 # Fonction pour vérifier si l'utilisateur est administrateur
 def is_admin(user):
     return user.is_authenticated and user.is_staff
@@ -217,19 +324,14 @@ def custom_login(request):
 
 @login_required
 def admin_dashboard(request):
-    groups = SendingGroup.objects.all()
-
-    for group in groups:
-        group.sent_count = group.sending_units.exclude(
-            sending_date__isnull=True
-        ).count()
+    # Compteurs dénormalisés (core/group_counters.py) : aucune agrégation sur SendingUnit
+    groups = SendingGroup.objects.order_by('-id')
 
-        group.pending_count = group.sending_units.filter(
-            sending_date__isnull=True
-        ).count()
+    page = Paginator(groups, DASHBOARD_PAGE_SIZE).get_page(request.GET.get('page'))
 
     context = {
-        'groups': groups
+        'groups': page,
+        'page_obj': page,
     }
     return render(request, 'admin/dashboard.html', context)
 
@@ -238,20 +340,41 @@ def admin_dashboard(request):
 @user_passes_test(is_admin)
 def group_detail(request, group_id):
     group = get_object_or_404(SendingGroup, id=group_id)
-    units = group.sending_units.all().order_by('name')
-    
-    # Calcul des statistiques du groupe
-    sent_count = units.exclude(sending_date__isnull=True).count()
-    received_count = units.filter(received=True).count()
+
+    # Une page d'unités (pagination par clé, recherche et filtre côté serveur), jamais tout le groupe
+    recherche = request.GET.get('q', '').strip()
+    statut = request.GET.get('statut', '')
+    if statut not in unit_pages.STATUTS:
+        statut = ''
+    page = unit_pages.page_unites(group, recherche, statut,
+                                  apres=_repere_page(request.GET.get('apres')),
+                                  avant=_repere_page(request.GET.get('avant')))
+    filtres = {cle: valeur for cle, valeur in (('q', recherche), ('statut', statut)) if valeur}
+
+    # Téléchargements : compteurs horaires (commande rollup_download_events), jamais le journal brut
+    downloads = statistiques_groupe(group)
     
     return render(request, 'admin/group_detail.html', {
         'group': group,
-        'units': units,
-        'sent_count': sent_count,
-        'received_count': received_count,
-        'total_count': units.count()
+        'units': page['unites'],
+        'recherche': recherche,
+        'statut': statut,
+        'filtres': urlencode(filtres),
+        'page_suivante': urlencode({**filtres, 'apres': page['suivant']}) if page['suivant'] else None,
+        'page_precedente': urlencode({**filtres, 'avant': page['precedent']}) if page['precedent'] else None,
+        # Statistiques du groupe : compteurs dénormalisés, sans COUNT sur les unités
+        'sent_count': group.sent_count,
+        'received_count': group.received_count,
+        'total_count': group.total_count,
+        'downloads': downloads,
     })
 
+def _repere_page(valeur):
+    try:
+        return int(valeur)
+    except (TypeError, ValueError):
+        return None
+
 # Vue d'upload et création de groupe
 # Dans views.py - MODIFIER create_group
 import os
@@ -263,62 +386,48 @@ def create_group(request):
     if request.method == 'POST':
         csv_file = request.FILES.get('csv_file')
         pdf_files = request.FILES.getlist('pdf_files')
+        pdf_archive = request.FILES.get('pdf_archive')
         group_name = request.POST.get('group_name', f'Groupe_{timezone.now().strftime("%Y%m%d_%H%M%S")}')
         
-        # Créer un répertoire temporaire pour les fichiers
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            tmp_path = Path(tmp_dir)
-            
-            # Sauvegarder le CSV
-            csv_path = tmp_path / 'data.csv'
-            with open(csv_path, 'wb') as f:
-                for chunk in csv_file.chunks():
-                    f.write(chunk)
-            
-            # Sauvegarder les PDFs dans le dossier media/pdfs/ directement
-            media_pdfs_dir = settings.MEDIA_ROOT / 'pdfs'
-            media_pdfs_dir.mkdir(exist_ok=True)
-            
-            pdf_mapping = {}
-            for pdf_file in pdf_files:
-                # Sauvegarder dans media/pdfs/
-                media_path = media_pdfs_dir / pdf_file.name
-                with open(media_path, 'wb') as f:
-                    for chunk in pdf_file.chunks():
-                        f.write(chunk)
-                pdf_mapping[pdf_file.name] = str(media_path)
-            
-            # Utiliser votre fonction mappe avec les chemins media/
-            resultats = mappe(csv_path, media_pdfs_dir)
-            
-            if resultats:
-                # Créer le groupe
-                group = SendingGroup.objects.create(label=group_name)
-                
-                # Créer les unités d'envoi et les liens
-                for resultat in resultats:
-                    for name, data in resultat.items():
-                        # Préparer le chemin relatif pour le FileField
-                        file_path = Path(data['file'])
-                        relative_path = f"pdfs/{file_path.name}"
-                        
-                        # Créer l'unité avec le FileField
-                        unit = SendingUnit.objects.create(
-                            sending_group=group,
-                            name=name,
-                            email=data['email'],
-                        )
-                        
-                        # Assigner le fichier
-                        with open(file_path, 'rb') as f:
-                            unit.file.save(file_path.name, File(f), save=True)
-                        
-                        # Créer le lien
-                        Link.objects.create(sending_unit=unit)
-                
-                return redirect('group_detail', group_id=group.id)
+        if csv_file is None:
+            messages.error(request, "Veuillez sélectionner un fichier CSV.")
+            return render(request, 'admin/create_group.html')
+        
+        # Les fichiers sont enregistrés tels quels ; le stockage des PDF, la lecture
+        # du CSV et la création des unités sont faits par le worker process_import_jobs
+        job = enfiler_import(
+            group_name, csv_file, pdf_files, pdf_archive,
+            request.POST.getlist('upload_session'), request.user
+        )
+        return redirect('import_progress', job_id=job.id)
     
     return render(request, 'admin/create_group.html')
+
+# Suivi d'un import en arrière-plan
+@login_required
+@user_passes_test(is_admin)
+def import_progress(request, job_id):
+    job = get_object_or_404(ImportJob, id=job_id)
+    return render(request, 'admin/import_progress.html', {
+        'job': job,
+        'progress': progression_import(job)
+    })
+
+@login_required
+@user_passes_test(is_admin)
+def import_status(request, job_id):
+    job = get_object_or_404(ImportJob, id=job_id)
+    return JsonResponse(progression_import(job))
+
+# Métriques de performance au format Prometheus (voir core/middleware.py)
+def metrics_view(request):
+    # Administrateur connecté, ou scrapper Prometheus muni du jeton METRICS_TOKEN
+    jeton = getattr(settings, 'METRICS_TOKEN', '')
+    entete = request.headers.get('Authorization', '')
+    if not is_admin(request.user) and not (jeton and constant_time_compare(entete, f'Bearer {jeton}')):
+        return HttpResponseForbidden("Accès réservé aux administrateurs")
+    return HttpResponse(metrics.exposer(), content_type=metrics.CONTENT_TYPE)
+
 # Vue pour envoyer les emails
 @login_required
 @user_passes_test(is_admin)
@@ -330,47 +439,92 @@ def send_emails(request, group_id):
         email_subject = request.POST.get('email_subject', 'Votre fichier personnel')
         email_body = request.POST.get('email_body', '')
         
-        sent_count = 0
-        failed_count = 0
+        # Les emails sont mis en file d'attente ; le worker process_email_jobs les envoie
+        enfiler_emails(group, email_subject, email_body, request.build_absolute_uri)
         
-        for unit in units:
-            link = unit.links.first()
-            if link:
-                try:
-                    # Personnaliser le message
-                    personalized_body = email_body.replace('{nom}', unit.name)
-                    personalized_body = personalized_body.replace('{code}', str(link.access_code))
-                    personalized_body = personalized_body.replace('{lien}', request.build_absolute_uri(link.get_download_url()))
-                    
-                    # Envoyer l'email
-                    send_mail(
-                        subject=email_subject,
-                        message=personalized_body,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[unit.email],
-                        html_message=personalized_body  # Version HTML
-                    )
-                    
-                    # Mettre à jour la date d'envoi
-                    unit.sending_date = timezone.now()
-                    unit.save()
-                    sent_count += 1
-                    
-                except Exception as e:
-                    failed_count += 1
-                    print(f"Erreur d'envoi pour {unit.email}: {e}")
-        
-        return render(request, 'admin/send_result.html', {
-            'group': group,
-            'sent_count': sent_count,
-            'failed_count': failed_count
-        })
+        return redirect('send_progress', group_id=group.id)
     
     return render(request, 'admin/send_emails.html', {
         'group': group,
         'units_count': units.count()
     })
 
+# Suivi de l'envoi en arrière-plan
+@login_required
+@user_passes_test(is_admin)
+def send_progress(request, group_id):
+    group = get_object_or_404(SendingGroup, id=group_id)
+    return render(request, 'admin/send_progress.html', {
+        'group': group,
+        'progress': progression(group)
+    })
+
+@login_required
+@user_passes_test(is_admin)
+def send_status(request, group_id):
+    group = get_object_or_404(SendingGroup, id=group_id)
+    return JsonResponse(progression(group))
+
+# API d'upload par morceaux (reprenable), voir upload_sessions.py
+def _reponse_upload(session, status=200):
+    response = JsonResponse(upload_sessions.etat(session), status=status)
+    response['Upload-Offset'] = str(session.offset)
+    response['Upload-Length'] = str(session.size)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+def _erreur_upload(erreur):
+    response = JsonResponse({'error': str(erreur)}, status=erreur.status)
+    if erreur.session is not None:
+        # Le client reprend à partir du dernier décalage acquitté
+        response['Upload-Offset'] = str(erreur.session.offset)
+    return response
+
+@login_required
+@user_passes_test(is_admin)
+@require_http_methods(['POST'])
+def upload_sessions_api(request):
+    try:
+        session = upload_sessions.ouvrir_session(
+            request.POST.get('filename') or request.headers.get('Upload-Filename', ''),
+            request.POST.get('size') or request.headers.get('Upload-Length'),
+            request.POST.get('sha256', ''),
+            request.user,
+        )
+    except upload_sessions.ErreurUpload as e:
+        return _erreur_upload(e)
+    response = _reponse_upload(session, status=201)
+    response['Location'] = reverse('upload_session_api', args=[session.id])
+    return response
+
+@login_required
+@user_passes_test(is_admin)
+@require_http_methods(['GET', 'HEAD', 'PATCH', 'DELETE'])
+def upload_session_api(request, session_id):
+    sessions = UploadSession.objects.all()
+    if not request.user.is_superuser:
+        sessions = sessions.filter(created_by=request.user)
+    session = get_object_or_404(sessions, pk=session_id)
+
+    if request.method == 'DELETE':
+        upload_sessions.annuler_session(session)
+        return HttpResponse(status=204)
+
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            longueur = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return JsonResponse({'error': "En-tête Upload-Offset ou Content-Length invalide"}, status=400)
+        try:
+            session = upload_sessions.ecrire_morceau(
+                session.pk, offset, request, longueur, request.headers.get('Upload-Checksum')
+            )
+        except upload_sessions.ErreurUpload as e:
+            return _erreur_upload(e)
+
+    return _reponse_upload(session)
+
 # Vue pour renvoyer un lien spécifique
 @login_required
 @user_passes_test(is_admin)
@@ -378,20 +532,23 @@ def resend_link(request, unit_id):
     unit = get_object_or_404(SendingUnit, id=unit_id)
     
     if request.method == 'POST':
-        # Invalider l'ancien lien
-        old_link = unit.links.first()
-        if old_link:
-            old_link.used = True
-            old_link.save()
-        
-        # Créer un nouveau lien
-        new_link = Link.objects.create(sending_unit=unit)
-        
-        # Réinitialiser le statut de réception
-        unit.received = False
-        unit.received_date = None
-        unit.sending_date = timezone.now()
-        unit.save()
+        with transaction.atomic():
+            # Unité verrouillée : les compteurs du groupe sont ajustés d'après son état courant
+            unit = SendingUnit.objects.select_for_update().get(pk=unit.pk)
+
+            # Invalider les anciens liens encore valides
+            unit.links.filter(used=False).update(used=True)
+
+            # Créer un nouveau lien
+            new_link = Link.objects.create(sending_unit=unit)
+
+            # Réinitialiser le statut de réception
+            ajuster_compteurs(unit.sending_group_id, envoyes=int(unit.sending_date is None),
+                              recus=-int(unit.received))
+            unit.received = False
+            unit.received_date = None
+            unit.sending_date = timezone.now()
+            unit.save()
         
         # Envoyer le nouvel email
         try:
@@ -405,12 +562,12 @@ def resend_link(request, unit_id):
             Ce lien est valable une seule fois.
             """
             
-            send_mail(
-                subject='Nouveau lien de téléchargement',
-                message=email_body,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[unit.email]
-            )
+            mailer = CampaignMailer()
+            erreur, = mailer.envoyer([
+                mailer.construire_message('Nouveau lien de téléchargement', email_body, unit.email)
+            ])
+            if erreur is not None:
+                raise erreur
             
             return redirect('group_detail', group_id=unit.sending_group.id)
             
@@ -422,30 +579,41 @@ def resend_link(request, unit_id):
     return render(request, 'admin/resend_confirm.html', {'unit': unit})
 
 # Export CSV des résultats
+# Formats : csv (défaut), csv.gz, et pour les analystes xlsx / parquet (dépendances optionnelles)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'csv.gz': ('application/gzip', 'csv.gz'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
 @login_required
 @user_passes_test(is_admin)
 def export_results(request, group_id):
     group = get_object_or_404(SendingGroup, id=group_id)
-    units = group.sending_units.all()
+    export_format = request.GET.get('format', 'csv')
     
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="resultats_{group.label}.csv"'
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponse(f"Format d'export inconnu : {export_format}", status=400, content_type='text/plain')
     
-    writer = csv.writer(response)
-    writer.writerow(['Nom', 'Email', 'Date envoi', 'Reçu', 'Date réception', 'Code d\'accès'])
+    content_type, extension = EXPORT_FORMATS[export_format]
+    filename = f"resultats_{group.label}.{extension}"
     
-    for unit in units:
-        link = unit.links.first()
-        writer.writerow([
-            unit.name,
-            unit.email,
-            unit.sending_date.strftime('%Y-%m-%d %H:%M') if unit.sending_date else '',
-            'Oui' if unit.received else 'Non',
-            unit.received_date.strftime('%Y-%m-%d %H:%M') if unit.received_date else '',
-            link.access_code if link else ''
-        ])
+    if export_format == 'csv':
+        response = StreamingHttpResponse(exports.iter_csv(group), content_type=content_type)
+    elif export_format == 'csv.gz':
+        response = StreamingHttpResponse(exports.iter_csv_gzip(group), content_type=content_type)
+    else:
+        try:
+            fichier = exports.fichier_xlsx(group) if export_format == 'xlsx' else exports.fichier_parquet(group)
+        except ImportError as e:
+            return HttpResponse(f"Export {export_format} indisponible : {e.name} n'est pas installé.",
+                                status=501, content_type='text/plain')
+        response = FileResponse(fichier, content_type=content_type)
     
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
+
 from django.contrib.auth.models import User
 from django.contrib.auth.hashers import make_password
 from django.contrib import messages
@@ -549,47 +717,3 @@ def create_user_view(request):
     }
     
     return render(request, 'admin/create_user.html', context)
-
-# core/utils.py - Ajouter
-import os
-import shutil
-from pathlib import Path
-from django.conf import settings
-
-def ensure_file_in_media(file_field, subfolder='pdfs'):
-    """
-    S'assure qu'un fichier d'un FileField est dans le dossier media/
-    Retourne le chemin sûr vers le fichier.
-    """
-    if not file_field:
-        return None
-    
-    # Chemin original
-    original_path = file_field.path if hasattr(file_field, 'path') else None
-    
-    # Si pas de chemin ou fichier inexistant
-    if not original_path or not os.path.exists(original_path):
-        # Chercher dans media/ par nom de fichier
-        filename = file_field.name.split('/')[-1]
-        media_path = settings.MEDIA_ROOT / subfolder / filename
-        
-        if media_path.exists():
-            return media_path
-        return None
-    
-    # Vérifier si déjà dans media/
-    media_root_str = str(settings.MEDIA_ROOT)
-    if media_root_str in str(original_path):
-        return original_path
-    
-    # Copier dans media/
-    safe_dir = settings.MEDIA_ROOT / subfolder
-    safe_dir.mkdir(exist_ok=True)
-    
-    safe_filename = f"{Path(original_path).stem}_{Path(original_path).name}"
-    safe_path = safe_dir / safe_filename
-    
-    if not safe_path.exists():
-        shutil.copy2(original_path, safe_path)
-    
-    return safe_path
\ No newline at end of file
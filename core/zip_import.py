@@ -0,0 +1,136 @@
+# zip_import.py
+"""
+Import des PDF depuis une archive ZIP, sans extraction sur disque.
+
+Le répertoire central de l'archive est lu pour construire l'index
+{code: membre} ; chaque membre PDF est ensuite décompressé au fil de l'eau
+directement dans le stockage par contenu (blob_store), qui calcule son
+empreinte pendant l'écriture.
+
+L'archive uploadée n'est jamais chargée en mémoire : Django la garde en
+mémoire jusqu'à FILE_UPLOAD_MAX_MEMORY_SIZE, sur disque au-delà, et ZipFile
+la lit par positionnement. Les archives dangereuses sont refusées : chemins
+absolus ou remontant l'arborescence, membres chiffrés ou liens symboliques,
+tailles ou taux de compression anormaux (zip-bombs).
+"""
+import logging
+import stat
+import zipfile
+from pathlib import PurePosixPath
+
+from django.conf import settings
+
+from .blob_store import stocker_chunks
+
+logger = logging.getLogger(__name__)
+
+TAILLE_BLOC = 64 * 1024
+
+# Limites par défaut, ajustables par settings.ZIP_IMPORT_LIMITS
+LIMITES_PAR_DEFAUT = {
+    'max_members': 50000,                   # membres dans l'archive
+    'max_member_size': 50 * 1024 * 1024,    # octets décompressés par membre
+    'max_total_size': 4 * 1024 ** 3,        # octets décompressés au total
+    'max_ratio': 100,                       # taille décompressée / taille compressée
+}
+
+class ArchiveInvalide(ValueError):
+    """Archive refusée : format, chemins ou tailles non conformes"""
+
+def limites():
+    return {**LIMITES_PAR_DEFAUT, **(getattr(settings, 'ZIP_IMPORT_LIMITS', {}) or {})}
+
+def _verifier_chemin(nom):
+    """Refuse les chemins absolus et les remontées (../), y compris au format Windows"""
+    normalise = nom.replace('\\', '/')
+    chemin = PurePosixPath(normalise)
+    if chemin.is_absolute() or '..' in chemin.parts or (len(normalise) > 1 and normalise[1] == ':'):
+        raise ArchiveInvalide(f"Chemin interdit dans l'archive : {nom}")
+    return chemin
+
+def _est_lien_symbolique(info):
+    return info.create_system == 3 and stat.S_ISLNK(info.external_attr >> 16)
+
+def indexer_zip(archive):
+    """
+    Lit le répertoire central et retourne {code: ZipInfo} des membres PDF.
+
+    Lève ArchiveInvalide si l'archive est corrompue ou dépasse les limites.
+    """
+    bornes = limites()
+    infos = archive.infolist()
+    if len(infos) > bornes['max_members']:
+        raise ArchiveInvalide(f"L'archive contient trop de fichiers ({len(infos)})")
+
+    index = {}
+    total = 0
+    doublons = 0
+    for info in infos:
+        chemin = _verifier_chemin(info.filename)
+        if info.is_dir():
+            continue
+        if _est_lien_symbolique(info):
+            raise ArchiveInvalide(f"Lien symbolique interdit dans l'archive : {info.filename}")
+        if info.flag_bits & 0x1:
+            raise ArchiveInvalide(f"Fichier chiffré non pris en charge : {info.filename}")
+
+        # Métadonnées macOS et fichiers cachés
+        if chemin.parts[0] == '__MACOSX' or chemin.name.startswith('.'):
+            continue
+        if chemin.suffix.lower() != '.pdf':
+            continue
+
+        if info.file_size > bornes['max_member_size']:
+            raise ArchiveInvalide(f"Fichier trop volumineux dans l'archive : {info.filename}")
+        if info.file_size > bornes['max_ratio'] * max(info.compress_size, 1):
+            raise ArchiveInvalide(f"Taux de compression suspect : {info.filename}")
+        total += info.file_size
+        if total > bornes['max_total_size']:
+            raise ArchiveInvalide("Taille décompressée totale de l'archive trop importante")
+
+        code = chemin.stem.strip()
+        if code in index:
+            doublons += 1
+            continue
+        index[code] = info
+
+    if doublons:
+        logger.warning("%s PDF ignoré(s) dans l'archive : code déjà présent", doublons)
+    return index
+
+def _lire_membre(archive, info):
+    """Blocs décompressés d'un membre, sans dépasser la taille annoncée"""
+    lus = 0
+    with archive.open(info) as membre:
+        while bloc := membre.read(TAILLE_BLOC):
+            lus += len(bloc)
+            if lus > info.file_size:
+                raise ArchiveInvalide(f"Taille réelle supérieure à la taille annoncée : {info.filename}")
+            yield bloc
+
+def importer_zip(fichier, apres_membre=None):
+    """
+    Range les PDF d'une archive ZIP (chemin ou fichier uploadé) dans le stockage
+    par contenu et retourne {code: chemin du blob} pour iter_correspondances.
+
+    `apres_membre`, si fourni, est appelé après le stockage de chaque PDF.
+    Lève ArchiveInvalide si l'archive est refusée.
+    """
+    try:
+        with zipfile.ZipFile(fichier) as archive:
+            fichiers = {}
+            for code, info in indexer_zip(archive).items():
+                fichiers[code] = str(stocker_chunks(_lire_membre(archive, info), '.pdf').path)
+                if apres_membre is not None:
+                    apres_membre()
+            return fichiers
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, EOFError) as e:
+        raise ArchiveInvalide(f"Archive ZIP illisible : {e}") from e
+
+def compter_pdf_zip(fichier):
+    """Nombre de PDF d'une archive, d'après son seul répertoire central"""
+    try:
+        with zipfile.ZipFile(fichier) as archive:
+            return len(indexer_zip(archive))
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, EOFError) as e:
+        raise ArchiveInvalide(f"Archive ZIP illisible : {e}") from e
@@ -0,0 +1,20 @@
+# Profil ASGI : gunicorn avec des workers uvicorn
+#
+#   gunicorn FastDistrib.asgi:application -c gunicorn.asgi.conf.py
+#
+# Chaque worker sert les téléchargements depuis sa boucle d'événements
+# (vues asynchrones, DOWNLOAD_ASYNC) : un client lent n'occupe ni worker ni
+# thread, un worker tient des centaines de téléchargements simultanés.
+# Les autres vues, synchrones, s'exécutent dans le pool de threads d'asgiref.
+import os
+
+worker_class = 'uvicorn_worker.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# Téléchargements longs de clients lents : pas de coupure au bout de 30 s
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+raw_env = ['DOWNLOAD_ASYNC=True']
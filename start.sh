@@ -0,0 +1,17 @@
+#!/usr/bin/env bash
+# Démarrage du service web Render
+set -o errexit
+
+# Métriques laissées par les workers de l'exécution précédente (core/metrics.py)
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+
+# Worker d'import dans le même service : sur Render, un disque persistant n'est
+# attaché qu'à un seul service, et l'import lit les fichiers reçus par le web
+# (media/imports, media/uploads) et écrit les PDF servis par le web (media/blobs).
+# Relancé s'il s'arrête, sans interrompre gunicorn.
+(while true; do
+    python manage.py process_import_jobs || echo "Worker d'import arrêté, relance dans 5 s"
+    sleep 5
+done) &
+
+exec gunicorn FastDistrib.wsgi:application